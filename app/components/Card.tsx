@@ -3,6 +3,7 @@
 "use client";
 
 import { useRouter } from "next/navigation";
+import { imageSrcSet, type ImageVariants } from "@/lib/api";
 
 interface CardProps {
   event: {
@@ -12,6 +13,7 @@ interface CardProps {
     date: string;
     description?: string;
     image_url?: string;
+    image_variants?: ImageVariants;
     image?: string;
     food?: string[];
     foodType?: string;
@@ -22,6 +24,9 @@ interface CardProps {
   };
 }
 
+// Cards are full width on phones and a third of the grid on desktop
+const CARD_IMAGE_SIZES = "(max-width: 640px) 100vw, 33vw";
+
 export function Card({ event }: CardProps) {
   const router = useRouter();
 
@@ -39,12 +44,19 @@ export function Card({ event }: CardProps) {
         hover:scale-105 hover:shadow-xl hover:-translate-y-1 hover:bg-gray-50
       "
     >
-        <img
-          src={imageSrc}
-          alt={event.name}
-          loading="lazy"
-          className="rounded-xl w-full h-48 object-cover mb-3 transition-all duration-300 hover:brightness-105"
-        />
+        <picture>
+          {event.image_variants?.webp && (
+            <source type="image/webp" srcSet={imageSrcSet(event.image_variants, "webp")} sizes={CARD_IMAGE_SIZES} />
+          )}
+          <img
+            src={imageSrc}
+            srcSet={imageSrcSet(event.image_variants, "jpeg")}
+            sizes={CARD_IMAGE_SIZES}
+            alt={event.name}
+            loading="lazy"
+            className="rounded-xl w-full h-48 object-cover mb-3 transition-all duration-300 hover:brightness-105"
+          />
+        </picture>
 
         <h2 className="text-lg text-gray-900 font-semibold line-clamp-1">{event.name}</h2>
         <p className="text-gray-600 text-sm line-clamp-1">{event.location}</p>
@@ -5,7 +5,7 @@ import { ArrowLeft } from "lucide-react";
 import { Button } from "@/app/components/ui/button";
 import { FoodItem } from "@/app/types";
 import { useState, useEffect } from "react";
-import { getAllEvents, Event, getFoodByEvent, reserveFood, cancelReservation, getProfileReservations } from "@/lib/api";
+import { getAllEvents, Event, getFoodByEvent, reserveFood, cancelReservation, getProfileReservations, subscribeToStock } from "@/lib/api";
 import { supabase } from '@/lib/supabaseClient';
 import EventHeader from "./components/EventHeader";
 import FoodList from "./components/FoodList";
@@ -73,7 +73,21 @@ export default function EventDetailPage() {
     fetchEvent();
   }, [eventId]);
 
-  // No realtime subscription: we'll re-fetch authoritative food rows after reservations
+  // Live stock: apply quantity/stockLevel changes pushed by the server as others reserve
+  useEffect(() => {
+    return subscribeToStock(eventId, (change) => {
+      const id = String(change.id);
+      setFoodQuantities(prev => {
+        const next = { ...prev };
+        if (change.quantity === null) delete next[id];
+        else next[id] = change.quantity;
+        return next;
+      });
+      setFoodItemsState(prev => prev.map(item =>
+        String(item.id) === id ? { ...item, quantity: change.quantity ?? undefined, stockLevel: change.stockLevel } : item
+      ));
+    });
+  }, [eventId]);
 
   if (loading) {
     return (
@@ -247,7 +261,7 @@ export default function EventDetailPage() {
       const { data } = await supabase.auth.getUser();
       const userId = data?.user?.id;
       if (!userId) throw new Error('Not signed in');
-      await cancelReservation({ food_id: Number(foodId), quantity: 1, profile_id: userId });
+      await cancelReservation({ food_id: Number(foodId), profile_id: userId });
       // Refresh food rows and persisted reservations
       if (apiEvent) {
         const refreshed = await getFoodByEvent(apiEvent.id);
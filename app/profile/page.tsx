@@ -4,7 +4,7 @@ import { useEffect, useState } from 'react';
 import { supabase } from '@/lib/supabaseClient';
 import { useRouter } from 'next/navigation';
 import Link from 'next/link';
-import { getProfileReservations, getAllEvents, Event } from '@/lib/api';
+import { getProfileReservations, ProfileReservations, ReservedEventSummary, ReservedFoodRow } from '@/lib/api';
 import { useNotifications } from '@/lib/useNotifications';
 
 interface UserProfile {
@@ -13,15 +13,9 @@ interface UserProfile {
   created_at: string;
 }
 
-interface ReservationData {
-  reserved_items: any[];
-  food_rows: any[];
-}
-
 export default function ProfilePage() {
   const [user, setUser] = useState<UserProfile | null>(null);
-  const [allEvents, setAllEvents] = useState<Event[]>([]);
-  const [reservations, setReservations] = useState<ReservationData>({ reserved_items: [], food_rows: [] });
+  const [reservations, setReservations] = useState<ProfileReservations>({ reserved_items: [], reservations: [], food_rows: [] });
   const [loading, setLoading] = useState(true);
   const router = useRouter();
   const { notificationsEnabled, toggleNotifications, loading: notifLoading } = useNotifications(user?.id || null);
@@ -45,11 +39,7 @@ export default function ProfilePage() {
             created_at: authUser.created_at,
           });
 
-          // get events
-          const eventsData = await getAllEvents();
-          setAllEvents(eventsData);
-
-          // get reservation data
+          // get reservation data (food rows come with their event summaries)
           const reservationData = await getProfileReservations(authUser.id);
           setReservations(reservationData);
         }
@@ -68,26 +58,15 @@ export default function ProfilePage() {
 
   //reserved events
   const getReservedEvents = () => {
-    if (!reservations.reserved_items.length) return [];
-    
-    const eventIds = [...new Set(reservations.food_rows.map(item => item.event_id))];
-    
-    const reservedEvents = allEvents.filter(event => eventIds.includes(event.id));
-    
-    return reservedEvents.map(event => {
-      const eventFoodItems = reservations.food_rows.filter(item => item.event_id === event.id);
-      const eventReservations = reservations.reserved_items.filter((_, index) => 
-        reservations.food_rows[index]?.event_id === event.id
-      );
-      
-      return {
-        ...event,
-        reserved_food: eventFoodItems.map((food, index) => ({
-          ...food,
-          reserved_quantity: eventReservations[index]?.quantity
-        }))
-      };
-    });
+    const byEvent = new Map<number, ReservedEventSummary & { reserved_food: ReservedFoodRow[] }>();
+    for (const food of reservations.food_rows) {
+      if (!food.event) continue;
+      if (!byEvent.has(food.event.id)) {
+        byEvent.set(food.event.id, { ...food.event, reserved_food: [] });
+      }
+      byEvent.get(food.event.id)!.reserved_food.push(food);
+    }
+    return [...byEvent.values()];
   };
 
     const reservedEvents = getReservedEvents();
@@ -102,6 +102,7 @@ export default function SearchPage() {
           start_time: e.start_time,
           end_time: e.end_time,
           image_url: e.image_url || e.image || undefined,
+          image_variants: e.image_variants || undefined,
         }));
         
         console.log('Mapped events:', mappedEvents.length);
@@ -14,6 +14,24 @@ export interface Event {
     start_time: string; // HH:MM
     end_time: string; // HH:MM
     image_url?: string; // Public image URL from storage
+    image_variants?: ImageVariants; // Resized copies of image_url
+    latitude?: number | null;
+    longitude?: number | null;
+}
+
+// Resized event images keyed by format, then pixel width: { webp: { "320": url, ... }, jpeg: { ... } }
+export type ImageVariants = Partial<Record<'webp' | 'jpeg', Record<string, string>>>;
+
+/**
+ * Build an <img srcSet> value ("url 320w, url 640w") from one format of an event's image variants
+ */
+export function imageSrcSet(variants: ImageVariants | undefined, format: 'webp' | 'jpeg'): string | undefined {
+    const byWidth = variants?.[format];
+    if (!byWidth) return undefined;
+    return Object.entries(byWidth)
+        .sort(([a], [b]) => Number(a) - Number(b))
+        .map(([width, url]) => `${url} ${width}w`)
+        .join(', ');
 }
 
 export interface FoodItem {
@@ -58,6 +76,7 @@ export async function getAllEvents(): Promise<Event[]> {
             start_time: e.start_time,
             end_time: e.end_time,
             image_url: e.image_url || e.image || undefined,
+            image_variants: e.image_variants || undefined,
         }));
         console.log('Mapped events:', events);
         return events;
@@ -67,6 +86,42 @@ export async function getAllEvents(): Promise<Event[]> {
     }
 }
 
+export interface EventPageOptions {
+    limit?: number;
+    cursor?: string | null;
+    fields?: (keyof Event)[];
+    upcoming?: boolean;
+}
+
+export interface EventPage {
+    events: Event[];
+    nextCursor: string | null;
+}
+
+/**
+ * Fetch one keyset-paginated page of events. Pass the returned `nextCursor`
+ * back as `cursor` to get the following page; it is null on the last page.
+ */
+export async function getEventsPage(options: EventPageOptions = {}): Promise<EventPage> {
+    try {
+        const params = new URLSearchParams();
+        params.set('limit', String(options.limit ?? 50));
+        if (options.cursor) params.set('cursor', options.cursor);
+        if (options.fields?.length) params.set('fields', options.fields.join(','));
+        if (options.upcoming) params.set('upcoming', 'true');
+
+        const response = await fetch(`${API_BASE_URL}/?${params.toString()}`);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch events: ${response.statusText}`);
+        }
+        const result = await response.json();
+        return { events: result.data || [], nextCursor: result.next_cursor ?? null };
+    } catch (error) {
+        console.error('Error fetching events page:', error);
+        return { events: [], nextCursor: null };
+    }
+}
+
 /**
  * Search events by name
  */
@@ -101,6 +156,73 @@ export async function searchEventsByFood(food: string): Promise<Event[]> {
     }
 }
 
+export interface SearchResult extends Event {
+    score: number;
+}
+
+export interface SearchPage {
+    results: SearchResult[];
+    total: number;
+    nextOffset: number | null;
+}
+
+/**
+ * Full-text search over event names, descriptions, organizations, locations and
+ * food, best match first. Partial words and single typos still match.
+ */
+export async function searchEvents(query: string, options: { limit?: number; offset?: number } = {}): Promise<SearchPage> {
+    try {
+        const params = new URLSearchParams({ q: query });
+        params.set('limit', String(options.limit ?? 20));
+        if (options.offset) params.set('offset', String(options.offset));
+
+        const response = await fetch(`${API_BASE_URL}/search?${params.toString()}`);
+        if (!response.ok) {
+            throw new Error(`Failed to search events: ${response.statusText}`);
+        }
+        const result = await response.json();
+        return { results: result.data || [], total: result.total ?? 0, nextOffset: result.next_offset ?? null };
+    } catch (error) {
+        console.error('Error searching events:', error);
+        return { results: [], total: 0, nextOffset: null };
+    }
+}
+
+export interface HappeningNowOptions {
+    campusLocation?: string;
+    withinMinutes?: number;
+    near?: { lat: number; lon: number; radiusM?: number };
+    limit?: number;
+}
+
+/**
+ * Events in progress now or starting within `withinMinutes` (default 60),
+ * optionally on one campus and/or near a point (nearest first, with `distance_m`).
+ */
+export async function getEventsHappeningNow(options: HappeningNowOptions = {}): Promise<(Event & { distance_m?: number })[]> {
+    try {
+        const params = new URLSearchParams();
+        if (options.campusLocation) params.set('campus_location', options.campusLocation);
+        if (options.withinMinutes !== undefined) params.set('within_minutes', String(options.withinMinutes));
+        if (options.near) {
+            params.set('lat', String(options.near.lat));
+            params.set('lon', String(options.near.lon));
+            if (options.near.radiusM) params.set('radius_m', String(options.near.radiusM));
+        }
+        if (options.limit) params.set('limit', String(options.limit));
+
+        const response = await fetch(`${API_BASE_URL}/events/now?${params.toString()}`);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch events happening now: ${response.statusText}`);
+        }
+        const result = await response.json();
+        return result.data || [];
+    } catch (error) {
+        console.error('Error fetching events happening now:', error);
+        return [];
+    }
+}
+
 /**
  * Create a new event
  */
@@ -125,6 +247,32 @@ export async function createEvent(event: Omit<Event, 'id'>): Promise<Event | nul
     }
 }
 
+export interface ImportReport {
+    dry_run: boolean;
+    rows: number;
+    events_imported: number;
+    food_imported: number;
+    error_count: number;
+    errors: { line: number | null; error: string }[];
+}
+
+/**
+ * Bulk import events and food from a CSV or JSONL file. With `dryRun` the rows are
+ * only validated. Throws if the upload is rejected as a whole.
+ */
+export async function importEvents(file: File, options: { dryRun?: boolean } = {}): Promise<ImportReport> {
+    const form = new FormData();
+    form.append('file', file);
+    if (options.dryRun) form.append('dry_run', 'true');
+
+    const response = await fetch(`${API_BASE_URL}/import`, { method: 'POST', body: form });
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({}));
+        throw new Error(error.detail || `Failed to import: ${response.statusText}`);
+    }
+    return response.json();
+}
+
 /**
  * Reserve food items
  */
@@ -148,7 +296,44 @@ export async function reserveFood(request: ReserveRequest): Promise<boolean> {
     }
 }
 
-export async function cancelReservation(request: ReserveRequest): Promise<boolean> {
+export interface BatchReserveResult {
+    food_id: number;
+    status: 'ok' | 'unlimited' | 'skipped' | 'not_found' | 'oversold' | 'invalid' | 'conflict';
+    quantity: number | null;
+    stockLevel: 'low' | 'medium' | 'high' | null;
+    reservation_id: number | null;
+}
+
+/**
+ * Reserve several food items at once; either all are reserved or none are
+ */
+export async function reserveFoodBatch(
+    items: { food_id: number; quantity: number }[],
+    profileId?: string,
+): Promise<BatchReserveResult[]> {
+    const response = await fetch(`${API_BASE_URL}/reserve/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ items, profile_id: profileId }),
+    });
+    const result = await response.json();
+    if (!response.ok) {
+        const detail = result.detail?.message || result.detail || response.statusText;
+        throw new Error(`Failed to reserve food: ${detail}`);
+    }
+    return result.results;
+}
+
+export interface CancelReservationRequest {
+    reservation_id?: number; // Cancel this reservation...
+    food_id?: number; // ...or every reservation the profile holds for this food
+    profile_id?: string;
+}
+
+/**
+ * Cancel a reservation; the reserved quantity is given back and retries are harmless
+ */
+export async function cancelReservation(request: CancelReservationRequest): Promise<boolean> {
     try {
         const response = await fetch(`${API_BASE_URL}/reserve/cancel`, {
             method: 'POST',
@@ -166,7 +351,31 @@ export async function cancelReservation(request: ReserveRequest): Promise<boolea
     }
 }
 
-export async function getProfileReservations(profileId: string): Promise<{ reserved_items: any[]; food_rows: any[] }>{
+export type ReservedEventSummary = Pick<Event,
+    'id' | 'name' | 'organization' | 'location' | 'campus_location' | 'date' | 'start_time' | 'end_time' | 'image_url'>;
+
+export interface ReservedFoodRow extends Pick<FoodItem, 'id' | 'name' | 'quantity' | 'stockLevel' | 'dietaryTags' | 'event_id'> {
+    event: ReservedEventSummary | null;
+    reserved_quantity: number; // Total across the profile's reservations of this food
+}
+
+export interface Reservation {
+    id: number;
+    food_id: number;
+    quantity: number;
+    created_at: string;
+}
+
+export interface ProfileReservations {
+    reserved_items: number[]; // Distinct reserved food ids
+    reservations: Reservation[];
+    food_rows: ReservedFoodRow[];
+}
+
+/**
+ * Fetch a profile's reserved food, each row embedding its event summary
+ */
+export async function getProfileReservations(profileId: string): Promise<ProfileReservations>{
     try{
         const response = await fetch(`${API_BASE_URL}/profiles/${encodeURIComponent(profileId)}/reservations`);
         if(!response.ok){
@@ -175,10 +384,32 @@ export async function getProfileReservations(profileId: string): Promise<{ reser
         return await response.json();
     }catch(err){
         console.error('Error fetching profile reservations', err);
-        return { reserved_items: [], food_rows: [] };
+        return { reserved_items: [], reservations: [], food_rows: [] };
     }
 }
 
+export interface StockChange {
+    id: number;
+    quantity: number | null;
+    stockLevel: 'low' | 'medium' | 'high';
+}
+
+/**
+ * Follow an event's food stock over Server-Sent Events. `onSnapshot` gets the full
+ * food list on (re)connect, `onChange` every committed quantity change. Returns a
+ * function that closes the stream.
+ */
+export function subscribeToStock(
+    eventId: number | string,
+    onChange: (change: StockChange) => void,
+    onSnapshot?: (rows: any[]) => void,
+): () => void {
+    const source = new EventSource(`${API_BASE_URL}/events/${eventId}/food/stream`);
+    source.addEventListener('snapshot', (e) => onSnapshot?.(JSON.parse((e as MessageEvent).data).data || []));
+    source.addEventListener('stock', (e) => onChange(JSON.parse((e as MessageEvent).data)));
+    return () => source.close();
+}
+
 /**
  * Fetch food items for a specific event
  */
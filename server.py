@@ -1,16 +1,63 @@
 import os
-from fastapi import FastAPI, HTTPException, status, Request, File, UploadFile, Form
+from fastapi import APIRouter, FastAPI, HTTPException, status, Request, Response, File, UploadFile, Form, Query, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 import dotenv
+import httpx
 import uvicorn
-from supabase import create_client, Client
-from pydantic import BaseModel, Field, field_validator, ValidationInfo
-from typing import Optional, List
+from supabase import create_client
+from supabase.lib.client_options import SyncClientOptions
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator, ValidationInfo
+from typing import Any, Awaitable, BinaryIO, Callable, Iterator, NamedTuple, Optional, List
 from enum import Enum
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import abc
+import asyncio
+import base64
+import bisect
+import contextlib
+import contextvars
+import copy
+import csv
+import datetime
+import functools
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
 import json
-
-# Create the FastAPI app early so middleware and routes can be added
-app = FastAPI()
+import logging
+import logging.handlers
+import math
+import operator
+import queue
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zoneinfo
+from collections import OrderedDict
+import jwt
+from PIL import Image, ImageOps
+
+try:
+    import orjson
+except ImportError:  # responses fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # responses are gzip-compressed only
+    brotli = None
+
+# Routes are registered on this router and mounted by create_app()
+router = APIRouter()
 
 # Get allowed origins from environment or use defaults
 ALLOWED_ORIGINS = [
@@ -25,20 +72,120 @@ vercel_url = os.getenv("VERCEL_URL")
 if vercel_url:
     ALLOWED_ORIGINS.append(f"https://{vercel_url}")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=ALLOWED_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 dotenv.load_dotenv(dotenv_path='.env.local')
 
 # Support both NEXT_PUBLIC_ and regular env var names
 url: str = os.getenv("NEXT_PUBLIC_SUPABASE_URL") or os.getenv("SUPABASE_URL")
 key: str = os.getenv("NEXT_PUBLIC_SUPABASE_KEY") or os.getenv("SUPABASE_KEY")
 
+# Upper bound on Supabase calls running at once per worker. The supabase client is
+# synchronous, so every call is offloaded to a thread pool of this size.
+SUPABASE_MAX_CONCURRENCY = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "16"))
+
+# HTTP connection pool shared by the Supabase clients. The defaults give every worker
+# thread its own kept-alive connection, so bursts skip TCP/TLS setup; with HTTP/2
+# (needs the h2 package) requests are also multiplexed over those connections.
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", str(SUPABASE_MAX_CONCURRENCY)))
+SUPABASE_HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", str(SUPABASE_HTTP_MAX_CONNECTIONS)))
+SUPABASE_HTTP_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_SECONDS", "60"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1").lower() not in ("0", "false", "no")
+# Timeouts: establishing a connection, waiting on a read or write, and waiting for a free pooled connection
+SUPABASE_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+SUPABASE_HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_READ_TIMEOUT_SECONDS", "30"))
+SUPABASE_HTTP_POOL_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_POOL_TIMEOUT_SECONDS", "10"))
+# Retries of transient failures, and the base of their jittered exponential backoff
+SUPABASE_HTTP_RETRIES = int(os.getenv("SUPABASE_HTTP_RETRIES", "2"))
+SUPABASE_HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("SUPABASE_HTTP_RETRY_BACKOFF_SECONDS", "0.1"))
+
+# How many times the compare-and-set reservation fallback retries on a concurrent write
+RESERVE_CAS_ATTEMPTS = int(os.getenv("RESERVE_CAS_ATTEMPTS", "20"))
+
+# Local verification of Supabase access tokens. HS256 tokens are checked against the
+# project's JWT secret; asymmetric (RS256/ES256) tokens against the project's JWKS.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL") or (f"{url.rstrip('/')}/auth/v1/.well-known/jwks.json" if url else None)
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+# Verified tokens remembered per worker (until they expire)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
+# Seconds a rejected token is remembered, so one retried or replayed is not verified
+# (or sent to Supabase Auth) again on every request
+AUTH_REJECTED_TOKEN_SECONDS = float(os.getenv("AUTH_REJECTED_TOKEN_SECONDS", "30"))
+# Seconds a token Supabase Auth accepted is cached when it carries no `exp` claim
+AUTH_NO_EXP_TOKEN_SECONDS = float(os.getenv("AUTH_NO_EXP_TOKEN_SECONDS", "60"))
+# Least seconds between the JWKS refetches a token with an unknown key id triggers
+JWKS_REFETCH_INTERVAL_SECONDS = float(os.getenv("JWKS_REFETCH_INTERVAL_SECONDS", "60"))
+
+# GET /stats is served from an in-memory snapshot. After STATS_REFRESH_SECONDS the
+# snapshot is refreshed in the background while the old one keeps being served; a
+# snapshot older than STATS_MAX_STALENESS_SECONDS is never served.
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "60"))
+STATS_MAX_STALENESS_SECONDS = float(os.getenv("STATS_MAX_STALENESS_SECONDS", "300"))
+
+# Read-through cache for event and food listings. Entries are invalidated by writes
+# through this API; the TTL bounds staleness for writes made elsewhere. Set REDIS_URL
+# to share the cache between workers (requires the `redis` package).
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+# JSON and text responses of at least COMPRESSION_MIN_BYTES are sent brotli- (with the
+# `brotli` package) or gzip-compressed to clients that accept it. Cached listings keep
+# their compressed copies, so a hot list is compressed once per cache fill.
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+# Event image uploads are copied to a temp file in IMAGE_UPLOAD_CHUNK_BYTES chunks and
+# rejected past IMAGE_UPLOAD_MAX_BYTES. With IMAGE_UPLOAD_IN_BACKGROUND the push to
+# Storage happens after the response is sent and image_url is patched in afterwards.
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_UPLOAD_CHUNK_BYTES = 256 * 1024
+# Room left for the other form fields and multipart framing when UploadSizeLimitMiddleware
+# caps the whole request body ahead of form parsing
+IMAGE_UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+IMAGE_UPLOAD_IN_BACKGROUND = os.getenv("IMAGE_UPLOAD_IN_BACKGROUND", "1") not in ("0", "false", "False")
+
+# Per-worker cap on open /events/{id}/food/stream connections, and how often idle
+# streams get a keepalive comment so proxies do not close them
+STOCK_STREAM_MAX_SUBSCRIBERS = int(os.getenv("STOCK_STREAM_MAX_SUBSCRIBERS", "10000"))
+STOCK_STREAM_HEARTBEAT_SECONDS = float(os.getenv("STOCK_STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Widths (px) of the WebP/JPEG copies made of each event image for srcset, and the
+# size of the process pool that renders them.
+IMAGE_VARIANT_WIDTHS = tuple(sorted({int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",") if w.strip()}))
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+
+# Seconds before the in-memory dietary tag index is rebuilt from the Food table.
+# Inserts made through POST /food/ are applied immediately; the rebuild picks up
+# rows written by other workers or directly in Supabase.
+DIETARY_INDEX_TTL_SECONDS = float(os.getenv("DIETARY_INDEX_TTL_SECONDS", "300"))
+# Ids per `in` filter when events are fetched by id (GET /search/dietary); longer
+# lists are split over concurrent requests so no request URL grows with the match count
+EVENT_IDS_PER_QUERY = int(os.getenv("EVENT_IDS_PER_QUERY", "200"))
+
+# Rows per insert request during a bulk import (POST /import), and how many of those
+# requests may be outstanding before reading the file pauses
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "500"))
+IMPORT_MAX_IN_FLIGHT = int(os.getenv("IMPORT_MAX_IN_FLIGHT", "4"))
+# Per-row errors listed in an import report; all of them are counted
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# Time zone event dates and start/end times are entered in; GET /events/now
+# compares them against the current time there
+EVENT_TIMEZONE = zoneinfo.ZoneInfo(os.getenv("EVENT_TIMEZONE", "America/New_York"))
+
+# Seconds before the in-memory full-text index behind GET /search is rebuilt from
+# the Events and Food tables; writes through this worker are applied immediately.
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("SEARCH_INDEX_TTL_SECONDS", "600"))
+# Seconds an in-memory index waits after a failed rebuild before trying again,
+# answering from its last build meanwhile
+INDEX_REBUILD_RETRY_SECONDS = float(os.getenv("INDEX_REBUILD_RETRY_SECONDS", "30"))
+
+# Minimum level of the JSON log lines written to stdout, and the share of DEBUG
+# records kept (debug events can be very frequent; kept ones carry sample_rate)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
 
 # Simple stock level enum used by the reserve/cancel logic
 class StockLevel(str, Enum):
@@ -47,6 +194,21 @@ class StockLevel(str, Enum):
     LOW = "low"
 
 
+# Starting counts for food rows that have a stock level but no explicit quantity.
+# HIGH is treated as unlimited and never decremented.
+DERIVED_QUANTITY = {StockLevel.MEDIUM.value: 30, StockLevel.LOW.value: 7}
+
+
+def _stock_level_for(quantity: int) -> str:
+    """Map a remaining quantity onto a stock level: >30 high, >=8 medium, otherwise low."""
+    if quantity > 30:
+        return StockLevel.HIGH.value
+    if quantity >= 8:
+        return StockLevel.MEDIUM.value
+    # 1..7 left, or sold out -> keep low to indicate empty/low
+    return StockLevel.LOW.value
+
+
 # Request model for reserving an item
 class ReserveRequest(BaseModel):
     food_id: int
@@ -54,6 +216,20 @@ class ReserveRequest(BaseModel):
     profile_id: Optional[str] = None
 
 
+# Largest number of items accepted by POST /reserve/batch
+MAX_BATCH_ITEMS = 50
+
+
+class BatchReserveItem(BaseModel):
+    food_id: int
+    quantity: int = Field(..., gt=0)
+
+
+class BatchReserveRequest(BaseModel):
+    items: List[BatchReserveItem] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+    profile_id: Optional[str] = None
+
+
 # Model for adding food items
 class FoodItem(BaseModel):
     name: str
@@ -65,6 +241,118 @@ class FoodItem(BaseModel):
     pickup_instructions: Optional[str] = None
 
 
+# Columns of the Events table that list endpoints may project with `fields=`
+EVENT_FIELDS = (
+    "id", "name", "description", "organization", "location", "campus_location",
+    "food", "date", "start_time", "end_time", "image_url", "image_variants",
+    "latitude", "longitude",
+)
+
+# Events columns added by later migrations; writes drop them if PostgREST reports them missing
+OPTIONAL_EVENT_COLUMNS = ("image_variants", "latitude", "longitude")
+
+# Largest page a list endpoint will return in one response
+MAX_PAGE_SIZE = 200
+
+
+# Columns returned for each reserved food row and the event summary embedded in it
+RESERVED_FOOD_FIELDS = ("id", "name", "quantity", "stockLevel", "dietaryTags", "event_id")
+RESERVED_EVENT_FIELDS = (
+    "id", "name", "organization", "location", "campus_location", "date", "start_time", "end_time", "image_url",
+)
+
+
+class EventPage(BaseModel):
+    """Pagination, projection and filtering options shared by the event list endpoints.
+
+    Pages are keyset-ordered by (date, id) with undated events last; `after` is the
+    decoded cursor of the last row of the previous page, its date None for an undated row.
+    """
+    limit: Optional[int] = None
+    after: Optional[tuple] = None
+    fields: Optional[List[str]] = None
+    upcoming: bool = False
+
+    def columns(self) -> str:
+        if not self.fields:
+            return '*'
+        cols = list(self.fields)
+        # The cursor needs the sort keys even when the caller did not ask for them
+        if self.limit is not None:
+            cols += [c for c in ("date", "id") if c not in cols]
+        return ','.join(cols)
+
+    def apply(self, query: Any) -> Any:
+        """Push the upcoming filter, cursor, ordering and limit down into a PostgREST query."""
+        if self.upcoming:
+            query = query.gte('date', _local_now().date().isoformat())
+        if self.limit is None:
+            return query
+        if self.after is not None:
+            after_date, after_id = self.after
+            if after_date is None:
+                # Undated events come last, so past an undated row only undated rows remain
+                query = query.is_('date', 'null').gt('id', after_id)
+            else:
+                query = query.or_(f'date.gt.{after_date},and(date.eq.{after_date},id.gt.{after_id}),date.is.null')
+        # One extra row tells us whether another page exists
+        return query.order('date', nullsfirst=False).order('id').limit(self.limit + 1)
+
+    def merge(self, results: list) -> list:
+        """Combine the rows of several queries paged with `apply` into one page's rows."""
+        rows = [row for result in results for row in result]
+        if self.limit is None:
+            return rows
+        rows.sort(key=lambda row: (row.get('date') is None, row.get('date') or '', row.get('id')))
+        return rows[:self.limit + 1]
+
+    def split(self, rows: list) -> tuple:
+        """Trim the look-ahead row and return (page_rows, next_cursor)."""
+        if self.limit is None or len(rows) <= self.limit:
+            return rows, None
+        rows = rows[:self.limit]
+        last = rows[-1]
+        return rows, _encode_cursor(last.get('date'), last.get('id'))
+
+
+def _encode_cursor(date: Any, row_id: Any) -> str:
+    raw = json.dumps([date, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Both end up in a PostgREST filter, so only a real date (or null) and an integer pass
+        if date is not None:
+            date = datetime.date.fromisoformat(date).isoformat()
+        if not isinstance(row_id, int) or isinstance(row_id, bool):
+            raise ValueError(row_id)
+        return date, row_id
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def event_page(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    upcoming: bool = False,
+) -> EventPage:
+    """Parse the `limit`/`cursor`/`fields`/`upcoming` query parameters of a list endpoint."""
+    field_list = None
+    if fields:
+        field_list = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in field_list if f not in EVENT_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    if cursor and limit is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor requires limit")
+    after = _decode_cursor(cursor) if cursor else None
+    return EventPage(limit=limit, after=after, fields=field_list, upcoming=upcoming)
+
+
 # Minimal Event model for the POST /event/ endpoint. Allow extra fields.
 class Event(BaseModel):
     name: Optional[str] = None
@@ -73,15 +361,2214 @@ class Event(BaseModel):
 
     model_config = {"extra": "allow"}
 
-if not url or not key:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env.local file")
 
-supabase: Client = create_client(url, key)
+# Response models. Routes build them with only the keys they mean to send and are
+# registered with response_model_exclude_unset, so optional fields that were never
+# set are left out rather than sent as null.
+class EventOut(BaseModel):
+    """An event row as clients render it (the EVENT_FIELDS columns); other columns are dropped."""
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    organization: Optional[str] = None
+    location: Optional[str] = None
+    campus_location: Optional[str] = None
+    food: Optional[List[str]] = None
+    date: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    image_url: Optional[str] = None
+    image_variants: Optional[dict] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    # "pending" while the image is still being uploaded after the response
+    image_status: Optional[str] = None
+
+
+class EventsCreated(BaseModel):
+    data: List[EventOut]
+
+
+class FoodOut(BaseModel):
+    id: int
+    event_id: int
+    name: str
+    quantity: Optional[int] = None
+    stockLevel: Optional[str] = None
+
+
+class FoodCreated(BaseModel):
+    data: List[FoodOut]
+
+
+class StockUpdate(BaseModel):
+    """A food row's stock after a reservation or cancellation; `status` is set instead for unlimited items."""
+    id: Optional[int] = None
+    quantity: Optional[int] = None
+    stockLevel: Optional[str] = None
+    restored: Optional[int] = None
+    status: Optional[str] = None
+
+
+class ProfileUpdate(BaseModel):
+    updated: Optional[bool] = None
+    reservation_id: Optional[int] = None
+    removed: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ReserveResponse(BaseModel):
+    status: str
+    unlimited: Optional[bool] = None
+    food_update: Optional[StockUpdate] = None
+    profile_update: Optional[ProfileUpdate] = None
+
+
+class BatchItemResult(BaseModel):
+    food_id: int
+    status: Optional[str] = None
+    quantity: Optional[int] = None
+    stockLevel: Optional[str] = None
+    reservation_id: Optional[int] = None
+
+
+class BatchReserveResponse(BaseModel):
+    status: str
+    results: List[BatchItemResult]
+    profile_update: Optional[ProfileUpdate] = None
+
+
+class CancelResponse(BaseModel):
+    status: str
+    cancelled: List[int]
+    profile_update: Optional[ProfileUpdate] = None
+    food_update: Optional[StockUpdate] = None
+
+
+def _pick(row: dict, model: type) -> dict:
+    """The keys of a database row that `model` sends back to clients."""
+    return {k: v for k, v in row.items() if k in model.model_fields}
 
 
-def _extract_user_id_from_request(request: Optional[Request]) -> Optional[str]:
+def _split_cell(value: Any, sep: str) -> Any:
+    """Accept a list, a JSON array string, or a `sep`-separated string (how spreadsheets hold lists)."""
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [part.strip() for part in value.split(sep) if part.strip()]
+
+
+def _iso_date(value: str) -> str:
+    """An event date as YYYY-MM-DD; ValueError if it is not a date."""
+    return datetime.date.fromisoformat(value.strip()).isoformat()
+
+
+def _hh_mm(value: str) -> str:
+    """An event time as zero-padded HH:MM, so times compare correctly as text (GET /events/now)."""
+    match = re.fullmatch(r"(\d{1,2}):(\d{2})(?::\d{2})?", value.strip())
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError("expected HH:MM")
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def _check_event_times(start_time: str, end_time: str) -> None:
+    # GET /events/now matches an event on its own date only, so it cannot run past midnight
+    if end_time < start_time:
+        raise ValueError("end_time is before start_time; events cannot run past midnight")
+
+
+def _import_key(value: Any) -> Any:
+    """File-local event keys may be written as numbers; compare them as strings."""
+    return str(value) if isinstance(value, (int, float)) else value
+
+
+# An event row in a bulk import; the required fields match the POST /event/ form.
+# `ref` is a key local to the file that food rows use (`event_ref`) to attach to
+# this event before it has an id. JSONL rows may nest their food in `food_items`.
+class ImportEventRow(Event):
+    name: str = Field(..., min_length=1)
+    description: str
+    organization: str = ""
+    location: str
+    campus_location: str = ""
+    date: str
+    start_time: str
+    end_time: str
+    food: List[str] = []
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    ref: Optional[str] = None
+    food_items: List[dict] = []
+
+    model_config = {"extra": "ignore"}
+
+    @field_validator("food", mode="before")
+    @classmethod
+    def _split_food(cls, value: Any) -> Any:
+        return _split_cell(value, ";")
+
+    @field_validator("ref", mode="before")
+    @classmethod
+    def _ref_as_str(cls, value: Any) -> Any:
+        return _import_key(value)
+
+    @field_validator("date")
+    @classmethod
+    def _iso_date(cls, value: str) -> str:
+        return _iso_date(value)
+
+    @field_validator("start_time", "end_time")
+    @classmethod
+    def _hh_mm(cls, value: str) -> str:
+        return _hh_mm(value)
+
+    @model_validator(mode="after")
+    def _ends_after_start(self) -> "ImportEventRow":
+        _check_event_times(self.start_time, self.end_time)
+        return self
+
+
+# A food row in a bulk import, attached to an existing event by `event_id` or to
+# an event earlier in the same file by `event_ref`.
+class ImportFoodRow(FoodItem):
+    event_id: Optional[int] = None
+    event_ref: Optional[str] = None
+
+    model_config = {"extra": "ignore"}
+
+    @field_validator("dietaryTags", mode="before")
+    @classmethod
+    def _split_tags(cls, value: Any) -> Any:
+        return _split_cell(value, ",")
+
+    @field_validator("event_ref", mode="before")
+    @classmethod
+    def _ref_as_str(cls, value: Any) -> Any:
+        return _import_key(value)
+
+    @model_validator(mode="after")
+    def _has_event(self) -> "ImportFoodRow":
+        if self.event_id is None and self.event_ref is None:
+            raise ValueError("event_id or event_ref is required")
+        return self
+
+# --- Logging ---
+# Records are JSON objects, one per line. Handlers only enqueue; a listener thread
+# formats and writes them, so a slow stdout never stalls the event loop.
+logger = logging.getLogger("sparkbytes")
+
+# Id of the request being served, set by RequestIdMiddleware and stamped on every record
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_LOG_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Renders a record as one JSON line: ts, level, logger, msg, request_id plus any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in _LOG_RECORD_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the current request id on records and samples DEBUG records.
+
+    Runs in the logging thread's caller (the request's context), before the record is queued.
+    """
+
+    def __init__(self, debug_sample_rate: float = 1.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1.0:
+            if random.random() >= self.debug_sample_rate:
+                return False
+            record.sample_rate = self.debug_sample_rate
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps exceptions separate from the message for the JSON formatter."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(level: Optional[str] = None, stream: Any = None) -> None:
+    """Route the app's logger through a queue to a JSON handler on `stream` (stdout). Idempotent."""
+    global _log_listener
+    if _log_listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter(LOG_DEBUG_SAMPLE_RATE))
+    logger.addHandler(handler)
+    logger.setLevel((level or LOG_LEVEL).upper())
+    logger.propagate = False
+    _log_listener = logging.handlers.QueueListener(log_queue, output)
+    _log_listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and detach the queue handler."""
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    _log_listener = None
+    for handler in [h for h in logger.handlers if isinstance(h, _QueueHandler)]:
+        logger.removeHandler(handler)
+    logger.propagate = True
+
+
+class RequestIdMiddleware:
+    """Gives every HTTP request an id (the caller's X-Request-ID, or a fresh one) for its log records.
+
+    The id is echoed back in the X-Request-ID response header.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        # Accept the caller's id only if it is short and printable, so it cannot forge log lines
+        request_id = incoming if 0 < len(incoming) <= 128 and incoming.isprintable() else uuid.uuid4().hex
+
+        async def _send(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            request_id_var.reset(token)
+
+
+# Latency buckets (seconds) shared by the request and Supabase histograms
+METRIC_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _metric_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels; safe to bump from worker threads. Names end in _total."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[tuple]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _metric_labels(self.labels, labels), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, in the Prometheus layout."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = METRIC_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: Any) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, *labels: Any) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> Iterator[tuple]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), values):
+                cumulative += n
+                yield self.name + "_bucket", _metric_labels((*self.labels, "le"), (*labels, bound)), cumulative
+            label_text = _metric_labels(self.labels, labels)
+            yield self.name + "_count", label_text, cumulative
+            yield self.name + "_sum", label_text, values[-1]
+
+
+class Gauge:
+    """Gauge read at scrape time from `read`, which returns {label values: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], dict], labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.read = read
+
+    def samples(self) -> Iterator[tuple]:
+        for labels, value in self.read().items():
+            if value is not None:
+                yield self.name, _metric_labels(self.labels, labels), value
+
+
+class MetricsRegistry:
+    """Per-worker metrics, rendered in the Prometheus text format by GET /metrics."""
+
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+http_requests = metrics.register(Counter(
+    "http_requests_total", "HTTP requests served, by route template and status code", ("method", "route", "status")))
+http_request_duration = metrics.register(Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template", ("method", "route")))
+http_requests_in_flight = metrics.register(Gauge(
+    "http_requests_in_flight", "Requests being served right now", lambda: {(): MetricsMiddleware.in_flight}))
+supabase_request_duration = metrics.register(Histogram(
+    "supabase_request_duration_seconds",
+    "Supabase round trips (retries included, until response headers), by table or function and operation",
+    ("table", "operation")))
+supabase_request_errors = metrics.register(Counter(
+    "supabase_request_errors_total", "Supabase round trips that failed without a response", ("table", "operation")))
+supabase_request_retries = metrics.register(Counter(
+    "supabase_request_retries_total", "Supabase requests retried after a transient failure, by reason", ("reason",)))
+response_cache_lookups = metrics.register(Counter(
+    "response_cache_lookups_total", "Response cache lookups by result (hit or miss)", ("result",)))
+singleflight_calls = metrics.register(Counter(
+    "singleflight_calls_total",
+    "Backend reads by single-flight group, executed or coalesced into an identical read already in flight",
+    ("group", "result")))
+reservations = metrics.register(Counter(
+    "reservations_total", "Reservation attempts by outcome (batch items counted one by one)", ("outcome",)))
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request into the http_* metrics.
+
+    Requests are labelled with their route template (e.g. /events/{event_id}/food) so
+    ids do not explode the label set; paths no route matched share "unmatched".
+    """
+
+    in_flight = 0
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def _send(message: dict) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        MetricsMiddleware.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            MetricsMiddleware.in_flight -= 1
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route_path)
+            http_requests.inc(scope["method"], route_path, status_code)
+
+
+# PostgREST verb for each HTTP method
+SUPABASE_OPERATIONS = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "PUT": "upsert", "DELETE": "delete"}
+
+
+def _supabase_operation(request: httpx.Request) -> tuple:
+    """(table, operation) labels for a request to Supabase, e.g. ("Food", "update") or ("reserve_food", "rpc")."""
+    parts = request.url.path.strip("/").split("/")
+    if parts[:2] == ["rest", "v1"] and len(parts) > 2:
+        if parts[2] == "rpc" and len(parts) > 3:
+            return parts[3], "rpc"
+        return parts[2], SUPABASE_OPERATIONS.get(request.method, request.method.lower())
+    if parts[:2] == ["storage", "v1"]:
+        return "storage", request.method.lower()
+    return parts[0] or "other", request.method.lower()
+
+
+class SupabaseTransport(httpx.BaseTransport):
+    """HTTP transport shared by the Supabase clients: a sized keep-alive pool plus retries.
+
+    Failed connects are retried for every request, since nothing was sent. Idempotent
+    requests are also retried when a kept-alive connection drops mid-request or the
+    gateway answers 429/502/503/504. Waits use exponential backoff with full jitter.
+    Request, retry and connection counts are reported by `stats()` (GET /pool/stats).
+    """
+
+    RETRY_STATUSES = frozenset({429, 502, 503, 504})
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+    def __init__(
+        self,
+        retries: int = SUPABASE_HTTP_RETRIES,
+        backoff: float = SUPABASE_HTTP_RETRY_BACKOFF_SECONDS,
+        backoff_max: float = 2.0,
+        transport: Optional[httpx.BaseTransport] = None,
+        **pool_options: Any,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._transport = transport or httpx.HTTPTransport(**pool_options)
+        self._limits = pool_options.get("limits")
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retried: dict = {}  # reason -> count
+        self.failures = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        labels = _supabase_operation(request)
+        start = time.perf_counter()
+        try:
+            return self._send(request)
+        except httpx.TransportError:
+            supabase_request_errors.inc(*labels)
+            raise
+        finally:
+            supabase_request_duration.observe(time.perf_counter() - start, *labels)
+
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.requests += 1
+        idempotent = request.method in self.IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = self._transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                reason = type(e).__name__
+                if attempt >= self.retries:
+                    self._failed()
+                    raise
+            except (httpx.RemoteProtocolError, httpx.ReadError) as e:
+                reason = type(e).__name__
+                if attempt >= self.retries or not idempotent:
+                    self._failed()
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.retries or not idempotent:
+                    return response
+                reason = str(response.status_code)
+                response.close()
+            with self._lock:
+                self.retried[reason] = self.retried.get(reason, 0) + 1
+            supabase_request_retries.inc(reason)
+            time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    def _failed(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def stats(self) -> dict:
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", None) or [])
+        # httpcore has no public count of requests waiting for a free connection
+        waiting = sum(1 for r in getattr(pool, "_requests", None) or [] if getattr(r, "connection", True) is None)
+        with self._lock:
+            counters = {"requests": self.requests, "retries": dict(self.retried), "failures": self.failures}
+        return {
+            "max_connections": self._limits.max_connections if self._limits else None,
+            "max_keepalive_connections": self._limits.max_keepalive_connections if self._limits else None,
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "http2_connections": sum(1 for c in connections if "HTTP/2" in c.info()),
+            "waiting_for_connection": waiting,
+            **counters,
+        }
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_transport() -> SupabaseTransport:
+    """The pooled, retrying transport configured from the SUPABASE_HTTP_* settings."""
+    return SupabaseTransport(
+        http2=SUPABASE_HTTP2 and _http2_available(),
+        limits=httpx.Limits(
+            max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_HTTP_KEEPALIVE_SECONDS,
+        ),
+    )
+
+
+def _build_http_client(transport: httpx.BaseTransport) -> httpx.Client:
+    """The httpx client the Supabase clients share."""
+    timeout = httpx.Timeout(
+        connect=SUPABASE_HTTP_CONNECT_TIMEOUT_SECONDS,
+        read=SUPABASE_HTTP_READ_TIMEOUT_SECONDS,
+        write=SUPABASE_HTTP_READ_TIMEOUT_SECONDS,
+        pool=SUPABASE_HTTP_POOL_TIMEOUT_SECONDS,
+    )
+    return httpx.Client(transport=transport, timeout=timeout, follow_redirects=True)
+
+
+def _response_data(resp: Any) -> Any:
+    """Return the `data` payload of a supabase response (object with .data or a dict)."""
+    if resp is None:
+        return None
+    if isinstance(resp, dict):
+        return resp.get('data')
+    return getattr(resp, 'data', None)
+
+
+def _missing_column(error: APIError) -> Optional[str]:
+    """The column named in a PGRST204 "Could not find the 'x' column" error."""
+    match = re.search(r"Could not find the '([^']+)' column", error.message or "")
+    return match.group(1) if match else None
+
+
+def _local_now() -> datetime.datetime:
+    """The current wall-clock time in EVENT_TIMEZONE, which event dates and times are entered in."""
+    return datetime.datetime.now(EVENT_TIMEZONE)
+
+
+def _time_window_filter(start: datetime.datetime, end: datetime.datetime) -> str:
+    """PostgREST `or` filter for events that overlap the local-time window [start, end].
+
+    An event overlaps when it is on a day in the window, starts before the window
+    ends and ends after it starts; windows may cross midnight.
+    """
+    clauses = []
+    day = start.date()
+    while day <= end.date():
+        conditions = [f'date.eq."{day.isoformat()}"']
+        if day == end.date():
+            conditions.append(f'start_time.lte."{end:%H:%M}"')
+        if day == start.date():
+            conditions.append(f'end_time.gte."{start:%H:%M}"')
+        clauses.append(f"and({','.join(conditions)})")
+        day += datetime.timedelta(days=1)
+    return ",".join(clauses)
+
+
+EARTH_RADIUS_M = 6_371_000
+
+
+def _bounding_box(lat: float, lon: float, radius_m: float) -> tuple:
+    """(min_lat, max_lat, min_lon, max_lon) enclosing the circle of `radius_m` around a point."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def _distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class SupabaseRepository:
+    """Async data-access layer over the synchronous supabase client.
+
+    Every call runs on a bounded thread pool so a slow PostgREST round trip never
+    blocks the event loop; `max_concurrency` caps how many calls are in flight.
+    """
+
+    def __init__(self, client: Any, max_concurrency: int = SUPABASE_MAX_CONCURRENCY):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="supabase")
+        # Postgres functions PostgREST has reported missing (migration not applied)
+        self._missing_functions: set = set()
+        # Optional Events columns PostgREST has reported missing (migration not applied)
+        self._missing_event_columns: set = set()
+        # Calls submitted to the executor and not yet finished (running or queued), and the high-water mark
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def _run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_concurrency),
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    # --- Events ---
+    async def _select_events(self, page: Optional[EventPage], where: Callable[[Any], Any] = lambda q: q) -> list:
+        page = page or EventPage()
+
+        def _query():
+            query = where(self.client.table('Events').select(page.columns()))
+            return page.apply(query).execute()
+        return _response_data(await self._run(_query)) or []
+
+    async def list_events(self, page: Optional[EventPage] = None) -> list:
+        return await self._select_events(page)
+
+    async def list_events_by_ids(self, event_ids: list, page: Optional[EventPage] = None) -> list:
+        """Events with the given ids, EVENT_IDS_PER_QUERY ids per request, each paged in the database."""
+        page = page or EventPage()
+        chunks = [event_ids[i:i + EVENT_IDS_PER_QUERY] for i in range(0, len(event_ids), EVENT_IDS_PER_QUERY)]
+        results = await asyncio.gather(*(self._select_events(page, lambda q, ids=ids: q.in_('id', ids)) for ids in chunks))
+        return results[0] if len(results) == 1 else page.merge(results)
+
+    async def list_events_in_window(
+        self,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        campus_location: Optional[str] = None,
+        box: Optional[tuple] = None,
+        limit: Optional[int] = None,
+    ) -> list:
+        """Events overlapping [start, end], optionally on one campus and inside a lat/lon bounding box.
+
+        Every filter runs in the database (see the event_time_location migration for indexes).
+        """
+        def _query():
+            query = self.client.table('Events').select('*').or_(_time_window_filter(start, end))
+            if campus_location:
+                query = query.eq('campus_location', campus_location)
+            if box is not None:
+                min_lat, max_lat, min_lon, max_lon = box
+                query = query.gte('latitude', min_lat).lte('latitude', max_lat).gte('longitude', min_lon).lte('longitude', max_lon)
+            query = query.order('date').order('start_time').order('id')
+            return (query.limit(limit) if limit is not None else query).execute()
+        return _response_data(await self._run(_query)) or []
+
+    async def search_events_by_name(self, name: str, page: Optional[EventPage] = None) -> list:
+        return await self._select_events(page, lambda q: q.text_search("name", name, options={"config": "english"}))
+
+    async def search_events_by_food(self, food: str, page: Optional[EventPage] = None) -> list:
+        return await self._select_events(page, lambda q: q.contains("food", [food]))
+
+    async def insert_event(self, payload: dict) -> list:
+        return await self._write_event(lambda values: self.client.table('Events').insert(values), payload)
+
+    async def insert_events(self, payloads: list) -> list:
+        """Insert several events in one request; rows come back in the order given."""
+        return await self._write_event(lambda values: self.client.table('Events').insert(values), payloads)
+
+    async def update_event(self, event_id: int, values: dict) -> list:
+        return await self._write_event(lambda values: self.client.table('Events').update(values).eq('id', event_id), values)
+
+    async def _write_event(self, build: Callable[[Any], Any], values: Any) -> list:
+        """Run an Events insert/update of one row or a list, dropping optional columns that are not deployed."""
+        rows = values if isinstance(values, list) else [values]
+        rows = [{k: v for k, v in row.items() if k not in self._missing_event_columns} for row in rows]
+        values = rows if isinstance(values, list) else rows[0]
+        try:
+            resp = await self._run(lambda: build(values).execute())
+        except APIError as e:
+            # PGRST204: column not found in the schema cache (migration not applied)
+            missing = _missing_column(e) if e.code == 'PGRST204' else None
+            if missing not in OPTIONAL_EVENT_COLUMNS or not any(missing in row for row in rows):
+                raise
+            self._missing_event_columns.add(missing)
+            return await self._write_event(build, values)
+        return _response_data(resp) or []
+
+    async def upload_event_image(self, filename: str, file: Any, content_type: Optional[str]) -> str:
+        """Upload an image to the 'event images' bucket and return its public URL.
+
+        `file` may be bytes or a path; a path is streamed from disk by the storage client.
+        """
+        def _upload():
+            bucket = self.client.storage.from_('event images')
+            bucket.upload(path=filename, file=file, file_options={"content-type": content_type})
+            return bucket.get_public_url(filename)
+        return await self._run(_upload)
+
+    # --- Food ---
+    async def list_food(self) -> list:
+        resp = await self._run(lambda: self.client.table('Food').select('*').execute())
+        return _response_data(resp) or []
+
+    async def list_food_text(self) -> list:
+        """Return `id`, `event_id`, `name` and `description` for every food row (used to build the search index)."""
+        resp = await self._run(lambda: self.client.table('Food').select('id, event_id, name, description').execute())
+        return _response_data(resp) or []
+
+    async def list_food_tags(self) -> list:
+        """Return just `event_id` and `dietaryTags` for every food row (used to build the tag index)."""
+        resp = await self._run(lambda: self.client.table('Food').select('event_id, dietaryTags').execute())
+        return _response_data(resp) or []
+
+    async def list_food_for_event(self, event_id: int) -> Optional[list]:
+        resp = await self._run(lambda: self.client.table('Food').select('*').eq('event_id', event_id).execute())
+        return _response_data(resp)
+
+    async def reserve_food(self, food_id: int, quantity: int, profile_id: Optional[str] = None) -> dict:
+        """Atomically reserve `quantity` of a food item and record it for the profile.
+
+        Calls the `reserve_food` Postgres function (see supabase/migrations), which
+        decrements, recomputes the stock level and inserts the `reservations` row in one
+        round trip. Returns a dict whose `status` is one of ok, unlimited, not_found,
+        oversold, invalid or conflict, plus `reservation_id` when one was recorded.
+        """
+        params = {"p_food_id": food_id, "p_quantity": quantity, "p_profile_id": profile_id}
+        result = await self._rpc_or_fallback(
+            'reserve_food', params, lambda: self._run(self._reserve_food_fallback, food_id, quantity, profile_id)
+        )
+        return result or {"status": "not_found"}
+
+    async def _rpc_or_fallback(self, name: str, params: dict, fallback: Callable[[], Awaitable[Any]]) -> Any:
+        """Call the Postgres function `name` and return its data, or `await fallback()` if it is not deployed.
+
+        PGRST202 (function not in the schema cache: the migration was not applied)
+        marks the function missing, so later calls go straight to the fallback.
+        """
+        if name not in self._missing_functions:
+            try:
+                return _response_data(await self._run(lambda: self.client.rpc(name, params).execute()))
+            except APIError as e:
+                if e.code != 'PGRST202':
+                    raise
+                self._missing_functions.add(name)
+        return await fallback()
+
+    def _apply_stock_delta(self, food_id: int, delta: int) -> dict:
+        """Compare-and-set `quantity += delta` on a food row, retried on conflict.
+
+        The update is filtered on the quantity that was read, so concurrent callers
+        cannot oversell. A null quantity is derived from stockLevel when taking stock
+        and treated as unlimited when giving it back. Returns a dict whose `status` is
+        one of ok, unlimited, not_found, oversold, invalid or conflict.
+        """
+        for _ in range(RESERVE_CAS_ATTEMPTS):
+            rows = _response_data(
+                self.client.table('Food').select('quantity, stockLevel, event_id').eq('id', food_id).execute()
+            )
+            if not rows:
+                return {"status": "not_found", "food_id": food_id}
+            row = rows[0]
+            current_qty = row.get('quantity')
+            stock_level = row.get('stockLevel')
+            event_id = row.get('event_id')
+
+            if current_qty is None:
+                if delta > 0 or stock_level == StockLevel.HIGH.value:
+                    return {"status": "unlimited", "food_id": food_id, "event_id": event_id}
+                if stock_level not in DERIVED_QUANTITY:
+                    return {"status": "invalid", "food_id": food_id, "detail": "Current quantity missing and stock level unavailable"}
+                start_qty = DERIVED_QUANTITY[stock_level]
+            else:
+                start_qty = int(current_qty)
+
+            new_qty = start_qty + delta
+            if new_qty < 0:
+                return {"status": "oversold", "food_id": food_id, "available": start_qty}
+            new_stock = _stock_level_for(new_qty)
+
+            update = self.client.table('Food').update({'quantity': new_qty, 'stockLevel': new_stock}).eq('id', food_id)
+            # Only applies if nobody changed the quantity since we read it
+            update = update.is_('quantity', 'null') if current_qty is None else update.eq('quantity', current_qty)
+            if _response_data(update.execute()):
+                return {
+                    "status": "ok",
+                    "food_id": food_id,
+                    "event_id": event_id,
+                    "quantity": new_qty,
+                    "stockLevel": new_stock,
+                }
+        return {"status": "conflict", "food_id": food_id}
+
+    def _record_reservations(self, profile_id: str, items: list, response: dict) -> list:
+        """Insert one reservations row per (food_id, quantity) in a single request; returns the new ids.
+
+        Sets `profile_updated` on the reservation's `response`. A failure to record does
+        not fail the reservation: it is reported as `profile_error` and no ids are returned.
+        """
+        rows = [{'profile_id': profile_id, 'food_id': food_id, 'quantity': quantity} for food_id, quantity in items]
+        try:
+            inserted = _response_data(self.client.table('reservations').insert(rows).execute()) or []
+        except Exception as e:
+            response.update(profile_updated=False, profile_error=str(e))
+            return []
+        response["profile_updated"] = True
+        return [r['id'] for r in inserted]
+
+    def _reserve_food_fallback(self, food_id: int, quantity: int, profile_id: Optional[str]) -> dict:
+        """In-process reservation used when the `reserve_food` function is not deployed."""
+        result = self._apply_stock_delta(food_id, -quantity)
+        if result["status"] not in ("ok", "unlimited"):
+            return result
+
+        result["profile_updated"] = False
+        if profile_id:
+            ids = self._record_reservations(profile_id, [(food_id, quantity)], result)
+            if ids:
+                result["reservation_id"] = ids[0]
+        return result
+
+    async def reserve_food_batch(self, items: list, profile_id: Optional[str] = None) -> dict:
+        """Reserve several (food_id, quantity) pairs all-or-nothing.
+
+        Calls the `reserve_food_batch` Postgres function, which locks every row, checks
+        them all and only then decrements and records them, in one round trip. Returns
+        {'status': 'ok' | 'failed', 'results': [...]} with one result per food id; on
+        failure nothing is reserved and the items that would have succeeded are 'skipped'.
+        """
+        params = {
+            "p_items": [{"food_id": food_id, "quantity": quantity} for food_id, quantity in items],
+            "p_profile_id": profile_id,
+        }
+        return await self._rpc_or_fallback(
+            'reserve_food_batch', params, lambda: self._reserve_food_batch_fallback(items, profile_id)
+        )
+
+    async def _reserve_food_batch_fallback(self, items: list, profile_id: Optional[str]) -> dict:
+        """Batch reservation used when `reserve_food_batch` is not deployed.
+
+        Every item is decremented concurrently with `_apply_stock_delta`; if any of them
+        fails, the ones that went through are given back. Other clients can briefly see
+        the reduced stock before that compensation lands.
+        """
+        results = list(await asyncio.gather(*(
+            self._run(self._apply_stock_delta, food_id, -quantity) for food_id, quantity in items
+        )))
+        if any(r["status"] not in ("ok", "unlimited") for r in results):
+            taken = [(food_id, quantity) for (food_id, quantity), r in zip(items, results) if r["status"] == "ok"]
+            await asyncio.gather(*(self._run(self._apply_stock_delta, food_id, quantity) for food_id, quantity in taken))
+            for r in results:
+                if r["status"] in ("ok", "unlimited"):
+                    r.update(status="skipped")
+                    r.pop("quantity", None)
+                    r.pop("stockLevel", None)
+            return {"status": "failed", "results": results}
+
+        response = {"status": "ok", "results": results, "profile_updated": False}
+        if profile_id:
+            ids = await self._run(self._record_reservations, profile_id, items, response)
+            for r, reservation_id in zip(results, ids):
+                r["reservation_id"] = reservation_id
+        return response
+
+    async def cancel_reservation(self, profile_id: str, reservation_id: Optional[int] = None,
+                                 food_id: Optional[int] = None) -> dict:
+        """Cancel one reservation, or all of the profile's reservations of a food, restoring their quantity.
+
+        Goes through the `cancel_reservation` Postgres function when deployed. Returns a dict
+        whose `status` is ok, unlimited (nothing to restore) or not_found (nothing left to
+        cancel, e.g. a retried request), with the `cancelled` reservation ids.
+        """
+        params = {"p_profile_id": profile_id, "p_reservation_id": reservation_id, "p_food_id": food_id}
+        result = await self._rpc_or_fallback(
+            'cancel_reservation', params,
+            lambda: self._run(self._cancel_reservation_fallback, profile_id, reservation_id, food_id),
+        )
+        return result or {"status": "not_found", "cancelled": []}
+
+    def _cancel_reservation_fallback(self, profile_id: str, reservation_id: Optional[int],
+                                     food_id: Optional[int]) -> dict:
+        """In-process cancel used when the `cancel_reservation` function is not deployed.
+
+        Deleting the rows first means only one of several concurrent cancels gets them
+        back, and so only that one restores stock through `_apply_stock_delta`. If the
+        stock cannot be restored the rows are put back, so the cancel can be retried
+        without losing their quantity.
+        """
+        query = self.client.table('reservations').delete().eq('profile_id', profile_id)
+        if reservation_id is not None:
+            query = query.eq('id', reservation_id)
+        if food_id is not None:
+            query = query.eq('food_id', food_id)
+        removed = _response_data(query.execute()) or []
+        if not removed:
+            return {"status": "not_found", "cancelled": []}
+        cancelled = sorted(r['id'] for r in removed)
+        restored = sum(r['quantity'] for r in removed)
+        try:
+            result = self._apply_stock_delta(removed[0]['food_id'], restored)
+        except Exception:
+            self.client.table('reservations').insert(removed).execute()
+            raise
+        if result["status"] == "conflict":
+            self.client.table('reservations').insert(removed).execute()
+            return {**result, "cancelled": []}
+        result["cancelled"] = cancelled
+        if result["status"] == "ok":
+            result["restored"] = restored
+        return result
+
+    async def insert_food(self, items: list) -> list:
+        resp = await self._run(lambda: self.client.table('Food').insert(items).execute())
+        return _response_data(resp) or []
+
+    # --- Profiles ---
+    async def get_profile_reservations(self, profile_id: str) -> dict:
+        """Return the profile's reservations with each reserved food row and its event summary.
+
+        A single `reservations` query embedding Food and Events. `food_rows` holds each
+        food once, with the total `reserved_quantity` across its reservations.
+        """
+        columns = (
+            f"id,food_id,quantity,created_at,"
+            f"food:Food({','.join(RESERVED_FOOD_FIELDS)},event:Events({','.join(RESERVED_EVENT_FIELDS)}))"
+        )
+        resp = await self._run(
+            lambda: self.client.table('reservations').select(columns).eq('profile_id', profile_id).order('id').execute()
+        )
+        reservations, food_rows = [], {}
+        for row in _response_data(resp) or []:
+            food = row.pop('food', None)
+            reservations.append(row)
+            if food is None:
+                continue
+            entry = food_rows.setdefault(row['food_id'], {**food, 'reserved_quantity': 0})
+            entry['reserved_quantity'] += row['quantity']
+        return {'reserved_items': list(food_rows), 'reservations': reservations, 'food_rows': list(food_rows.values())}
+
+    # --- Auth ---
+    async def get_auth_user(self, token: str) -> Any:
+        """Resolve an access token through Supabase Auth; returns None when it cannot be resolved."""
+        def _get_user():
+            # supabase-python has varied APIs across versions; try common ones.
+            try:
+                return self.client.auth.get_user(token)
+            except Exception:
+                try:
+                    # alternate signature
+                    return self.client.auth.get_user(access_token=token)
+                except Exception:
+                    return None
+        return await self._run(_get_user)
+
+    # --- Stats ---
+    async def count_rows(self, table: str) -> int:
+        """Count a table's rows with a HEAD request, so no rows are transferred."""
+        resp = await self._run(lambda: self.client.table(table).select('id', count='exact', head=True).execute())
+        return getattr(resp, 'count', None) or 0
+
+
+def _normalize_tags(dietary_tags: Any) -> List[str]:
+    """Lowercase a food row's dietaryTags, which may be a list or a comma-separated string."""
+    if not dietary_tags:
+        return []
+    if isinstance(dietary_tags, str):
+        return [tag.strip().lower() for tag in dietary_tags.split(',') if tag.strip()]
+    return [str(tag).strip().lower() for tag in dietary_tags]
+
+
+class _RebuiltIndex(abc.ABC):
+    """Freshness and rebuild machinery shared by the in-memory indexes.
+
+    Subclasses implement `_build`, which reads the source tables and returns the
+    index contents, kept in `_contents`. The first build is waited for; after
+    that, once the contents are `ttl` seconds old, a single background task
+    rebuilds them while the old ones keep answering. Changes made through `_apply`
+    during a rebuild are replayed onto its result. A failed rebuild is logged and
+    not retried for INDEX_REBUILD_RETRY_SECONDS, so an outage does not turn every
+    request into another full-table read.
+    """
+
+    name = "index"
+
+    def __init__(self, ttl: float, contents: Any):
+        self.ttl = ttl
+        self._contents = contents
+        self._built = False
+        self._built_at: Optional[float] = None
+        self._retry_at = 0.0
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # Changes made during a rebuild, replayed onto its result
+        self._replay: Optional[list] = None
+
+    def is_fresh(self) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at < self.ttl
+
+    async def ensure_fresh(self, repo: "SupabaseRepository") -> None:
+        if self.is_fresh():
+            return
+        if time.monotonic() < self._retry_at:
+            if self._built:
+                return
+            raise RuntimeError(f"The {self.name} could not be built; retrying in a moment")
+        rebuild = self._rebuild_once(repo)
+        if not self._built:
+            # Shielded: a client that goes away must not cancel the build others wait on
+            await asyncio.shield(rebuild)
+
+    def warm(self, repo: "SupabaseRepository") -> asyncio.Task:
+        """Start building in the background so the first request does not wait for it."""
+        return self._rebuild_once(repo)
+
+    def _rebuild_once(self, repo: "SupabaseRepository") -> asyncio.Task:
+        """Start a rebuild unless one is already running; returns the in-flight task."""
+        task = self._rebuild_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            # Buffer changes from now on: ones landing before the read may be missed by it
+            self._replay = []
+            task = self._rebuild_task = asyncio.ensure_future(self._rebuild(repo))
+            task.add_done_callback(self._rebuild_done)
+        return task
+
+    def _rebuild_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            self._retry_at = time.monotonic() + INDEX_REBUILD_RETRY_SECONDS
+            logger.error(f"Error building {self.name}", exc_info=task.exception())
+
+    async def _rebuild(self, repo: "SupabaseRepository") -> None:
+        try:
+            contents = await self._build(repo)
+            for change in self._replay:
+                change(contents)
+        finally:
+            self._replay = None
+        self._contents = contents
+        self._built_at = time.monotonic()
+        self._built = True
+
+    @abc.abstractmethod
+    async def _build(self, repo: "SupabaseRepository") -> Any:
+        """Read the source tables and return the index contents."""
+
+    def _apply(self, change: Callable[[Any], None]) -> None:
+        change(self._contents)
+        if self._replay is not None:
+            self._replay.append(change)
+
+
+class DietaryTagIndex(_RebuiltIndex):
+    """In-memory inverted index from dietary tag to the ids of events serving food with that tag.
+
+    Built from the Food table on first use and rebuilt in the background after `ttl`
+    seconds; rows inserted through this worker are added incrementally with
+    `add_food_rows`.
+    """
+
+    name = "dietary tag index"
+
+    def __init__(self, ttl: float = DIETARY_INDEX_TTL_SECONDS):
+        super().__init__(ttl, {})
+
+    async def _build(self, repo: "SupabaseRepository") -> dict:
+        by_tag: dict = {}
+        _index_tags(by_tag, await repo.list_food_tags())
+        return by_tag
+
+    def add_food_rows(self, rows: list) -> None:
+        self._apply(lambda by_tag: _index_tags(by_tag, rows))
+
+    def match(self, tags: List[str], mode: str = "any") -> set:
+        """Return event ids matching any (OR) or all (AND) of the given normalized tags."""
+        sets = [self._contents.get(tag, set()) for tag in tags]
+        if not sets:
+            return set()
+        if mode == "all":
+            return set.intersection(*sets)
+        return set.union(*sets)
+
+
+def _index_tags(by_tag: dict, rows: list) -> None:
+    for row in rows:
+        event_id = row.get('event_id')
+        if event_id is None:
+            continue
+        for tag in _normalize_tags(row.get('dietaryTags')):
+            by_tag.setdefault(tag, set()).add(event_id)
+
+
+# Relative weight of a word by the event field it appears in: a match in the name
+# counts three times one in the description. "food" holds the names of the event's
+# food, from both the Events.food array and its Food rows.
+SEARCH_FIELD_WEIGHTS = {
+    "name": 3.0,
+    "food": 2.0,
+    "organization": 1.5,
+    "location": 1.0,
+    "campus_location": 1.0,
+    "description": 1.0,
+    "food_description": 0.5,
+}
+SEARCH_STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+# Query words of at least this many characters also match longer words they start
+# with, and at least SEARCH_TYPO_MIN_LENGTH characters words one typo away
+SEARCH_PREFIX_MIN_LENGTH = 2
+SEARCH_TYPO_MIN_LENGTH = 4
+# Cap on the words one prefix expands to (the most common are kept)
+SEARCH_MAX_EXPANSIONS = 32
+SEARCH_TYPO_WEIGHT = 0.6
+# Matches read from one query word at a time before picking the word to read next
+SEARCH_READ_BLOCK = 64
+_SEARCH_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _search_tokens(text: Any) -> List[str]:
+    """Lower-cased words of `text`, without stopwords."""
+    if not text:
+        return []
+    return [t for t in _SEARCH_TOKEN_RE.findall(str(text).lower()) if t not in SEARCH_STOPWORDS]
+
+
+def _food_names(value: Any) -> List[str]:
+    """Names from an Events.food value (a JSON array of names, occasionally a bare string).
+
+    Also normalizes the `food` form field of POST /event/: {"name": ...} objects become
+    their name, other scalars their str(), and anything but a list or string nothing.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    names = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get('name')
+        if item is not None and not isinstance(item, (dict, list)):
+            names.append(str(item))
+    return names
+
+
+def _one_deletes(term: str) -> set:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if `a` and `b` differ by at most one insertion, deletion, substitution or adjacent swap."""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return (
+        a[i + 1:] == b[i + 1:]
+        or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+    )
+
+
+class _SearchCorpus:
+    """Postings and lookup tables for EventSearchIndex. Each rebuild makes a new one."""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.rows: dict = {}        # event id -> event row returned by /search
+        self.food: dict = {}        # event id -> {food id: (name, description)} from the Food table
+        self.doc_terms: dict = {}   # event id -> {term: field-weighted term frequency}
+        self.doc_len: dict = {}     # event id -> sum of its weighted term frequencies
+        self.postings: dict = {}    # term -> {event id: BM25 term weight (before idf)}
+        self.ranked: dict = {}      # term -> [(event id, weight)] best first, sorted on first use
+        self.vocab: list = []       # every term, sorted, for prefix lookups
+        self.deletes: dict = {}     # term with one character removed -> terms, for typo lookups
+        self.total_len = 0.0
+        # Average document length the weights are normalized by; fixed at build time
+        # so incremental inserts do not have to re-weight every posting
+        self.avg_len = 0.0
+        self._bulk = False
+
+    @classmethod
+    def build(cls, events: list, food_rows: list) -> "_SearchCorpus":
+        corpus = cls()
+        corpus._set_food(food_rows)
+        # Collect raw term frequencies first: the weights need the final average length
+        corpus._bulk = True
+        for event in events:
+            corpus.index_event(event)
+        corpus._bulk = False
+        corpus.avg_len = corpus.total_len / len(corpus.doc_len) if corpus.total_len else 0.0
+        k1, b, avg_len = cls.K1, cls.B, corpus.avg_len or 1.0
+        norms = {event_id: k1 * (1 - b + b * length / avg_len) for event_id, length in corpus.doc_len.items()}
+        for postings in corpus.postings.values():
+            for event_id, tf in postings.items():
+                postings[event_id] = tf * (k1 + 1) / (tf + norms[event_id])
+        corpus.vocab = sorted(corpus.postings)
+        return corpus
+
+    def _weight(self, tf: float, length: float) -> float:
+        if not self.avg_len:
+            self.avg_len = length or 1.0
+        return tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / self.avg_len))
+
+    def index_event(self, event: dict) -> None:
+        """Add an event, replacing any earlier version of it."""
+        event_id = event.get('id')
+        if event_id is None:
+            return
+        self.remove_event(event_id)
+        foods = list(self.food.get(event_id, {}).values())
+        # Food names usually appear in both Events.food and the Food rows; count them once
+        food_names = {}
+        for name in _food_names(event.get('food')) + [name for name, _ in foods]:
+            if name:
+                food_names.setdefault(str(name).lower(), name)
+        fields = {field: [event.get(field)] for field in ("name", "organization", "location", "campus_location", "description")}
+        fields["food"] = list(food_names.values())
+        fields["food_description"] = [description for _, description in foods]
+
+        terms: dict = {}
+        for field, texts in fields.items():
+            weight = SEARCH_FIELD_WEIGHTS[field]
+            for text in texts:
+                for term in _search_tokens(text):
+                    terms[term] = terms.get(term, 0.0) + weight
+
+        self.rows[event_id] = event
+        self.doc_terms[event_id] = terms
+        self.doc_len[event_id] = length = sum(terms.values())
+        self.total_len += length
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self._add_term(term)
+            postings[event_id] = tf if self._bulk else self._weight(tf, length)
+            self.ranked.pop(term, None)
+
+    def _set_food(self, rows: list) -> set:
+        # Keyed by food id so a row replayed onto a rebuild that already has it is not counted twice
+        for row in rows:
+            self.food.setdefault(row.get('event_id'), {})[row.get('id')] = (row.get('name'), row.get('description'))
+        return {row.get('event_id') for row in rows}
+
+    def add_food(self, rows: list) -> None:
+        for event_id in self._set_food(rows):
+            if event_id in self.rows:
+                self.index_event(self.rows[event_id])
+
+    def remove_event(self, event_id: Any) -> None:
+        terms = self.doc_terms.pop(event_id, None)
+        if terms is None:
+            return
+        del self.rows[event_id]
+        self.total_len -= self.doc_len.pop(event_id)
+        for term in terms:
+            postings = self.postings[term]
+            del postings[event_id]
+            self.ranked.pop(term, None)
+            if not postings:
+                del self.postings[term]
+                self._drop_term(term)
+
+    def _add_term(self, term: str) -> None:
+        if not self._bulk:
+            bisect.insort(self.vocab, term)
+        if len(term) >= SEARCH_TYPO_MIN_LENGTH - 1:
+            for deleted in _one_deletes(term):
+                self.deletes.setdefault(deleted, []).append(term)
+
+    def _drop_term(self, term: str) -> None:
+        i = bisect.bisect_left(self.vocab, term)
+        if i < len(self.vocab) and self.vocab[i] == term:
+            del self.vocab[i]
+        if len(term) >= SEARCH_TYPO_MIN_LENGTH - 1:
+            for deleted in _one_deletes(term):
+                terms = self.deletes[deleted]
+                terms.remove(term)
+                if not terms:
+                    del self.deletes[deleted]
+
+    def _ranked(self, term: str) -> list:
+        ranked = self.ranked.get(term)
+        if ranked is None:
+            ranked = self.ranked[term] = sorted(self.postings[term].items(), key=operator.itemgetter(1), reverse=True)
+        return ranked
+
+    def _expand(self, token: str) -> dict:
+        """Indexed terms a query word matches, weighted 1 for the word itself and less for prefix and typo matches."""
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        if len(token) >= SEARCH_PREFIX_MIN_LENGTH:
+            start = bisect.bisect_left(self.vocab, token)
+            end = bisect.bisect_left(self.vocab, token[:-1] + chr(ord(token[-1]) + 1), start)
+            prefixed = self.vocab[start:end]
+            if len(prefixed) > SEARCH_MAX_EXPANSIONS:
+                prefixed = heapq.nlargest(SEARCH_MAX_EXPANSIONS, prefixed, key=lambda term: len(self.postings[term]))
+            for term in prefixed:
+                # "pizz" is a better match for "pizza" than "pi" is
+                matches.setdefault(term, 0.5 + 0.4 * len(token) / len(term))
+        if len(token) >= SEARCH_TYPO_MIN_LENGTH:
+            # Symmetric deletes: a term one edit away shares the query, or one of its
+            # one-character deletions, with the term or one of the term's deletions
+            deletions = _one_deletes(token)
+            candidates = set(self.deletes.get(token, ()))
+            for deleted in deletions:
+                if deleted in self.postings:
+                    candidates.add(deleted)
+                candidates.update(self.deletes.get(deleted, ()))
+            for term in candidates:
+                if term not in matches and _within_one_edit(token, term):
+                    matches[term] = SEARCH_TYPO_WEIGHT
+        return matches
+
+    def search(self, query: str, limit: int, offset: int = 0) -> tuple:
+        """Return ([(event row, score)] for one page, number of matching events), best first."""
+        n_docs = len(self.doc_terms)
+        # Per query word, the terms it matches and the idf-times-match-weight each is scaled by
+        words = []
+        for token in dict.fromkeys(_search_tokens(query)):
+            expansions = {}
+            for term, weight in self._expand(token).items():
+                df = len(self.postings[term])
+                expansions[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * weight
+            if expansions:
+                words.append(expansions)
+        if not words:
+            return [], 0
+        matched = [self.postings[term] for expansions in words for term in expansions]
+        total = len(matched[0]) if len(matched) == 1 else len(set().union(*matched))
+        scores = self._top_scores(words, offset + limit)
+        ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(self.rows[event_id], score) for event_id, score in ranked[offset:]], total
+
+    def _top_scores(self, words: list, k: int) -> dict:
+        """Scores of the k best events (more on ties), using the threshold algorithm.
+
+        Each query word's matches are read best first, a block at a time, and every
+        new event is scored in full; reading stops once the k-th best score seen beats
+        the most an unseen event could still score (the sum of the scores just read).
+        The next block comes from the word expected to lower that sum the most per
+        match read: the one whose scores fell fastest over its last block or, when
+        scores are flat, the one with the fewest matches left to finish reading, so
+        common words need not be scanned to the end.
+        """
+        # Words matching one term add that term's weight; prefix and typo words the best of theirs
+        exact = [(self.postings[term].get, scale) for expansions in words if len(expansions) == 1 for term, scale in expansions.items()]
+        fuzzy = [[(self.postings[term].get, scale) for term, scale in expansions.items()] for expansions in words if len(expansions) > 1]
+
+        def score(event_id: Any) -> float:
+            total = 0.0
+            for get, scale in exact:
+                total += get(event_id, 0.0) * scale
+            for lookups in fuzzy:
+                total += max(get(event_id, 0.0) * scale for get, scale in lookups)
+            return total
+
+        streams, heads, left = [], [], []
+        for expansions in words:
+            ranked = [(self._ranked(term), scale) for term, scale in expansions.items()]
+            scaled = [_scaled_stream(postings, scale) for postings, scale in ranked]
+            streams.append(scaled[0] if len(scaled) == 1 else heapq.merge(*scaled, key=operator.itemgetter(1), reverse=True))
+            heads.append(max(postings[0][1] * scale for postings, scale in ranked))
+            left.append(sum(len(postings) for postings, _ in ranked))
+        # How much each word's score fell per match over its last block; unread words go first
+        falls = [math.inf] * len(streams)
+        seen: dict = {}
+        best: list = []  # min-heap of the k best scores so far
+        active = list(range(len(streams)))
+        while active and not (len(best) == k and best[0] > sum(heads)):
+            i = max(active, key=lambda i: max(falls[i], heads[i] / left[i]))
+            start, read = heads[i], 0
+            for event_id, heads[i] in itertools.islice(streams[i], SEARCH_READ_BLOCK):
+                read += 1
+                if event_id in seen:
+                    continue
+                seen[event_id] = event_score = score(event_id)
+                if len(best) < k:
+                    heapq.heappush(best, event_score)
+                elif event_score > best[0]:
+                    heapq.heapreplace(best, event_score)
+            left[i] -= read
+            if not left[i]:
+                heads[i] = 0.0
+                active.remove(i)
+            falls[i] = (start - heads[i]) / read
+        if len(best) < k:
+            return seen
+        return {event_id: event_score for event_id, event_score in seen.items() if event_score >= best[0]}
+
+
+def _scaled_stream(ranked: list, scale: float):
+    for event_id, weight in ranked:
+        yield event_id, weight * scale
+
+
+class EventSearchIndex(_RebuiltIndex):
+    """In-memory BM25 full-text index over events and the food they serve, behind GET /search.
+
+    Each event is one document made of its name, description, organization,
+    locations and the names and descriptions of its food, weighted per field by
+    SEARCH_FIELD_WEIGHTS. Query words also match the words they are a prefix of and,
+    from SEARCH_TYPO_MIN_LENGTH characters, words one typo away, at lower weight.
+    Built off the event loop at startup or on first use and rebuilt in the
+    background after `ttl` seconds; events and food written through this worker
+    are applied in place.
+    """
+
+    name = "search index"
+
+    def __init__(self, ttl: float = SEARCH_INDEX_TTL_SECONDS):
+        super().__init__(ttl, _SearchCorpus())
+
+    def __len__(self) -> int:
+        return len(self._contents.rows)
+
+    async def _build(self, repo: "SupabaseRepository") -> _SearchCorpus:
+        events, food_rows = await asyncio.gather(repo.list_events(), repo.list_food_text())
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _SearchCorpus.build, events, food_rows)
+
+    def add_events(self, rows: list) -> None:
+        # Copies: the route goes on to annotate the rows it returns
+        rows = [dict(row) for row in rows]
+        self._apply(lambda corpus: [corpus.index_event(row) for row in rows])
+
+    def update_event(self, event_id: Any, fields: dict) -> None:
+        def change(corpus: _SearchCorpus) -> None:
+            if event_id in corpus.rows:
+                corpus.index_event({**corpus.rows[event_id], **fields})
+        self._apply(change)
+
+    def add_food_rows(self, rows: list) -> None:
+        self._apply(lambda corpus: corpus.add_food(rows))
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        return self._contents.search(query, limit, offset)
+
+
+class StatsSnapshot:
+    """Dashboard statistics cached in memory and refreshed in the background.
+
+    Fresh snapshots (younger than `refresh_after`) are served as-is. Older ones are
+    still served while a single background task recounts the tables, unless they
+    are older than `max_staleness`, in which case the caller waits for the recount.
+    """
+
+    def __init__(self, refresh_after: float = STATS_REFRESH_SECONDS, max_staleness: float = STATS_MAX_STALENESS_SECONDS):
+        self.refresh_after = refresh_after
+        self.max_staleness = max(max_staleness, refresh_after)
+        self.data: Optional[dict] = None
+        self.refreshed_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def age(self) -> float:
+        if self.refreshed_at is None:
+            return float('inf')
+        return time.monotonic() - self.refreshed_at
+
+    async def get(self, repo: "SupabaseRepository") -> dict:
+        age = self.age()
+        if age >= self.max_staleness:
+            # Shielded: a client that goes away must not cancel the recount others wait on
+            await asyncio.shield(self._refresh_once(repo))
+        elif age >= self.refresh_after:
+            self._refresh_once(repo)
+        return self.data
+
+    def _refresh_once(self, repo: "SupabaseRepository") -> asyncio.Task:
+        """Start a refresh unless one is already running; returns the in-flight task."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh(repo))
+            self._refresh_task.add_done_callback(self._refresh_done)
+        return self._refresh_task
+
+    @staticmethod
+    def _refresh_done(task: asyncio.Task) -> None:
+        # Retrieves the exception, so a failed background recount is logged rather than lost
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error refreshing stats snapshot", exc_info=task.exception())
+
+    async def _refresh(self, repo: "SupabaseRepository") -> None:
+        # Events Tracked, Food Items Saved and Active Users, counted concurrently
+        total_events, total_food_items, active_users = await asyncio.gather(
+            repo.count_rows('Events'),
+            repo.count_rows('Food'),
+            repo.count_rows('profiles'),
+        )
+        self.data = {
+            "total_events": total_events,
+            "total_food_saved": total_food_items,
+            "active_users": active_users,
+            # Pounds Rescued
+            "total_pounds_rescued": total_food_items * 5,
+        }
+        self.refreshed_at = time.monotonic()
+
+
+def _accepted_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The content coding to answer an Accept-Encoding header with: "br", "gzip" or None."""
+    if not accept_encoding:
+        return None
+    offered = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    wildcard = offered.get('*', 0.0)
+    if brotli is not None and offered.get('br', wildcard) > 0:
+        return "br"
+    if offered.get('gzip', wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 keeps the output (and so the response) identical for identical bodies
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _vary(existing: Optional[str], value: str) -> str:
+    """Add `value` to a Vary header value unless it is already listed."""
+    if not existing:
+        return value
+    if value.lower() in (v.strip().lower() for v in existing.split(',')):
+        return existing
+    return f"{existing}, {value}"
+
+
+def _is_compressible(content_type: str) -> bool:
+    # Event streams must reach the client message by message, so they are never buffered
+    return content_type.startswith(("application/json", "text/")) and not content_type.startswith("text/event-stream")
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing JSON and text responses of at least `minimum_size` bytes.
+
+    Every compressible response gets `Vary: Accept-Encoding`, merged with the Vary the
+    CORS middleware sets. Responses that already have a Content-Encoding (cached lists
+    are served precompressed), event streams and HEAD requests pass through. Compressed
+    responses carry a weak ETag, since the bytes differ from the identity encoding.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        if scope["method"] != "HEAD":
+            encoding = _accepted_encoding(Headers(scope=scope).get("accept-encoding"))
+        start: Optional[dict] = None
+        chunks: List[bytes] = []
+
+        async def _send(message: dict) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if not _is_compressible(headers.get("content-type", "")):
+                    await send(message)
+                    return
+                headers["Vary"] = _vary(headers.get("vary"), "Accept-Encoding")
+                if encoding is None or "content-encoding" in headers or message["status"] in (204, 304):
+                    await send(message)
+                    return
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            if len(body) >= self.minimum_size:
+                body = _compress(body, encoding)
+                headers = MutableHeaders(scope=start)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, _send)
+
+
+class CachedBody(NamedTuple):
+    """A serialized JSON response body, its strong ETag (a hash of the body) and its
+    gzip/brotli copies, made when the body is at least COMPRESSION_MIN_BYTES."""
+    body: bytes
+    etag: str
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+    @classmethod
+    def of(cls, body: bytes) -> "CachedBody":
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        if len(body) < COMPRESSION_MIN_BYTES:
+            return cls(body, etag)
+        return cls(body, etag, _compress(body, "gzip"), _compress(body, "br") if brotli is not None else None)
+
+
+class SingleFlight:
+    """Coalesce concurrent identical reads into one call.
+
+    The first caller for a key runs `load`; callers arriving while it is in flight
+    await the same result (or exception) instead of issuing their own. Nothing is kept
+    once the call finishes, so no caller gets a result that started before it asked
+    unless the key says the data cannot have changed since. The call runs as its own
+    task: a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self.executed = 0
+        self.coalesced = 0
+        self._calls: dict = {}
+
+    async def do(self, key: Any, load: Callable[[], Any]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            singleflight_calls.inc(self.group, "coalesced")
+        else:
+            self.executed += 1
+            singleflight_calls.inc(self.group, "executed")
+            task = self._calls[key] = asyncio.ensure_future(load())
+            task.add_done_callback(functools.partial(self._done, key))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Any, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieved here too, so a failure nobody is left waiting for is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class ResponseCache(abc.ABC):
+    """Read-through cache for serialized GET responses, invalidated by tag.
+
+    Entries are tagged with what they depend on: "events" for event listings and
+    "event:<id>" for one event's food. Each tag carries a version that writes bump,
+    so a load that raced with a write is never stored. Concurrent misses for the same
+    key and tag versions share one load; a write bumps the versions, so requests made
+    after it start a fresh load rather than joining one that began before it.
+    Subclasses provide storage.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.flights = SingleFlight("response_cache")
+
+    async def get_or_load(self, key: str, tags: List[str], load: Callable[[], Any]) -> Any:
+        versions = await self._versions(tags)
+        cached = await self._get(key, versions)
+        if cached is not None:
+            self.hits += 1
+            response_cache_lookups.inc("hit")
+            return cached
+        self.misses += 1
+        response_cache_lookups.inc("miss")
+        return await self.flights.do((key, versions), lambda: self._load(key, tags, versions, load))
+
+    async def _load(self, key: str, tags: List[str], versions: tuple, load: Callable[[], Any]) -> Any:
+        value = await load()
+        # Skip the store if a write invalidated one of our tags while we were loading
+        if await self._versions(tags) == versions:
+            await self._set(key, value, versions)
+        return value
+
+    async def invalidate(self, tags: List[str]) -> None:
+        if tags:
+            await self._bump(tags)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "coalesced": self.flights.coalesced,
+        }
+
+    @abc.abstractmethod
+    async def _versions(self, tags: List[str]) -> tuple:
+        """Current version of each tag, in order."""
+
+    @abc.abstractmethod
+    async def _bump(self, tags: List[str]) -> None:
+        """Advance the version of each tag, orphaning entries stored under the old ones."""
+
+    @abc.abstractmethod
+    async def _get(self, key: str, versions: tuple) -> Any:
+        """The value stored for key under these tag versions, or None."""
+
+    @abc.abstractmethod
+    async def _set(self, key: str, value: Any, versions: tuple) -> None:
+        """Store value for key under these tag versions."""
+
+
+class InMemoryResponseCache(ResponseCache):
+    """Per-worker LRU cache with a TTL and a maximum number of entries."""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        super().__init__()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._tag_versions: dict = {}
+
+    async def _versions(self, tags: List[str]) -> tuple:
+        return tuple(self._tag_versions.get(tag, 0) for tag in tags)
+
+    async def _bump(self, tags: List[str]) -> None:
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+    async def _get(self, key: str, versions: tuple) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, entry_versions, value = entry
+        # An entry stored under older tag versions has been invalidated
+        if expires_at <= time.monotonic() or entry_versions != versions:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _set(self, key: str, value: Any, versions: tuple) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, versions, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache shared between workers through a Redis-compatible server (redis.asyncio API)."""
+
+    def __init__(self, client: Any, ttl: float = RESPONSE_CACHE_TTL_SECONDS, prefix: str = "sparkbytes:cache:"):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def _versions(self, tags: List[str]) -> tuple:
+        if not tags:
+            return ()
+        raw = await self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return tuple(int(v) if v is not None else 0 for v in raw)
+
+    async def _bump(self, tags: List[str]) -> None:
+        for tag in tags:
+            await self.client.incr(f"{self.prefix}tag:{tag}")
+
+    async def _get(self, key: str, versions: tuple) -> Any:
+        raw = await self.client.get(f"{self.prefix}entry:{key}")
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        if tuple(entry["versions"]) != versions:
+            return None
+        variants = {k: base64.b64decode(entry[k]) for k in ("gzip", "br") if entry.get(k)}
+        return CachedBody(entry["body"].encode(), entry["etag"], **variants)
+
+    async def _set(self, key: str, value: CachedBody, versions: tuple) -> None:
+        variants = {k: base64.b64encode(v).decode() for k, v in (("gzip", value.gzip), ("br", value.br)) if v}
+        raw = json.dumps({"versions": list(versions), "body": value.body.decode(), "etag": value.etag, **variants})
+        await self.client.set(f"{self.prefix}entry:{key}", raw, ex=max(1, int(self.ttl)))
+
+
+def _build_response_cache() -> ResponseCache:
+    if REDIS_URL:
+        import redis.asyncio as aioredis
+        return RedisResponseCache(aioredis.from_url(REDIS_URL))
+    return InMemoryResponseCache()
+
+
+def _cache_key(request: Request) -> str:
+    """Cache key for a GET request: path plus its sorted query parameters."""
+    params = sorted(request.query_params.multi_items())
+    return f"{request.url.path}?{params}" if params else request.url.path
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against our ETag (weak comparison, per RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def _json_bytes(content: Any) -> bytes:
+    """Serialize a response payload: compact UTF-8 JSON, str() for anything else (dates, UUIDs)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """The app's default response class: JSONResponse encoded by orjson when it is installed.
+
+    Returning one directly from a route also skips FastAPI's jsonable_encoder pass over
+    the payload, which for a few thousand rows costs far more than the encoding itself.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return _json_bytes(content)
+
+
+async def _cached_body(cache: ResponseCache, key: str, tags: List[str], load: Callable[[], Any]) -> CachedBody:
+    """Fetch a serialized JSON payload and its ETag through the response cache."""
+    async def _load():
+        return CachedBody.of(_json_bytes(await load()))
+    return await cache.get_or_load(key, tags, _load)
+
+
+async def _cached_json(cache: ResponseCache, request: Request, tags: List[str], load: Callable[[], Any]) -> Response:
+    """Serve a JSON payload through the response cache with ETag / If-None-Match support.
+
+    The payload is serialized, hashed and compressed once per cache fill. A poll whose
+    If-None-Match still matches gets a 304 without a Supabase query or a body.
+    """
+    entry = await _cached_body(cache, _cache_key(request), tags, load)
+    encoding = _accepted_encoding(request.headers.get("accept-encoding"))
+    compressed = getattr(entry, encoding) if encoding else None
+    # Clients may keep the body but must revalidate it before reuse
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if compressed is not None:
+        headers.update({"ETag": "W/" + entry.etag, "Content-Encoding": encoding})
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(compressed or entry.body, media_type="application/json", headers=headers)
+
+
+async def _cached_event_list(cache: ResponseCache, request: Request, page: EventPage, load: Callable[[], Any]) -> Response:
+    async def _load():
+        data, next_cursor = page.split(await load())
+        return {"data": data, "next_cursor": next_cursor}
+    return await _cached_json(cache, request, ["events"], _load)
+
+
+class StockSubscription:
+    """One stream's pending stock changes, keyed by food id so only the latest state is kept."""
+    __slots__ = ("pending", "ready")
+
+    def __init__(self):
+        self.pending: dict = {}
+        self.ready = asyncio.Event()
+
+    async def next_changes(self) -> list:
+        """Wait for changes or a heartbeat; an empty list means heartbeat."""
+        await self.ready.wait()
+        self.ready.clear()
+        changes = list(self.pending.values())
+        self.pending.clear()
+        return changes
+
+
+class StockBroadcaster:
+    """In-process fan-out of food stock changes to the stream subscribers of each event.
+
+    An idle subscriber costs a dict and an asyncio.Event; one shared ticker wakes them
+    all for heartbeats instead of a timer per connection. Publishing only reaches
+    subscribers connected to the same worker.
+    """
+
+    def __init__(self, heartbeat: float = STOCK_STREAM_HEARTBEAT_SECONDS, max_subscribers: int = STOCK_STREAM_MAX_SUBSCRIBERS):
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self._topics: dict = {}
+        self._count = 0
+        self._ticker: Optional[asyncio.Task] = None
+
+    def subscribe(self, event_id: int) -> Optional[StockSubscription]:
+        """Register a subscriber for an event; None when the worker is at capacity."""
+        if self._count >= self.max_subscribers:
+            return None
+        sub = StockSubscription()
+        self._topics.setdefault(event_id, set()).add(sub)
+        self._count += 1
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.get_running_loop().create_task(self._tick())
+        return sub
+
+    def unsubscribe(self, event_id: int, sub: StockSubscription) -> None:
+        subs = self._topics.get(event_id)
+        if subs and sub in subs:
+            subs.discard(sub)
+            self._count -= 1
+            if not subs:
+                del self._topics[event_id]
+
+    def publish(self, event_id: int, change: dict) -> None:
+        self.published += 1
+        for sub in self._topics.get(event_id, ()):
+            sub.pending[change["id"]] = change
+            sub.ready.set()
+
+    async def _tick(self) -> None:
+        # Exits once nobody is subscribed; the next subscribe starts a new ticker
+        while self._count:
+            await asyncio.sleep(self.heartbeat)
+            for subs in self._topics.values():
+                for sub in subs:
+                    sub.ready.set()
+
+    def stats(self) -> dict:
+        return {"subscribers": self._count, "events": len(self._topics), "published": self.published}
+
+
+def _publish_stock_change(broadcaster: StockBroadcaster, result: dict) -> None:
+    """Push the new quantity/stockLevel from a committed reservation or cancel to stream subscribers."""
+    if result.get("status") == "ok" and result.get("event_id") is not None:
+        broadcaster.publish(result["event_id"], {
+            "id": result.get("food_id"),
+            "quantity": result.get("quantity"),
+            "stockLevel": result.get("stockLevel"),
+        })
+
+
+def _sse_message(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+def _user_id_from_auth_response(user_info: Any) -> Optional[str]:
+    """Dig the user id out of a Supabase Auth get_user response (dict or response-like object)."""
+    if user_info is None:
+        return None
+
+    # Try common locations for the id
+    if isinstance(user_info, dict):
+        # e.g. {'data': {'user': {'id': '...'}}}
+        data = user_info.get('data')
+        if isinstance(data, dict):
+            user = data.get('user') or data
+            if isinstance(user, dict) and user.get('id'):
+                return user.get('id')
+
+        # fallback top-level
+        if user_info.get('user') and isinstance(user_info.get('user'), dict):
+            return user_info['user'].get('id')
+        if user_info.get('id'):
+            return user_info.get('id')
+        return None
+
+    # Try attribute access (response-like objects)
+    try:
+        maybe_user = getattr(user_info, 'user', None) or getattr(user_info, 'data', None)
+        if isinstance(maybe_user, dict) and maybe_user.get('id'):
+            return maybe_user.get('id')
+        if getattr(maybe_user, 'id', None):
+            return getattr(maybe_user, 'id')
+        if hasattr(user_info, 'id'):
+            return getattr(user_info, 'id')
+    except Exception:
+        pass
+    return None
+
+
+class TokenVerifier:
+    """Resolves bearer tokens to Supabase user ids without a round trip to Supabase Auth.
+
+    Tokens are verified locally (HS256 with the project's JWT secret, or RS256/ES256
+    against the project's JWKS, which PyJWKClient caches; a token with an unknown key id
+    refetches it at most every JWKS_REFETCH_INTERVAL_SECONDS). Results are kept in a
+    bounded LRU keyed by the token's SHA-256 and dropped once the token's `exp` passes,
+    rejections after AUTH_REJECTED_TOKEN_SECONDS. HS256 tokens are only sent to
+    Supabase Auth when no JWT secret is configured.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[str] = SUPABASE_JWT_SECRET,
+        jwks_url: Optional[str] = SUPABASE_JWKS_URL,
+        audience: Optional[str] = SUPABASE_JWT_AUDIENCE,
+        cache_size: int = AUTH_TOKEN_CACHE_SIZE,
+        jwks_client: Any = None,
+    ):
+        self.secret = secret
+        self.audience = audience
+        self.cache_size = cache_size
+        self._jwks_client = jwks_client or (jwt.PyJWKClient(jwks_url, lifespan=600) if jwks_url else None)
+        self._jwks_refetch_after = 0.0
+        self._jwks_lock = threading.Lock()
+        # SHA-256 of the token -> (user id, or None if rejected; when the entry expires)
+        self._cache: OrderedDict = OrderedDict()
+
+    async def user_id_for(self, token: str, repo: "SupabaseRepository") -> Optional[str]:
+        key = hashlib.sha256(token.encode()).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            user_id, exp = cached
+            if exp is None or exp > time.time():
+                self._cache.move_to_end(key)
+                return user_id
+            del self._cache[key]
+
+        claims = await self._verify(token, repo)
+        if not claims or not claims.get('sub'):
+            self._remember(key, None, time.time() + AUTH_REJECTED_TOKEN_SECONDS)
+            return None
+        self._remember(key, claims['sub'], claims.get('exp'))
+        return claims['sub']
+
+    def _remember(self, key: str, user_id: Optional[str], exp: Optional[float]) -> None:
+        self._cache[key] = (user_id, exp)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _verify(self, token: str, repo: "SupabaseRepository") -> Optional[dict]:
+        try:
+            alg = jwt.get_unverified_header(token).get('alg', '')
+        except jwt.PyJWTError:
+            return None
+        options = {"require": ["exp", "sub"], "verify_aud": bool(self.audience)}
+
+        try:
+            if alg.startswith('HS'):
+                if self.secret:
+                    # The shared secret only signs HS256; never let the token header pick another algorithm
+                    return jwt.decode(token, self.secret, algorithms=["HS256"], audience=self.audience, options=options)
+                return await self._verify_remotely(token, repo)
+            if self._jwks_client is None:
+                return None
+            # The JWKS fetch is blocking network I/O when the cached key set is stale
+            loop = asyncio.get_running_loop()
+            signing_key = await loop.run_in_executor(None, self._signing_key, token)
+            # The algorithm comes from the key (its `alg`, or its type), not from the token header
+            return jwt.decode(token, signing_key.key, algorithms=[signing_key.algorithm_name], audience=self.audience, options=options)
+        except jwt.PyJWKClientConnectionError:
+            # The JWKS could not be fetched; not the token's fault, so not remembered as rejected
+            raise
+        except (jwt.PyJWTError, jwt.PyJWKClientError):
+            return None
+
+    def _signing_key(self, token: str) -> Any:
+        """The JWKS key for the token's `kid`, refetching the key set if it is unknown and no refetch was recent."""
+        kid = jwt.get_unverified_header(token).get('kid')
+        client = self._jwks_client
+        signing_key = client.match_kid(client.get_signing_keys(), kid)
+        if signing_key is None:
+            with self._jwks_lock:
+                refetch = time.monotonic() >= self._jwks_refetch_after
+                if refetch:
+                    self._jwks_refetch_after = time.monotonic() + JWKS_REFETCH_INTERVAL_SECONDS
+            if refetch:
+                signing_key = client.match_kid(client.get_signing_keys(refresh=True), kid)
+        if signing_key is None:
+            raise jwt.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return signing_key
+
+    async def _verify_remotely(self, token: str, repo: "SupabaseRepository") -> Optional[dict]:
+        user_id = _user_id_from_auth_response(await repo.get_auth_user(token))
+        if not user_id:
+            return None
+        # Supabase Auth vouched for the token; the unverified exp only bounds how long we cache it
+        exp = jwt.decode(token, options={"verify_signature": False}).get('exp')
+        return {"sub": user_id, "exp": exp if exp is not None else time.time() + AUTH_NO_EXP_TOKEN_SECONDS}
+
+
+async def _extract_user_id_from_request(request: Optional[Request], services: "Services") -> Optional[str]:
     """Try to extract a Supabase user id from an Authorization header on the request.
-    This attempts to call the Supabase Python client helper if available; failures are swallowed.
+    The bearer token is verified locally by the services' token verifier; failures are swallowed.
     """
     if request is None:
         return None
@@ -101,186 +2588,768 @@ def _extract_user_id_from_request(request: Optional[Request]) -> Optional[str]:
     if scheme != "bearer":
         return None
 
-    # Try to use Supabase client to get the user associated with this token.
     try:
-        # supabase-python has varied APIs across versions; try common ones.
-        user_info = None
+        return await services.token_verifier.user_id_for(token, services.repository)
+    except Exception:
+        return None
+
+# Magic numbers of the image formats we accept, mapped to their content type
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def _sniff_image_type(head: bytes) -> Optional[str]:
+    """Detect the image type from the first bytes of a file, ignoring the client's claim."""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class SpooledImage(NamedTuple):
+    """An uploaded image copied to a temp file, ready to be streamed to Storage."""
+    path: str
+    content_type: str
+    size: int
+    filename: str
+
+
+async def _spool_image_upload(image: UploadFile, max_bytes: Optional[int] = None) -> SpooledImage:
+    """Copy an upload to a temp file chunk by chunk, enforcing the size cap and sniffing its type.
+
+    Raises 413 when the image is too large and 415 when it is not a JPEG/PNG/GIF/WebP.
+    Only one chunk is held in memory here, but Starlette has already spooled the whole
+    multipart body by the time this runs; UploadSizeLimitMiddleware is what keeps an
+    oversized request from being read in the first place.
+    """
+    max_bytes = IMAGE_UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    if image.size is not None and image.size > max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image exceeds {max_bytes} bytes")
+
+    tmp = tempfile.NamedTemporaryFile(prefix="event-image-", delete=False)
+    try:
+        with tmp:
+            chunk = await image.read(IMAGE_UPLOAD_CHUNK_BYTES)
+            content_type = _sniff_image_type(chunk)
+            if content_type is None:
+                raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Image must be JPEG, PNG, GIF or WebP")
+            size = 0
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image exceeds {max_bytes} bytes")
+                tmp.write(chunk)
+                chunk = await image.read(IMAGE_UPLOAD_CHUNK_BYTES)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    return SpooledImage(tmp.name, content_type, size, image.filename)
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware rejecting oversized upload requests with 413 before their form is parsed.
+
+    A Content-Length over the limit is refused without reading the body. Bodies sent
+    without one (chunked) are counted as they arrive and cut off once they pass it.
+    The limit is IMAGE_UPLOAD_MAX_BYTES plus IMAGE_UPLOAD_FORM_OVERHEAD_BYTES.
+    """
+
+    def __init__(self, app: Any, paths: tuple = ("/event/",)):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        max_bytes = IMAGE_UPLOAD_MAX_BYTES + IMAGE_UPLOAD_FORM_OVERHEAD_BYTES
+        detail = f"Image exceeds {IMAGE_UPLOAD_MAX_BYTES} bytes"
+        declared = Headers(scope=scope).get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def _receive() -> dict:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised inside the form parse, so the route answers with a plain 413
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, _receive, send)
+
+
+# (key in image_variants, Pillow format, content type, save options) for each variant encoding
+IMAGE_VARIANT_FORMATS = (
+    ("webp", "WEBP", "image/webp", {"quality": 80, "method": 4}),
+    ("jpeg", "JPEG", "image/jpeg", {"quality": 80, "optimize": True, "progressive": True}),
+)
+
+
+def _render_image_variants(path: str, widths: tuple) -> list:
+    """Resize an image to each width as WebP and JPEG temp files. Runs in the image process pool.
+
+    Returns (format, width, content type, path) tuples. Widths larger than the original
+    collapse to the original width instead of upscaling.
+    """
+    rendered = []
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        for width in sorted({min(w, img.width) for w in widths}):
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS) if width < img.width else img
+            for fmt, pil_format, content_type, options in IMAGE_VARIANT_FORMATS:
+                frame = resized.convert("RGB") if pil_format == "JPEG" else resized
+                fd, out_path = tempfile.mkstemp(prefix="event-image-", suffix=f".{fmt}")
+                with os.fdopen(fd, "wb") as fh:
+                    frame.save(fh, pil_format, **options)
+                rendered.append((fmt, width, content_type, out_path))
+    return rendered
+
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _image_variant_pool() -> ProcessPoolExecutor:
+    """Process pool for image resizing, started on first use so CPU-bound work stays off the event loop."""
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS)
+    return _image_pool
+
+
+def _shutdown_image_pool() -> None:
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
+async def _upload_image_variants(repo: "SupabaseRepository", path: str, name_prefix: str) -> dict:
+    """Render and upload the resized copies of an image.
+
+    Returns a srcset-style map, e.g. {"webp": {"320": url, ...}, "jpeg": {...}}, or {}
+    when rendering fails.
+    """
+    if not IMAGE_VARIANT_WIDTHS:
+        return {}
+    loop = asyncio.get_running_loop()
+    try:
+        rendered = await loop.run_in_executor(_image_variant_pool(), _render_image_variants, path, IMAGE_VARIANT_WIDTHS)
+    except Exception:
+        logger.exception("Error generating image variants")
+        return {}
+
+    try:
+        urls = await asyncio.gather(*(
+            repo.upload_event_image(f"{name_prefix}_{width}w.{fmt}", out_path, content_type)
+            for fmt, width, content_type, out_path in rendered
+        ))
+    finally:
+        for *_, out_path in rendered:
+            os.unlink(out_path)
+    variants: dict = {}
+    for (fmt, width, _, _), url in zip(rendered, urls):
+        variants.setdefault(fmt, {})[str(width)] = url
+    return variants
+
+
+async def _store_event_image(repo: "SupabaseRepository", spooled: SpooledImage) -> dict:
+    """Upload a spooled image and its resized variants; return the event columns to set.
+
+    Upload failures are logged and leave the event without an image rather than failing it.
+    """
+    # Generate a unique filename
+    unique_prefix = f"{uuid.uuid4()}_"
+    try:
+        results = await asyncio.gather(
+            repo.upload_event_image(unique_prefix + spooled.filename, spooled.path, spooled.content_type),
+            _upload_image_variants(repo, spooled.path, unique_prefix + os.path.splitext(spooled.filename)[0]),
+            return_exceptions=True,
+        )
+    finally:
+        os.unlink(spooled.path)
+    image_url, image_variants = results
+    if isinstance(image_url, BaseException):
+        # Log the error but don't fail the event creation
+        logger.error("Error uploading image", exc_info=image_url)
+        return {}
+    fields = {"image_url": image_url}
+    if isinstance(image_variants, BaseException):
+        logger.error("Error uploading image variants", exc_info=image_variants)
+    elif image_variants:
+        fields["image_variants"] = image_variants
+    return fields
+
+
+async def _attach_event_image(services: "Services", event_id: int, spooled: SpooledImage) -> None:
+    """Background job: upload the image and its variants, then patch them onto the event."""
+    fields = await _store_event_image(services.repository, spooled)
+    if not fields:
+        return
+    try:
+        await services.repository.update_event(event_id, fields)
+        services.search_index.update_event(event_id, fields)
+        await services.response_cache.invalidate(["events"])
+    except Exception:
+        logger.exception("Error attaching image to event", extra={"event_id": event_id})
+
+
+def _import_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Guess "csv" or "jsonl" from an upload's file name, then its content type."""
+    suffix = os.path.splitext(filename or "")[1].lower()
+    if suffix == ".csv" or content_type == "text/csv":
+        return "csv"
+    if suffix in (".jsonl", ".ndjson") or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "jsonl"
+    return None
+
+
+def _import_records(binary: BinaryIO, fmt: str) -> Iterator[tuple]:
+    """Yield (line number, row dict or error message) from a CSV or JSONL file, one row at a time."""
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Blank cells count as missing; extra cells beyond the header (key None) are ignored
+            row = {key.strip(): value.strip() for key, value in row.items() if key and isinstance(value, str) and value.strip()}
+            if row:
+                yield reader.line_num, row
+        return
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
         try:
-            user_info = supabase.auth.get_user(token)
-        except Exception:
-            try:
-                # alternate signature
-                user_info = supabase.auth.get_user(access_token=token)
-            except Exception:
-                user_info = None
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, f"invalid JSON: {e.msg}"
+            continue
+        yield line_no, row if isinstance(row, dict) else "expected a JSON object"
 
-        # user_info may be a dict or a response-like object
-        if user_info is None:
-            return None
 
-        # Try common locations for the id
-        if isinstance(user_info, dict):
-            # e.g. {'data': {'user': {'id': '...'}}}
-            data = user_info.get('data')
-            if isinstance(data, dict):
-                user = data.get('user') or data
-                if isinstance(user, dict) and user.get('id'):
-                    return user.get('id')
-
-            # fallback top-level
-            if user_info.get('user') and isinstance(user_info.get('user'), dict):
-                return user_info['user'].get('id')
-            if user_info.get('id'):
-                return user_info.get('id')
-
-        # Try attribute access (response-like objects)
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}" for err in error.errors()
+    )
+
+
+class BulkImport:
+    """Stream CSV/JSONL rows into the Events and Food tables with batched inserts.
+
+    Rows are read IMPORT_BATCH_ROWS at a time off the event loop, validated against
+    ImportEventRow/ImportFoodRow, and queued per table. Full queues are inserted in
+    one request each with at most `max_in_flight` requests outstanding; reading
+    waits while that many are in flight, so memory is bounded by the batches, not
+    the file. A batch the database rejects is retried row by row so only the bad
+    rows are reported. Food naming an event by `event_ref` is inserted after that
+    event's batch and gets its new id.
+    """
+
+    def __init__(
+        self,
+        services: "Services",
+        dry_run: bool = False,
+        batch_rows: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+    ):
+        self.services = services
+        self.repo = services.repository
+        self.dry_run = dry_run
+        self.batch_rows = batch_rows or IMPORT_BATCH_ROWS
+        self.max_in_flight = max_in_flight or IMPORT_MAX_IN_FLIGHT
+        self.rows = 0
+        self.events_imported = 0
+        self.food_imported = 0
+        self.error_count = 0
+        self.errors: list = []
+        # Existing events that received food, for cache invalidation
+        self.food_event_ids: set = set()
+        self._event_batch: list = []   # (line, ref, payload)
+        self._food_batch: list = []    # (line, event_ref or None, payload)
+        self._queued_refs: set = set()  # refs of events in _event_batch
+        self._pending_refs: dict = {}  # ref -> task inserting its event
+        self._event_ids: dict = {}     # ref -> id of the inserted event
+        self._failed_refs: set = set()
+        self._in_flight: set = set()
+
+    async def run(self, records: Iterator[tuple]) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, lambda: list(itertools.islice(records, self.batch_rows)))
+                if not chunk:
+                    break
+                for line, row in chunk:
+                    self.rows += 1
+                    await self._add(line, row)
+        except (UnicodeDecodeError, csv.Error) as e:
+            self._error(None, f"Could not read the file past row {self.rows}: {e}")
+        await self._flush_events()
+        await self._flush_food()
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+        return self.report()
+
+    def report(self) -> dict:
+        return {
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "events_imported": self.events_imported,
+            "food_imported": self.food_imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+    def _error(self, line: Optional[int], message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    async def _add(self, line: int, row: Any) -> None:
+        if isinstance(row, str):
+            return self._error(line, row)
+        kind = str(row.get("type") or ("food" if "event_id" in row or "event_ref" in row else "event")).lower()
+        if kind not in ("event", "food"):
+            return self._error(line, f"Unknown row type {kind!r}")
         try:
-            maybe_user = getattr(user_info, 'user', None) or getattr(user_info, 'data', None)
-            if isinstance(maybe_user, dict) and maybe_user.get('id'):
-                return maybe_user.get('id')
-            if hasattr(user_info, 'id'):
-                return getattr(user_info, 'id')
+            record = ImportEventRow.model_validate(row) if kind == "event" else ImportFoodRow.model_validate(row)
+        except ValidationError as e:
+            return self._error(line, _validation_message(e))
+        if kind == "event":
+            await self._add_event(line, record)
+        else:
+            await self._add_food(line, record)
+
+    async def _add_event(self, line: int, record: ImportEventRow) -> None:
+        ref = record.ref if record.ref is not None else f"#{line}"
+        if ref in self._queued_refs or ref in self._pending_refs or ref in self._event_ids or ref in self._failed_refs:
+            return self._error(line, f"Duplicate ref {ref!r}")
+        foods = []
+        for i, item in enumerate(record.food_items):
+            try:
+                foods.append(ImportFoodRow.model_validate({**item, "event_id": None, "event_ref": ref}))
+            except ValidationError as e:
+                self._error(line, f"food_items.{i}: {_validation_message(e)}")
+        payload = record.model_dump(exclude={"ref", "food_items"}, exclude_none=True)
+        if not payload["food"]:
+            payload["food"] = [food.name for food in foods]
+        self._event_batch.append((line, ref, payload))
+        self._queued_refs.add(ref)
+        if len(self._event_batch) >= self.batch_rows:
+            await self._flush_events()
+        for food in foods:
+            await self._add_food(line, food)
+
+    async def _add_food(self, line: int, record: ImportFoodRow) -> None:
+        ref = record.event_ref if record.event_id is None else None
+        if ref in self._failed_refs:
+            return self._error(line, f"Event {ref!r} was not imported")
+        if ref is not None and ref not in self._queued_refs and ref not in self._pending_refs and ref not in self._event_ids:
+            return self._error(line, f"event_ref {ref!r} does not match an event earlier in the file")
+        self._food_batch.append((line, ref, record.model_dump(exclude={"event_ref"}, exclude_none=True)))
+        if len(self._food_batch) >= self.batch_rows:
+            await self._flush_food()
+
+    async def _flush_events(self) -> None:
+        if not self._event_batch:
+            return
+        batch, self._event_batch = self._event_batch, []
+        task = asyncio.ensure_future(self._insert_events(batch))
+        for _, ref, _ in batch:
+            self._pending_refs[ref] = task
+        self._queued_refs.clear()
+        await self._track(task)
+
+    async def _flush_food(self) -> None:
+        if not self._food_batch:
+            return
+        # Food cannot be inserted before the events it names have ids
+        if any(ref in self._queued_refs for _, ref, _ in self._food_batch):
+            await self._flush_events()
+        batch, self._food_batch = self._food_batch, []
+        await self._track(asyncio.ensure_future(self._insert_food(batch)))
+
+    async def _track(self, task: asyncio.Task) -> None:
+        """Add an insert to the in-flight set, waiting while it is full (back-pressure on reading)."""
+        self._in_flight.add(task)
+        while len(self._in_flight) >= self.max_in_flight:
+            done, self._in_flight = await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+    async def _insert_rows(self, insert: Callable[[list], Any], items: list) -> list:
+        """Insert [(line, payload)] in one request, or row by row if the batch is rejected.
+
+        Returns the inserted row (or None) for each item, in order.
+        """
+        if self.dry_run:
+            return [{**payload, "id": None} for _, payload in items]
+        try:
+            return await insert([payload for _, payload in items])
         except Exception:
-            pass
-    except Exception:
-        return None
+            if len(items) == 1:
+                raise
+        inserted = []
+        for line, payload in items:
+            try:
+                inserted += await insert([payload])
+            except Exception as e:
+                self._error(line, getattr(e, "message", None) or str(e))
+                inserted.append(None)
+        return inserted
+
+    async def _insert_events(self, batch: list) -> None:
+        try:
+            inserted = await self._insert_rows(self.repo.insert_events, [(line, payload) for line, _, payload in batch])
+        except Exception as e:
+            inserted = [None] * len(batch)
+            self._error(batch[0][0], getattr(e, "message", None) or str(e))
+        for (_, ref, _), row in zip(batch, inserted):
+            self._pending_refs.pop(ref, None)
+            if row is None:
+                self._failed_refs.add(ref)
+            else:
+                self._event_ids[ref] = row.get("id")
+        rows = [row for row in inserted if row is not None]
+        self.events_imported += len(rows)
+        if rows and not self.dry_run:
+            self.services.search_index.add_events(rows)
+
+    async def _insert_food(self, batch: list) -> None:
+        waiting = {self._pending_refs[ref] for _, ref, _ in batch if ref in self._pending_refs}
+        if waiting:
+            await asyncio.wait(waiting)
+        items = []
+        for line, ref, payload in batch:
+            if ref is None:
+                self.food_event_ids.add(payload["event_id"])
+            elif ref in self._event_ids:
+                payload["event_id"] = self._event_ids[ref]
+            else:
+                self._error(line, f"Event {ref!r} was not imported")
+                continue
+            items.append((line, payload))
+        if not items:
+            return
+        try:
+            inserted = [row for row in await self._insert_rows(self.repo.insert_food, items) if row is not None]
+        except Exception as e:
+            self._error(items[0][0], getattr(e, "message", None) or str(e))
+            return
+        self.food_imported += len(inserted)
+        if inserted and not self.dry_run:
+            self.services.dietary_index.add_food_rows(inserted)
+            self.services.search_index.add_food_rows(inserted)
 
-    return None
 
-@app.get("/")
-async def root():
-    response = supabase.table('Events').select('*').execute()
-    data = getattr(response, 'data', None) or (response.get('data') if isinstance(response, dict) else None) or []
-    return {"data": data}
+class Services:
+    """This worker's Supabase clients and in-memory state, handed to routes by `get_services`.
 
-@app.get("/search/name/{name}")
-async def search_by_name(name: str):
-    response = supabase.table('Events').select('*').text_search("name", name, options={"config": "english"}).execute()
-    data = getattr(response, 'data', None) or (response.get('data') if isinstance(response, dict) else None) or []
-    return {"data": data}
+    The app's lifespan builds them after the worker has started, so a forked worker
+    never inherits a connection pool or thread pool from its parent, and closes them
+    on shutdown. Anything not passed in gets a fresh default.
+    """
+
+    def __init__(
+        self,
+        repository: "SupabaseRepository",
+        response_cache: Optional[ResponseCache] = None,
+        dietary_index: Optional[DietaryTagIndex] = None,
+        search_index: Optional[EventSearchIndex] = None,
+        stats_snapshot: Optional[StatsSnapshot] = None,
+        token_verifier: Optional[TokenVerifier] = None,
+        stock_broadcaster: Optional[StockBroadcaster] = None,
+        transport: Optional[SupabaseTransport] = None,
+        http_client: Optional[httpx.Client] = None,
+    ):
+        self.repository = repository
+        self.response_cache = response_cache or InMemoryResponseCache()
+        self.dietary_index = dietary_index or DietaryTagIndex()
+        self.search_index = search_index or EventSearchIndex()
+        self.stats_snapshot = stats_snapshot or StatsSnapshot()
+        self.token_verifier = token_verifier or TokenVerifier()
+        self.stock_broadcaster = stock_broadcaster or StockBroadcaster()
+        # The pooled HTTP transport behind the Supabase client, when there is a real one
+        self.transport = transport
+        self.http_client = http_client
+
+    def start(self) -> None:
+        """Kick off warm-ups that run in the background instead of delaying the first request."""
+        self.search_index.warm(self.repository)
+
+    def close(self) -> None:
+        self.repository.close()
+        if self.http_client is not None:
+            self.http_client.close()
+
+
+def build_services() -> Services:
+    """Connect to the configured Supabase project. Settings are validated here, not at import."""
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env.local file")
+    transport = _build_transport()
+    http_client = _build_http_client(transport)
+    client = create_client(url, key, options=SyncClientOptions(httpx_client=http_client))
+    return Services(
+        SupabaseRepository(client),
+        response_cache=_build_response_cache(),
+        transport=transport,
+        http_client=http_client,
+    )
+
+
+def get_services(request: Request) -> Services:
+    """Route dependency: the Services of the app serving this request."""
+    return request.app.state.services
+
+
+@router.get("/")
+async def root(request: Request, page: EventPage = Depends(event_page), services: Services = Depends(get_services)):
+    return await _cached_event_list(services.response_cache, request, page, lambda: services.repository.list_events(page))
+
+@router.get("/search/name/{name}")
+async def search_by_name(
+    name: str, request: Request, page: EventPage = Depends(event_page), services: Services = Depends(get_services)
+):
+    return await _cached_event_list(services.response_cache, request, page, lambda: services.repository.search_events_by_name(name, page))
 
-@app.get("/search/food/{food}")
-async def search_by_food(food: str):
-    response = supabase.table('Events').select('*').contains("food", [food]).execute()
-    data = getattr(response, 'data', None) or (response.get('data') if isinstance(response, dict) else None) or []
-    return {"data": data}
+@router.get("/search/food/{food}")
+async def search_by_food(
+    food: str, request: Request, page: EventPage = Depends(event_page), services: Services = Depends(get_services)
+):
+    return await _cached_event_list(services.response_cache, request, page, lambda: services.repository.search_events_by_food(food, page))
 
 
-@app.get("/search/dietary")
-async def search_by_dietary(tags: str = ""):
+@router.get("/search/dietary")
+async def search_by_dietary(
+    tags: str = "",
+    mode: str = Query("any", pattern="^(any|all)$"),
+    page: EventPage = Depends(event_page),
+    services: Services = Depends(get_services),
+):
     """
     Search events by dietary tags.
     Query parameter 'tags' should be comma-separated dietary tags (e.g., 'vegetarian,vegan')
-    Returns events that have at least one food item with any of the specified dietary tags.
+    Returns events that have at least one food item with any of the specified dietary tags,
+    or with every tag when mode=all. Supports the same limit/cursor/fields/upcoming parameters as GET /.
     """
-    print(f"\n[DEBUG] /search/dietary called with tags: '{tags}'")
-    
-    if not tags:
+    # Parse the tags from query string
+    tag_list = [tag.strip().lower() for tag in tags.split(',') if tag.strip()]
+
+    if not tag_list:
         # If no tags specified, return all events
-        response = supabase.table('Events').select('*').execute()
-        data = getattr(response, 'data', None) or (response.get('data') if isinstance(response, dict) else None) or []
-        return {"data": data}
-    
+        rows = await services.repository.list_events(page)
+        data, next_cursor = page.split(rows)
+        return FastJSONResponse({"data": data, "next_cursor": next_cursor})
+
     try:
-        # Parse the tags from query string
-        tag_list = [tag.strip().lower() for tag in tags.split(',') if tag.strip()]
-        print(f"[DEBUG] Parsed tag_list: {tag_list}")
-        
-        if not tag_list:
-            response = supabase.table('Events').select('*').execute()
-            data = getattr(response, 'data', None) or (response.get('data') if isinstance(response, dict) else None) or []
-            return {"data": data}
-        
-        # Get all events
-        events_response = supabase.table('Events').select('*').execute()
-        events_data = getattr(events_response, 'data', None) or (events_response.get('data') if isinstance(events_response, dict) else None) or []
-        print(f"[DEBUG] Total events: {len(events_data)}")
-        
-        # Get all food items
-        food_response = supabase.table('Food').select('*').execute()
-        food_data = getattr(food_response, 'data', None) or (food_response.get('data') if isinstance(food_response, dict) else None) or []
-        print(f"[DEBUG] Total food items: {len(food_data)}")
-        
-        # Build a map of event_id to food items
-        event_food_map = {}
-        for food in food_data:
-            event_id = food.get('event_id')
-            if event_id not in event_food_map:
-                event_food_map[event_id] = []
-            event_food_map[event_id].append(food)
-            
-            # Debug: print each food item's dietary tags
-            dietary_tags = food.get('dietaryTags', []) or []
-            print(f"[DEBUG] Food '{food.get('name')}' (event_id={event_id}): dietaryTags = {dietary_tags} (type: {type(dietary_tags).__name__})")
-        
-        # Filter events that have food items with any of the specified dietary tags
-        filtered_events = []
-        for event in events_data:
-            event_id = event.get('id')
-            foods = event_food_map.get(event_id, [])
-            
-            print(f"[DEBUG] Processing event {event_id} '{event.get('name')}': has {len(foods)} food items")
-            
-            # Check if any food item has any of the selected dietary tags
-            has_matching_tag = False
-            for food in foods:
-                dietary_tags = food.get('dietaryTags', []) or []
-                
-                # Normalize dietary tags to lowercase for comparison
-                normalized_tags = []
-                if isinstance(dietary_tags, list):
-                    normalized_tags = [str(tag).lower() for tag in dietary_tags]
-                elif isinstance(dietary_tags, str):
-                    normalized_tags = [tag.strip().lower() for tag in dietary_tags.split(',')]
-                
-                print(f"[DEBUG]   Food '{food.get('name')}': normalized_tags={normalized_tags}, searching for {tag_list}")
-                
-                # Check if any of the search tags are in this food item's tags
-                if any(tag in normalized_tags for tag in tag_list):
-                    print(f"[DEBUG]   ✓ MATCH FOUND!")
-                    has_matching_tag = True
-                    break
-            
-            if has_matching_tag:
-                print(f"[DEBUG] Including event {event_id} in results")
-                filtered_events.append(event)
-        
-        print(f"[DEBUG] Final result: {len(filtered_events)} events")
-        return {"data": filtered_events}
+        # Answer the tag match from the in-memory index
+        await services.dietary_index.ensure_fresh(services.repository)
+        matching_event_ids = services.dietary_index.match(tag_list, mode)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Dietary tag match", extra={"tags": tag_list, "mode": mode, "matches": len(matching_event_ids)})
+
+        if not matching_event_ids:
+            return FastJSONResponse({"data": [], "next_cursor": None})
+
+        # Only fetch the matching event rows, paged and projected in the database
+        rows = await services.repository.list_events_by_ids(sorted(matching_event_ids), page)
+        data, next_cursor = page.split(rows)
+        # Rows go out as projected by `fields=`, without a jsonable_encoder pass
+        return FastJSONResponse({"data": data, "next_cursor": next_cursor})
     except Exception as e:
-        print(f"Error in search_by_dietary: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in search_by_dietary", extra={"tags": tag_list, "mode": mode})
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
-@app.get("/events/{event_id}/food")
-async def get_food_by_event(event_id: int):
+@router.get("/search")
+async def search_events(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=1000),
+    services: Services = Depends(get_services),
+):
+    """
+    Full-text search over event names, descriptions, organizations, locations and food.
+    Results are ranked by BM25 relevance (best first) and include a `score`; partial
+    words ("pizz") and single typos ("sushii") still match. Page with limit/offset.
+    """
+    try:
+        await services.search_index.ensure_fresh(services.repository)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error building search index: {str(e)}")
+    hits, total = services.search_index.search(q, limit, offset)
+    next_offset = offset + len(hits) if offset + len(hits) < total else None
+    return FastJSONResponse({
+        "data": [{**row, "score": round(score, 4)} for row, score in hits],
+        "total": total,
+        "next_offset": next_offset,
+    })
+
+
+@router.get("/events/now")
+async def events_happening_now(
+    campus_location: Optional[str] = None,
+    within_minutes: int = Query(60, ge=0, le=24 * 60),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=50_000),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    services: Services = Depends(get_services),
+):
+    """
+    Events in progress now or starting within `within_minutes`, soonest first.
+    Optionally only on one `campus_location`, and/or within `radius_m` metres of
+    `lat`/`lon`, nearest first with a `distance_m`. The time, campus and bounding-box
+    filters run in the database, so only matching rows are transferred.
+    """
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="lat and lon must be given together")
+    start = _local_now()
+    end = start + datetime.timedelta(minutes=within_minutes)
+    box = _bounding_box(lat, lon, radius_m) if lat is not None else None
+    try:
+        # Distance ordering happens here, so a radius query fetches the whole (small) box
+        rows = await services.repository.list_events_in_window(start, end, campus_location, box, None if box else limit)
+    except APIError as e:
+        if box and e.code == '42703':
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Location search needs the Events latitude/longitude columns (event_time_location migration)",
+            )
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    if box:
+        # The box is a square around the circle; drop its corners and sort by distance
+        nearby = []
+        for row in rows:
+            distance = _distance_m(lat, lon, row['latitude'], row['longitude'])
+            if distance <= radius_m:
+                nearby.append({**row, "distance_m": round(distance)})
+        rows = sorted(nearby, key=lambda row: row["distance_m"])[:limit]
+    return FastJSONResponse({
+        "data": rows,
+        "window": {"start": start.isoformat(timespec="minutes"), "end": end.isoformat(timespec="minutes")},
+    })
+
+
+@router.get("/events/{event_id}/food")
+async def get_food_by_event(event_id: int, request: Request, services: Services = Depends(get_services)):
     """Return food items associated with a given event_id from the Food table."""
     try:
-        resp = supabase.table('Food').select('*').eq('event_id', event_id).execute()
+        return await _cached_json(services.response_cache, request, [f"event:{event_id}"], lambda: _load_event_food(services.repository, event_id))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-    # Normalize response structure (supabase client may return object with .data or a dict)
-    data = None
-    if isinstance(resp, dict):
-        data = resp.get('data')
-    else:
-        data = getattr(resp, 'data', None)
 
-    if data is None:
-        # If supabase returned an unexpected format, return empty list
-        return {"data": []}
+async def _load_event_food(repo: "SupabaseRepository", event_id: int) -> dict:
+    # supabase may return an unexpected format (None); treat it as no food
+    return {"data": await repo.list_food_for_event(event_id) or []}
 
-    if len(data) == 0:
-        # Explicit 404 might be desired, but returning empty list is also acceptable
-        return {"data": []}
 
-    return {"data": data}
+@router.get("/events/{event_id}/food/stream")
+async def stream_food_stock(event_id: int, services: Services = Depends(get_services)):
+    """Server-Sent Events stream of an event's food stock.
+
+    Starts with a `snapshot` event (the same body as GET /events/{event_id}/food),
+    then sends a `stock` event with {id, quantity, stockLevel} whenever a reservation
+    or cancel commits, and a keepalive comment every STOCK_STREAM_HEARTBEAT_SECONDS.
+    """
+    sub = services.stock_broadcaster.subscribe(event_id)
+    if sub is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many open stock streams; poll instead")
+    # Subscribed before the snapshot is read, so no change can fall between the two
+    try:
+        snapshot = await _cached_body(services.response_cache, f"/events/{event_id}/food", [f"event:{event_id}"], lambda: _load_event_food(services.repository, event_id))
+    except Exception as e:
+        services.stock_broadcaster.unsubscribe(event_id, sub)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@app.post("/event/")
+    async def _stream():
+        try:
+            yield b"retry: 5000\n" + _sse_message("snapshot", snapshot.body)
+            while True:
+                changes = await sub.next_changes()
+                if not changes:
+                    yield b": keepalive\n\n"
+                for change in changes:
+                    yield _sse_message("stock", _json_bytes(change))
+        finally:
+            services.stock_broadcaster.unsubscribe(event_id, sub)
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        # No proxy buffering, or updates would arrive in bursts
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(services: Services = Depends(get_services)):
+    """Hit/miss counters of the response cache, for tuning its size and TTL."""
+    return {"data": services.response_cache.stats()}
+
+
+@router.get("/stream/stats")
+async def get_stream_stats(services: Services = Depends(get_services)):
+    """Open stock streams on this worker and the number of changes published."""
+    return {"data": services.stock_broadcaster.stats()}
+
+
+def _service_gauges(services: Services) -> MetricsRegistry:
+    """Gauges read from this worker's Services at scrape time."""
+    gauges = MetricsRegistry()
+    gauges.register(Gauge(
+        "response_cache_hit_ratio", "Share of response cache lookups served from the cache",
+        lambda: {(): services.response_cache.stats()["hit_ratio"]}))
+    gauges.register(Gauge(
+        "supabase_calls_in_flight", "Repository calls running on or queued for the Supabase worker threads",
+        lambda: {(): services.repository.in_flight}))
+    gauges.register(Gauge(
+        "stock_stream_subscribers", "Open stock streams on this worker",
+        lambda: {(): services.stock_broadcaster.stats()["subscribers"]}))
+    if services.transport is not None:
+        pool = services.transport.stats()
+        gauges.register(Gauge(
+            "supabase_pool_connections", "Connections in the Supabase HTTP pool (open, of which idle / HTTP/2)",
+            lambda: {("open",): pool["connections"], ("idle",): pool["idle_connections"], ("http2",): pool["http2_connections"]},
+            labels=("state",)))
+        gauges.register(Gauge(
+            "supabase_pool_waiting_requests", "Requests waiting for a free pooled connection",
+            lambda: {(): pool["waiting_for_connection"]}))
+    return gauges
+
+
+@router.get("/metrics")
+async def get_metrics(services: Services = Depends(get_services)):
+    """This worker's metrics in the Prometheus text exposition format."""
+    body = metrics.render() + _service_gauges(services).render()
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/pool/stats")
+async def get_pool_stats(services: Services = Depends(get_services)):
+    """Utilization of the Supabase worker threads and HTTP connection pool, plus retry counters."""
+    http = services.transport.stats() if services.transport is not None else {}
+    return {"data": {"workers": services.repository.stats(), "http": http}}
+
+@router.post("/event/", response_model=EventsCreated, response_model_exclude_unset=True)
 async def add_event(
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     description: str = Form(...),
     organization: str = Form(default=""),
@@ -290,50 +3359,40 @@ async def add_event(
     start_time: str = Form(...),
     end_time: str = Form(...),
     food: str = Form(default="[]"),
-    image: Optional[UploadFile] = File(None)
+    latitude: Optional[float] = Form(default=None, ge=-90, le=90),
+    longitude: Optional[float] = Form(default=None, ge=-180, le=180),
+    image: Optional[UploadFile] = File(None),
+    services: Services = Depends(get_services),
 ):
     """
     Create a new event with optional image upload.
-    - Uploads image to 'event_images' storage bucket if provided
-    - Stores the public image URL in events table
+    - Streams the image to a temp file (size-capped, type sniffed) and uploads it to the 'event images' bucket
+    - Adds WebP/JPEG copies at IMAGE_VARIANT_WIDTHS, resized in a process pool
+    - Stores the public image URL and the variant map in events table, after the response when uploads run in the background
     - Parses food as JSON array of food item names
+    - Stores the date as YYYY-MM-DD and times as zero-padded HH:MM (400 otherwise, or if it ends before it starts)
+    - Stores latitude/longitude when both are given, for GET /events/now radius searches
     """
     try:
-        # Parse food JSON
+        date = _iso_date(date)
+        start_time, end_time = _hh_mm(start_time), _hh_mm(end_time)
+        _check_event_times(start_time, end_time)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid event date or time: {e}")
+
+    spooled = None
+    try:
+        # Parse food JSON into a list of names, the shape the Events.food column holds
         food_items = []
         if food:
             try:
-                food_items = json.loads(food)
+                food_items = _food_names(json.loads(food))
             except json.JSONDecodeError:
                 food_items = []
         
-        image_url = None
-        
-        # Handle image upload if provided
+        # Validate and spool the image before anything is written
         if image and image.filename:
-            try:
-                # Read the file content
-                file_content = await image.read()
-                
-                # Upload to Supabase storage bucket 'event_images'
-                # Generate a unique filename
-                import uuid
-                unique_filename = f"{uuid.uuid4()}_{image.filename}"
-                
-                # Upload to storage
-                upload_response = supabase.storage.from_('event images').upload(
-                    path=unique_filename,
-                    file=file_content,
-                    file_options={"content-type": image.content_type}
-                )
-                
-                # Get the public URL
-                image_url = supabase.storage.from_('event images').get_public_url(unique_filename)
-                
-            except Exception as e:
-                # Log the error but don't fail the event creation
-                print(f"Error uploading image: {str(e)}")
-                image_url = None
+            spooled = await _spool_image_upload(image)
         
         # Build event payload
         payload = {
@@ -347,37 +3406,58 @@ async def add_event(
             "end_time": end_time,
             "food": food_items,
         }
+        if latitude is not None and longitude is not None:
+            payload.update(latitude=latitude, longitude=longitude)
         
-        # Add image_url if upload succeeded
-        if image_url:
-            payload["image_url"] = image_url
+        # Upload inline when background uploads are disabled; add image_url/image_variants if it succeeded
+        if spooled and not IMAGE_UPLOAD_IN_BACKGROUND:
+            image_fields = await _store_event_image(services.repository, spooled)
+            spooled = None
+            payload.update(image_fields)
         
         # Insert event into database
-        response = supabase.table('Events').insert(payload).execute()
-        return response
+        data = await services.repository.insert_event(payload)
+        services.search_index.add_events(data)
+        await services.response_cache.invalidate(["events"])
+
+        if spooled and data:
+            background_tasks.add_task(_attach_event_image, services, data[0]['id'], spooled)
+            data[0]["image_status"] = "pending"
+            spooled = None
+        return EventsCreated(data=[EventOut(**_pick(row, EventOut)) for row in data])
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating event: {str(e)}"
         )
+    finally:
+        # Not handed to Storage or the background job (e.g. the insert failed)
+        if spooled:
+            os.unlink(spooled.path)
 
-@app.post("/food/")
-async def add_food_items(food_items: List[FoodItem]):
+@router.post("/food/", response_model=FoodCreated, response_model_exclude_unset=True)
+async def add_food_items(food_items: List[FoodItem], services: Services = Depends(get_services)):
     """
     Add multiple food items to the Food table.
     Expects a list of food items, each with name, event_id, and optional quantity/stockLevel/dietaryTags/description/pickup_instructions.
+    Returns the id, event_id, name and stock of each inserted row.
     """
     try:
         if not food_items or len(food_items) == 0:
-            return {"status": "no items to insert", "inserted": []}
+            return FoodCreated(data=[])
         
         # Convert Pydantic models to dicts
         items_to_insert = [item.model_dump(exclude_none=True) for item in food_items]
         
         # Insert all items
-        response = supabase.table('Food').insert(items_to_insert).execute()
-        return response
+        data = await services.repository.insert_food(items_to_insert)
+        services.dietary_index.add_food_rows(data)
+        services.search_index.add_food_rows(data)
+        await services.response_cache.invalidate(sorted({f"event:{item['event_id']}" for item in items_to_insert}))
+        return FoodCreated(data=[FoodOut(**_pick(row, FoodOut)) for row in data])
         
     except Exception as e:
         raise HTTPException(
@@ -385,353 +3465,320 @@ async def add_food_items(food_items: List[FoodItem]):
             detail=f"Error adding food items: {str(e)}"
         )
 
-@app.put("/reserve/")
-async def reserve_item(reserve: ReserveRequest, request: Request):
-    # fetch current quantity and stockLevel
+@router.post("/import")
+async def bulk_import(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Form(default=None, alias="format", pattern="^(csv|jsonl)$"),
+    dry_run: bool = Form(default=False),
+    services: Services = Depends(get_services),
+):
+    """
+    Bulk import events and food from a CSV or JSONL file.
+    - Each row is an event (ImportEventRow) or a food item (ImportFoodRow, with `event_id`
+      or the `event_ref` of an event row earlier in the file); a `type` column may say which
+    - The file is read row by row and inserted in batches, so large files are not held in memory
+    - Returns row/insert counts and per-row errors; `dry_run` validates without inserting
+    """
+    fmt = file_format or _import_format(file.filename, file.content_type)
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload a .csv or .jsonl file, or pass format=csv|jsonl",
+        )
+    importer = BulkImport(services, dry_run=dry_run)
     try:
-        q_resp = supabase.table('Food').select('quantity, stockLevel').eq("id", reserve.food_id).execute()
+        return await importer.run(_import_records(file.file, fmt))
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-    # supabase client may return an object with .data or a dict with 'data'
-    data = None
-    if isinstance(q_resp, dict):
-        data = q_resp.get('data')
-    else:
-        data = getattr(q_resp, 'data', None)
-
-    if not data or len(data) == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
-
-    row = data[0] if isinstance(data[0], dict) else data[0]
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error importing: {str(e)}")
+    finally:
+        # Also after a failure part-way through: earlier batches are already in
+        if not dry_run and (importer.events_imported or importer.food_imported):
+            await services.response_cache.invalidate(["events", *sorted(f"event:{event_id}" for event_id in importer.food_event_ids)])
 
-    # Try to extract quantity and stock level
-    current_qty = None
-    try:
-        current_qty = row.get('quantity') if isinstance(row, dict) else row['quantity']
-    except Exception:
-        current_qty = None
 
-    stock_level = None
-    try:
-        stock_level = row.get('stockLevel') if isinstance(row, dict) else row['stockLevel']
-    except Exception:
-        stock_level = None
-
-    # If quantity is missing, derive an initial count from stock level
-    # high => treated as unlimited (do not decrement quantity on reserve)
-    # medium => 30, low => 7
-    derived_from_stock = False
-    if current_qty is None:
-        if stock_level == StockLevel.HIGH.value or stock_level == StockLevel.HIGH:
-            # unlimited: accept reservation but do not change quantity
-            try:
-                # return a simple success response (no DB update required)
-                return {"status": "ok", "unlimited": True}
-            except Exception as e:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-        elif stock_level == StockLevel.MEDIUM.value or stock_level == StockLevel.MEDIUM:
-            current_qty = 30
-            derived_from_stock = True
-        elif stock_level == StockLevel.LOW.value or stock_level == StockLevel.LOW:
-            current_qty = 7
-            derived_from_stock = True
-        else:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Current quantity missing and stock level unavailable")
-
-    # ensure we have a numeric quantity now
-    try:
-        current_qty = int(current_qty)
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Invalid current quantity")
-
-    new_qty = current_qty - reserve.quantity
-    if new_qty < 0:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Not enough stock to reserve requested quantity")
-
-    # determine new stock level based on remaining quantity
-    new_stock = None
-    if new_qty > 30:
-        new_stock = StockLevel.HIGH.value
-    elif new_qty >= 8:
-        new_stock = StockLevel.MEDIUM.value
-    elif new_qty >= 1:
-        new_stock = StockLevel.LOW.value
-    else:
-        # sold out -> set quantity to 0 and keep low to indicate empty/low
-        new_stock = StockLevel.LOW.value
+@router.put("/reserve/", response_model=ReserveResponse, response_model_exclude_unset=True)
+async def reserve_item(reserve: ReserveRequest, request: Request, services: Services = Depends(get_services)):
+    # If profile_id provided in body, use it (fallback). If Authorization header present in incoming HTTP request,
+    # prefer the user id extracted from that token.
+    profile_id_to_use = reserve.profile_id
+    token_user_id = await _extract_user_id_from_request(request, services)
+    if token_user_id:
+        profile_id_to_use = token_user_id
 
+    # Decrement stock, recompute stockLevel and append to the profile in one atomic operation
     try:
-        update_resp = supabase.table('Food').update({'quantity': new_qty, 'stockLevel': new_stock}).eq("id", reserve.food_id).execute()
+        result = await services.repository.reserve_food(reserve.food_id, reserve.quantity, profile_id_to_use)
     except Exception as e:
+        reservations.inc("error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-    profile_update_resp = None
-    # Prefer user id from Authorization header (Supabase access token)
-    profile_id_to_use = reserve.profile_id
-    try:
-        auth_header = reserve.__dict__.get('profile_id')  # placeholder to keep flake usage
-    except Exception:
-        auth_header = None
-    # Attempt to get user id from request context via dependency injection is not available here
-    # We'll try to read from an Authorization header using the FastAPI Request if present in the global scope
-    # NOTE: To access the request, callers should pass it; we will attempt to read from a thread-local if available.
-    # For now, if a real Authorization header is provided, frontend should include it and we'll extract server-side below.
-
-    # If profile_id provided in body, use it (fallback). If Authorization header present in incoming HTTP request,
-    # prefer the user id extracted from that token. We'll attempt to extract via the Supabase auth client if possible.
-    # Attempt to extract a verified user id from the incoming Authorization header.
-    token_user_id = _extract_user_id_from_request(request)
-    if token_user_id:
-        profile_id_to_use = token_user_id
+    outcome = result.get("status")
+    reservations.inc(outcome)
+    if outcome == "not_found":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
+    if outcome == "oversold":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Not enough stock to reserve requested quantity")
+    if outcome == "conflict":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Food item is being reserved by others; please retry")
+    if outcome not in ("ok", "unlimited"):
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=result.get("detail") or "Invalid current quantity")
 
-    # If caller provided a profile id (and no token user id), append this food id to their reserved_items array
+    profile_update = None
     if profile_id_to_use:
-        try:
-            p_resp = supabase.table('profiles').select('reserved_items').eq('id', profile_id_to_use).single().execute()
-        except Exception as e:
-            # Log a warning but do not fail the main reservation if profile lookup fails
-            p_resp = None
-
-        # normalize profile response
-        p_data = None
-        if isinstance(p_resp, dict):
-            p_data = p_resp.get('data')
-        elif p_resp is not None:
-            p_data = getattr(p_resp, 'data', None)
-
-        existing_list = []
-        if p_data:
-            # single() returns a single object, not a list
-            # depending on client version, `.data` may be the row or a list; handle both
-            row = None
-            if isinstance(p_data, list) and len(p_data) > 0:
-                row = p_data[0]
-            elif isinstance(p_data, dict):
-                row = p_data
-
-            if row is not None:
-                try:
-                    existing_list = row.get('reserved_items') if isinstance(row, dict) else row['reserved_items']
-                except Exception:
-                    existing_list = []
-
-        if existing_list is None:
-            existing_list = []
-
-        # Ensure we have a Python list
-        if not isinstance(existing_list, list):
-            existing_list = list(existing_list) if existing_list is not None else []
-
-        # Append the food id if not already present
-        str_food_id = str(reserve.food_id)
-        if str_food_id not in [str(x) for x in existing_list]:
-            existing_list.append(reserve.food_id)
-            try:
-                profile_update_resp = supabase.table('profiles').update({'reserved_items': existing_list}).eq('id', profile_id_to_use).execute()
-            except Exception as e:
-                # Do not fail the reservation if profile update fails; include info in response
-                profile_update_resp = {'error': str(e)}
-
-    return {"food_update": update_resp, "profile_update": profile_update_resp}
+        profile_update = ProfileUpdate(updated=bool(result.get("profile_updated")))
+        if result.get("reservation_id") is not None:
+            profile_update.reservation_id = result["reservation_id"]
+        if result.get("profile_error"):
+            profile_update.error = result["profile_error"]
+
+    if outcome == "unlimited":
+        # high stock with no quantity: accept reservation but do not change quantity
+        response = ReserveResponse(status="ok", unlimited=True)
+        if profile_update is not None:
+            response.profile_update = profile_update
+        return response
 
+    if result.get("event_id") is not None:
+        await services.response_cache.invalidate([f"event:{result['event_id']}"])
+    _publish_stock_change(services.stock_broadcaster, result)
 
-class CancelReserveRequest(BaseModel):
-    food_id: int
-    quantity: int = Field(..., gt=0)
-    profile_id: Optional[str] = None
+    return ReserveResponse(
+        status="ok",
+        food_update=StockUpdate(id=reserve.food_id, quantity=result.get("quantity"), stockLevel=result.get("stockLevel")),
+        profile_update=profile_update,
+    )
 
 
-@app.post("/reserve/cancel")
-async def cancel_reservation(req: CancelReserveRequest, request: Request):
-    """Cancel a reservation: remove food_id from profile.reserved_items and increment Food.quantity."""
-    # First, remove from profile if provided
-    profile_update_resp = None
-    # Prefer token-derived user id if available; fallback to provided profile_id
-    token_user = _extract_user_id_from_request(request)
-    profile_id_for_action = token_user or req.profile_id
+# Status code for a failed batch, by the first failing item's status
+BATCH_FAILURE_STATUS = {
+    "not_found": status.HTTP_404_NOT_FOUND,
+    "oversold": status.HTTP_400_BAD_REQUEST,
+    "conflict": status.HTTP_409_CONFLICT,
+}
 
-    if profile_id_for_action:
-        try:
-            # Fetch current reserved_items
-            p_resp = supabase.table('profiles').select('reserved_items').eq('id', profile_id_for_action).single().execute()
-        except Exception:
-            p_resp = None
-
-        p_data = None
-        if isinstance(p_resp, dict):
-            p_data = p_resp.get('data')
-        elif p_resp is not None:
-            p_data = getattr(p_resp, 'data', None)
-
-        existing_list = []
-        if p_data:
-            row = None
-            if isinstance(p_data, list) and len(p_data) > 0:
-                row = p_data[0]
-            elif isinstance(p_data, dict):
-                row = p_data
-            if row is not None:
-                try:
-                    existing_list = row.get('reserved_items') if isinstance(row, dict) else row['reserved_items']
-                except Exception:
-                    existing_list = []
 
-        if not existing_list:
-            existing_list = []
+@router.post("/reserve/batch", response_model=BatchReserveResponse, response_model_exclude_unset=True)
+async def reserve_batch(batch: BatchReserveRequest, request: Request, services: Services = Depends(get_services)):
+    """Reserve several food items in one request, all-or-nothing.
 
-        # Normalize
-        if existing_list is None:
-            existing_list = []
-        if not isinstance(existing_list, list):
-            existing_list = list(existing_list) if existing_list is not None else []
+    Repeated food ids are merged. On success every item is decremented and recorded
+    for the profile together; otherwise nothing changes and the error detail carries
+    the per-item results.
+    """
+    profile_id_to_use = await _extract_user_id_from_request(request, services) or batch.profile_id
 
-        # Remove the food id (match as string or number)
-        new_list = [x for x in existing_list if str(x) != str(req.food_id)]
-        try:
-            profile_update_resp = supabase.table('profiles').update({'reserved_items': new_list}).eq('id', profile_id_for_action).execute()
-        except Exception as e:
-            profile_update_resp = {'error': str(e)}
+    wanted: dict = {}
+    for item in batch.items:
+        wanted[item.food_id] = wanted.get(item.food_id, 0) + item.quantity
 
-    # Next, increment food quantity back (if quantity field exists on row)
-    food_update_resp = None
     try:
-        q_resp = supabase.table('Food').select('quantity, stockLevel').eq('id', req.food_id).execute()
+        result = await services.repository.reserve_food_batch(list(wanted.items()), profile_id_to_use)
     except Exception as e:
+        reservations.inc("error", amount=len(wanted))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-    data = None
-    if isinstance(q_resp, dict):
-        data = q_resp.get('data')
-    else:
-        data = getattr(q_resp, 'data', None)
-
-    if not data or len(data) == 0:
-        # Food not found; still return profile update result
-        return {'profile_update': profile_update_resp, 'food_update': None}
+    results = result.get("results") or []
+    for r in results:
+        reservations.inc(r.get("status"))
+    if result.get("status") != "ok":
+        failed = next((r for r in results if r.get("status") != "skipped"), {})
+        code = BATCH_FAILURE_STATUS.get(failed.get("status"), status.HTTP_500_INTERNAL_SERVER_ERROR)
+        raise HTTPException(status_code=code, detail={"message": "No items were reserved", "results": results})
+
+    event_ids = {r["event_id"] for r in results if r.get("status") == "ok" and r.get("event_id") is not None}
+    if event_ids:
+        await services.response_cache.invalidate([f"event:{event_id}" for event_id in event_ids])
+    for r in results:
+        _publish_stock_change(services.stock_broadcaster, r)
+
+    profile_update = None
+    if profile_id_to_use:
+        profile_update = ProfileUpdate(updated=bool(result.get("profile_updated")))
+        if result.get("profile_error"):
+            profile_update.error = result["profile_error"]
 
-    row = data[0] if isinstance(data[0], dict) else data[0]
-    current_qty = None
-    try:
-        current_qty = row.get('quantity') if isinstance(row, dict) else row['quantity']
-    except Exception:
-        current_qty = None
+    return BatchReserveResponse(
+        status="ok",
+        results=[
+            BatchItemResult(**{k: r.get(k) for k in ("food_id", "status", "quantity", "stockLevel", "reservation_id")})
+            for r in results
+        ],
+        profile_update=profile_update,
+    )
 
-    # If quantity is None (unlimited), do not change
-    if current_qty is None:
-        return {'profile_update': profile_update_resp, 'food_update': {'status': 'unlimited'}}
 
-    try:
-        new_qty = int(current_qty) + req.quantity
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail='Invalid quantity on food row')
-
-    # recompute stockLevel
-    if new_qty > 30:
-        new_stock = StockLevel.HIGH.value
-    elif new_qty >= 8:
-        new_stock = StockLevel.MEDIUM.value
-    elif new_qty >= 1:
-        new_stock = StockLevel.LOW.value
-    else:
-        new_stock = StockLevel.LOW.value
+class CancelReserveRequest(BaseModel):
+    # Cancel one reservation by id, or all of the profile's reservations of food_id
+    food_id: Optional[int] = None
+    reservation_id: Optional[int] = None
+    # Ignored: the quantity recorded with the reservation is what gets restored
+    quantity: Optional[int] = Field(default=None, gt=0)
+    profile_id: Optional[str] = None
 
-    try:
-        food_update_resp = supabase.table('Food').update({'quantity': new_qty, 'stockLevel': new_stock}).eq('id', req.food_id).execute()
-    except Exception as e:
-        food_update_resp = {'error': str(e)}
 
-    return {'profile_update': profile_update_resp, 'food_update': food_update_resp}
+@router.post("/reserve/cancel", response_model=CancelResponse, response_model_exclude_unset=True)
+async def cancel_reservation(req: CancelReserveRequest, request: Request, services: Services = Depends(get_services)):
+    """Cancel a reservation: delete its reservations row and give its quantity back to Food.
 
+    Idempotent: cancelling something already cancelled returns 200 with nothing restored.
+    """
+    if req.reservation_id is None and req.food_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="reservation_id or food_id is required")
 
-@app.get('/profiles/{profile_id}/reservations')
-async def get_profile_reservations(profile_id: str, request: Request):
-    """Return a list of reserved food ids for the profile and the food rows for those items."""
-    # If caller used the special `me` identifier, try to resolve from the Authorization header.
-    if profile_id in ("me", "self"):
-        token_user = _extract_user_id_from_request(request)
-        if token_user:
-            profile_id = token_user
+    # Prefer token-derived user id if available; fallback to provided profile_id
+    token_user = await _extract_user_id_from_request(request, services)
+    profile_id_for_action = token_user or req.profile_id
+    if not profile_id_for_action:
+        # Anonymous reservations are not recorded, so there is nothing to give back
+        return CancelResponse(status='ok', cancelled=[], profile_update=None, food_update=None)
 
     try:
-        p_resp = supabase.table('profiles').select('reserved_items').eq('id', profile_id).execute()
+        result = await services.repository.cancel_reservation(profile_id_for_action, req.reservation_id, req.food_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-    p_data = None
-    if isinstance(p_resp, dict):
-        p_data = p_resp.get('data')
-    else:
-        p_data = getattr(p_resp, 'data', None)
+    cancelled = result.get("cancelled") or []
+    outcome = result.get("status")
+    if outcome == "conflict":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Food item is being reserved by others; please retry")
+    food_update = None
+    if outcome == "unlimited":
+        food_update = StockUpdate(status='unlimited')
+    elif outcome == "ok":
+        food_update = StockUpdate(
+            id=result.get("food_id"),
+            quantity=result.get("quantity"),
+            stockLevel=result.get("stockLevel"),
+            restored=result.get("restored"),
+        )
+        if result.get("event_id") is not None:
+            await services.response_cache.invalidate([f"event:{result['event_id']}"])
+        _publish_stock_change(services.stock_broadcaster, result)
 
-    if not p_data:
-        return {'reserved_items': [], 'food_rows': []}
+    return CancelResponse(
+        status='ok',
+        cancelled=cancelled,
+        profile_update=ProfileUpdate(removed=len(cancelled)),
+        food_update=food_update,
+    )
 
-    row = None
-    if isinstance(p_data, list) and len(p_data) > 0:
-        row = p_data[0]
-    elif isinstance(p_data, dict):
-        row = p_data
 
-    if not row:
-        return {'reserved_items': [], 'food_rows': []}
+@router.get('/profiles/{profile_id}/reservations')
+async def get_profile_reservations(profile_id: str, request: Request, services: Services = Depends(get_services)):
+    """Return the profile's reservations, the reserved food ids and the food rows for those items.
 
-    reserved = row.get('reserved_items') if isinstance(row, dict) else row['reserved_items']
-    if not reserved:
-        return {'reserved_items': [], 'food_rows': []}
+    Each food row carries an `event` summary, so clients need no per-event follow-up requests.
+    """
+    # If caller used the special `me` identifier, try to resolve from the Authorization header.
+    if profile_id in ("me", "self"):
+        token_user = await _extract_user_id_from_request(request, services)
+        if token_user:
+            profile_id = token_user
 
-    # fetch food rows
     try:
-        f_resp = supabase.table('Food').select('*').in_('id', reserved).execute()
+        reservations = await services.repository.get_profile_reservations(profile_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-    f_data = None
-    if isinstance(f_resp, dict):
-        f_data = f_resp.get('data')
-    else:
-        f_data = getattr(f_resp, 'data', None)
-
-    return {'reserved_items': reserved, 'food_rows': f_data or []}
+    return FastJSONResponse(reservations)
 
 
 #statistics for home page
-@app.get("/stats")
-async def get_stats():
+@router.get("/stats")
+async def get_stats(response: Response, services: Services = Depends(get_services)):
     """
-    Calculate dashboard statistics from the database
+    Dashboard statistics, served from an in-memory snapshot that is recounted in the background
     """
     try:
-        # Events Tracked 
-        events_resp = supabase.table('Events').select('*', count='exact').execute()
-        total_events = events_resp.count or 0
-        
-        # Food Items Saved
-        food_resp = supabase.table('Food').select('*', count='exact').execute()
-        total_food_items = food_resp.count or 0
-        
-        # Active Users
-        profiles_resp = supabase.table('profiles').select('*', count='exact').execute()
-        active_users = profiles_resp.count or 0
-        
-        # Pounds Rescued
-        total_pounds = total_food_items * 5
-        
-        stats = {
-            "total_events": total_events,
-            "total_food_saved": total_food_items,
-            "active_users": active_users,
-            "total_pounds_rescued": total_pounds
-        }
-        
-        return {"data": stats}
-        
+        stats = await services.stats_snapshot.get(services.repository)
     except Exception as e:
-        print(f"Error calculating stats: {str(e)}")
+        logger.exception("Error calculating stats")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error calculating stats: {str(e)}"
         )
 
+    # Let browsers and CDNs reuse the response until the snapshot is due for a refresh
+    max_age = max(0, int(services.stats_snapshot.refresh_after - services.stats_snapshot.age()))
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return {"data": stats}
+
+
+def create_app(services: Optional[Services] = None) -> FastAPI:
+    """Build the API app.
+
+    Nothing connects at import: the Supabase client, thread pools and caches are built
+    when the app starts, i.e. once per worker process after any fork, and closed again on
+    shutdown. Pass `services` to run the app against something else (tests, benchmarks);
+    the caller then owns and closes them.
+    """
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: FastAPI):
+        configure_logging()
+        owned = None
+        if getattr(app.state, "services", None) is None:
+            owned = app.state.services = build_services()
+        app.state.services.start()
+        try:
+            yield
+        finally:
+            if owned is not None:
+                owned.close()
+                app.state.services = None
+            _shutdown_image_pool()
+            shutdown_logging()
+
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+    # Innermost, so early 413s still get CORS headers
+    app.add_middleware(UploadSizeLimitMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "X-Request-ID"],
+    )
+    # The last one added runs outermost, so metrics time everything including CORS
+    # Outside CORS, so its Vary: Origin is merged with Accept-Encoding
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(RequestIdMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    app.state.services = services
+    return app
+
+
+app = create_app()
+
+
+async def _import_file(path: str, fmt: Optional[str], dry_run: bool) -> dict:
+    fmt = fmt or _import_format(path, None)
+    if fmt is None:
+        raise SystemExit(f"Cannot tell the format of {path}; pass --format csv|jsonl")
+    services = build_services()
+    try:
+        with open(path, "rb") as f:
+            return await BulkImport(services, dry_run=dry_run).run(_import_records(f, fmt))
+    finally:
+        services.close()
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the API server, or bulk import events and food.")
+    commands = parser.add_subparsers(dest="command")
+    import_parser = commands.add_parser("import", help="import a CSV or JSONL file of events and food")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=("csv", "jsonl"))
+    import_parser.add_argument("--dry-run", action="store_true", help="validate without inserting")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        # The report goes to stdout; keep log lines out of it
+        configure_logging(stream=sys.stderr)
+        print(json.dumps(asyncio.run(_import_file(args.path, args.format, args.dry_run)), indent=2))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
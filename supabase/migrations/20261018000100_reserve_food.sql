@@ -0,0 +1,92 @@
+-- Atomic reservation engine used by PUT /reserve/.
+--
+-- Locks the food row, derives a starting count from stockLevel when quantity is
+-- null (medium => 30, low => 7, high => unlimited), decrements, recomputes
+-- stockLevel with the same thresholds as server.py and appends the food id to the
+-- profile's reserved_items, all in one transaction and one PostgREST round trip.
+-- Assumes profiles.reserved_items is a bigint[] column.
+
+create or replace function public.stock_level_for(p_quantity integer)
+returns text
+language sql
+immutable
+as $$
+  select case
+    when p_quantity > 30 then 'high'
+    when p_quantity >= 8 then 'medium'
+    else 'low'
+  end;
+$$;
+
+create or replace function public.reserve_food(
+  p_food_id bigint,
+  p_quantity integer,
+  p_profile_id uuid default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_quantity integer;
+  v_stock text;
+  v_event_id bigint;
+  v_new_quantity integer;
+  v_new_stock text;
+  v_profile_updated boolean := false;
+begin
+  if p_quantity is null or p_quantity <= 0 then
+    return jsonb_build_object('status', 'invalid', 'detail', 'quantity must be positive');
+  end if;
+
+  select quantity, "stockLevel", event_id
+    into v_quantity, v_stock, v_event_id
+    from "Food"
+   where id = p_food_id
+     for update;
+
+  if not found then
+    return jsonb_build_object('status', 'not_found');
+  end if;
+
+  if v_quantity is null then
+    if v_stock = 'high' then
+      return jsonb_build_object('status', 'unlimited', 'food_id', p_food_id, 'event_id', v_event_id);
+    elsif v_stock = 'medium' then
+      v_quantity := 30;
+    elsif v_stock = 'low' then
+      v_quantity := 7;
+    else
+      return jsonb_build_object('status', 'invalid', 'detail', 'Current quantity missing and stock level unavailable');
+    end if;
+  end if;
+
+  v_new_quantity := v_quantity - p_quantity;
+  if v_new_quantity < 0 then
+    return jsonb_build_object('status', 'oversold', 'food_id', p_food_id, 'available', v_quantity);
+  end if;
+
+  v_new_stock := public.stock_level_for(v_new_quantity);
+
+  update "Food"
+     set quantity = v_new_quantity,
+         "stockLevel" = v_new_stock
+   where id = p_food_id;
+
+  if p_profile_id is not null then
+    update profiles
+       set reserved_items = array_append(coalesce(reserved_items, '{}'), p_food_id)
+     where id = p_profile_id
+       and not (coalesce(reserved_items, '{}') @> array[p_food_id]);
+    v_profile_updated := found;
+  end if;
+
+  return jsonb_build_object(
+    'status', 'ok',
+    'food_id', p_food_id,
+    'event_id', v_event_id,
+    'quantity', v_new_quantity,
+    'stockLevel', v_new_stock,
+    'profile_updated', v_profile_updated
+  );
+end;
+$$;
@@ -0,0 +1,8 @@
+-- Resized copies of event images, written by POST /event/.
+--
+-- Shape: {"webp": {"320": url, "640": url, "1280": url}, "jpeg": {...}}, keyed by
+-- format and then pixel width, so clients can build a srcset. Null for events
+-- without an image or created before variants existed.
+
+alter table public."Events"
+  add column if not exists image_variants jsonb;
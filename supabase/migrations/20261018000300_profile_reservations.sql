@@ -0,0 +1,41 @@
+-- Reservation lookup used by GET /profiles/{profile_id}/reservations.
+--
+-- Resolves profile -> reserved food rows -> parent event summaries in one query
+-- and one PostgREST round trip. Returns null when the profile does not exist.
+-- The projected columns match RESERVED_FOOD_FIELDS / RESERVED_EVENT_FIELDS in server.py.
+
+create or replace function public.profile_reservations(p_profile_id uuid)
+returns jsonb
+language sql
+stable
+as $$
+  select jsonb_build_object(
+    'reserved_items', coalesce(to_jsonb(p.reserved_items), '[]'::jsonb),
+    'food_rows', coalesce((
+      select jsonb_agg(jsonb_build_object(
+        'id', f.id,
+        'name', f.name,
+        'quantity', f.quantity,
+        'stockLevel', f."stockLevel",
+        'dietaryTags', f."dietaryTags",
+        'event_id', f.event_id,
+        'event', case when e.id is null then null else jsonb_build_object(
+          'id', e.id,
+          'name', e.name,
+          'organization', e.organization,
+          'location', e.location,
+          'campus_location', e.campus_location,
+          'date', e.date,
+          'start_time', e.start_time,
+          'end_time', e.end_time,
+          'image_url', e.image_url
+        ) end
+      ) order by f.id)
+      from public."Food" f
+      left join public."Events" e on e.id = f.event_id
+      where f.id = any(p.reserved_items)
+    ), '[]'::jsonb)
+  )
+  from public.profiles p
+  where p.id = p_profile_id;
+$$;
@@ -0,0 +1,169 @@
+-- One row per reservation, replacing the profiles.reserved_items array.
+--
+-- Reserving inserts a row and cancelling deletes it, so neither rewrites a whole
+-- array, and each row records the quantity taken so cancel can restore exactly
+-- that amount. reserved_items is backfilled here and no longer written; it is
+-- left in place so this migration can be rolled back.
+
+create table if not exists public.reservations (
+  id bigint generated by default as identity primary key,
+  profile_id uuid not null references public.profiles (id) on delete cascade,
+  food_id bigint not null references public."Food" (id) on delete cascade,
+  quantity integer not null check (quantity > 0),
+  created_at timestamptz not null default now()
+);
+
+create index if not exists reservations_profile_id_idx on public.reservations (profile_id, id);
+create index if not exists reservations_food_id_idx on public.reservations (food_id);
+
+-- The array never stored quantities; each legacy entry becomes a reservation of 1
+insert into public.reservations (profile_id, food_id, quantity)
+select p.id, item.food_id, 1
+  from public.profiles p
+ cross join lateral unnest(p.reserved_items) as item(food_id)
+ where exists (select 1 from public."Food" f where f.id = item.food_id)
+   and not exists (select 1 from public.reservations r where r.profile_id = p.id);
+
+-- Lookups now embed Food and Events straight from reservations in one query
+drop function if exists public.profile_reservations(uuid);
+
+create or replace function public.reserve_food(
+  p_food_id bigint,
+  p_quantity integer,
+  p_profile_id uuid default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_quantity integer;
+  v_stock text;
+  v_event_id bigint;
+  v_new_quantity integer;
+  v_new_stock text;
+  v_reservation_id bigint;
+begin
+  if p_quantity is null or p_quantity <= 0 then
+    return jsonb_build_object('status', 'invalid', 'detail', 'quantity must be positive');
+  end if;
+
+  select quantity, "stockLevel", event_id
+    into v_quantity, v_stock, v_event_id
+    from "Food"
+   where id = p_food_id
+     for update;
+
+  if not found then
+    return jsonb_build_object('status', 'not_found');
+  end if;
+
+  if v_quantity is null and v_stock = 'high' then
+    -- Unlimited: nothing to decrement, but the reservation is still recorded
+    v_new_quantity := null;
+    v_new_stock := v_stock;
+  else
+    if v_quantity is null then
+      if v_stock = 'medium' then
+        v_quantity := 30;
+      elsif v_stock = 'low' then
+        v_quantity := 7;
+      else
+        return jsonb_build_object('status', 'invalid', 'detail', 'Current quantity missing and stock level unavailable');
+      end if;
+    end if;
+
+    v_new_quantity := v_quantity - p_quantity;
+    if v_new_quantity < 0 then
+      return jsonb_build_object('status', 'oversold', 'food_id', p_food_id, 'available', v_quantity);
+    end if;
+
+    v_new_stock := public.stock_level_for(v_new_quantity);
+
+    update "Food"
+       set quantity = v_new_quantity,
+           "stockLevel" = v_new_stock
+     where id = p_food_id;
+  end if;
+
+  if p_profile_id is not null and exists (select 1 from profiles where id = p_profile_id) then
+    insert into reservations (profile_id, food_id, quantity)
+    values (p_profile_id, p_food_id, p_quantity)
+    returning id into v_reservation_id;
+  end if;
+
+  return jsonb_build_object(
+    'status', case when v_new_quantity is null then 'unlimited' else 'ok' end,
+    'food_id', p_food_id,
+    'event_id', v_event_id,
+    'quantity', v_new_quantity,
+    'stockLevel', v_new_stock,
+    'profile_updated', v_reservation_id is not null,
+    'reservation_id', v_reservation_id
+  );
+end;
+$$;
+
+-- Cancels one reservation (p_reservation_id) or all of a profile's reservations of a
+-- food (p_food_id) and gives back exactly the reserved quantity. Cancelling something
+-- already cancelled finds no rows and changes nothing, so retries are safe.
+create or replace function public.cancel_reservation(
+  p_profile_id uuid,
+  p_reservation_id bigint default null,
+  p_food_id bigint default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_food_id bigint;
+  v_restored integer;
+  v_ids bigint[];
+  v_quantity integer;
+  v_stock text;
+  v_event_id bigint;
+begin
+  with removed as (
+    delete from reservations
+     where profile_id = p_profile_id
+       and (p_reservation_id is null or id = p_reservation_id)
+       and (p_food_id is null or food_id = p_food_id)
+       and (p_reservation_id is not null or p_food_id is not null)
+    returning id, food_id, quantity
+  )
+  select min(food_id), sum(quantity), array_agg(id order by id)
+    into v_food_id, v_restored, v_ids
+    from removed;
+
+  if v_ids is null then
+    return jsonb_build_object('status', 'not_found', 'cancelled', '[]'::jsonb);
+  end if;
+
+  select quantity, "stockLevel", event_id
+    into v_quantity, v_stock, v_event_id
+    from "Food"
+   where id = v_food_id
+     for update;
+
+  if v_quantity is null then
+    return jsonb_build_object('status', 'unlimited', 'cancelled', to_jsonb(v_ids),
+                              'food_id', v_food_id, 'event_id', v_event_id);
+  end if;
+
+  v_quantity := v_quantity + v_restored;
+  v_stock := public.stock_level_for(v_quantity);
+  update "Food"
+     set quantity = v_quantity,
+         "stockLevel" = v_stock
+   where id = v_food_id;
+
+  return jsonb_build_object(
+    'status', 'ok',
+    'cancelled', to_jsonb(v_ids),
+    'food_id', v_food_id,
+    'event_id', v_event_id,
+    'restored', v_restored,
+    'quantity', v_quantity,
+    'stockLevel', v_stock
+  );
+end;
+$$;
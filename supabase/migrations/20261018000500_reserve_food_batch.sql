@@ -0,0 +1,146 @@
+-- All-or-nothing batch reservation used by POST /reserve/batch.
+--
+-- p_items is a JSON array of {"food_id", "quantity"}; repeated food ids are merged.
+-- Every row is locked up front (in id order, so concurrent batches cannot deadlock),
+-- every item is checked, and only if all of them pass are the rows decremented and
+-- the reservations recorded, in one transaction and one PostgREST round trip.
+-- On failure nothing changes and items that would have succeeded report 'skipped'.
+
+create or replace function public.reserve_food_batch(
+  p_items jsonb,
+  p_profile_id uuid default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_wanted jsonb;
+  v_item jsonb;
+  v_food_id bigint;
+  v_requested integer;
+  v_quantity integer;
+  v_stock text;
+  v_event_id bigint;
+  v_new_quantity integer;
+  v_checked jsonb := '[]'::jsonb;
+  v_results jsonb := '[]'::jsonb;
+  v_failed boolean := false;
+  v_record boolean;
+  v_reservation_id bigint;
+begin
+  select jsonb_agg(jsonb_build_object('food_id', food_id, 'quantity', quantity) order by first_seen)
+    into v_wanted
+    from (
+      select (e->>'food_id')::bigint as food_id,
+             sum((e->>'quantity')::integer)::integer as quantity,
+             min(ord) as first_seen
+        from jsonb_array_elements(coalesce(p_items, '[]'::jsonb)) with ordinality as t(e, ord)
+       group by 1
+    ) w;
+
+  if v_wanted is null then
+    return jsonb_build_object('status', 'failed', 'results', '[]'::jsonb);
+  end if;
+
+  perform 1
+     from "Food"
+    where id in (select (e->>'food_id')::bigint from jsonb_array_elements(v_wanted) e)
+    order by id
+      for update;
+
+  -- Check every item before writing anything
+  for v_item in select * from jsonb_array_elements(v_wanted) loop
+    v_food_id := (v_item->>'food_id')::bigint;
+    v_requested := (v_item->>'quantity')::integer;
+
+    select quantity, "stockLevel", event_id
+      into v_quantity, v_stock, v_event_id
+      from "Food"
+     where id = v_food_id;
+
+    if not found then
+      v_checked := v_checked || jsonb_build_object('food_id', v_food_id, 'status', 'not_found');
+      v_failed := true;
+      continue;
+    end if;
+
+    if v_requested is null or v_requested <= 0 then
+      v_checked := v_checked || jsonb_build_object('food_id', v_food_id, 'status', 'invalid',
+                                                   'detail', 'quantity must be positive');
+      v_failed := true;
+      continue;
+    end if;
+
+    if v_quantity is null and v_stock = 'high' then
+      v_checked := v_checked || jsonb_build_object('food_id', v_food_id, 'status', 'unlimited',
+                                                   'event_id', v_event_id, 'requested', v_requested);
+      continue;
+    end if;
+
+    if v_quantity is null then
+      if v_stock = 'medium' then
+        v_quantity := 30;
+      elsif v_stock = 'low' then
+        v_quantity := 7;
+      else
+        v_checked := v_checked || jsonb_build_object('food_id', v_food_id, 'status', 'invalid',
+                                                     'detail', 'Current quantity missing and stock level unavailable');
+        v_failed := true;
+        continue;
+      end if;
+    end if;
+
+    v_new_quantity := v_quantity - v_requested;
+    if v_new_quantity < 0 then
+      v_checked := v_checked || jsonb_build_object('food_id', v_food_id, 'status', 'oversold',
+                                                   'available', v_quantity);
+      v_failed := true;
+      continue;
+    end if;
+
+    v_checked := v_checked || jsonb_build_object(
+      'food_id', v_food_id,
+      'status', 'ok',
+      'event_id', v_event_id,
+      'requested', v_requested,
+      'quantity', v_new_quantity,
+      'stockLevel', public.stock_level_for(v_new_quantity)
+    );
+  end loop;
+
+  if v_failed then
+    select jsonb_agg(
+             case when r->>'status' in ('ok', 'unlimited')
+                  then jsonb_build_object('food_id', r->'food_id', 'status', 'skipped')
+                  else r end
+             order by ord)
+      into v_results
+      from jsonb_array_elements(v_checked) with ordinality as t(r, ord);
+    return jsonb_build_object('status', 'failed', 'results', v_results);
+  end if;
+
+  v_record := p_profile_id is not null and exists (select 1 from profiles where id = p_profile_id);
+
+  for v_item in select * from jsonb_array_elements(v_checked) loop
+    v_food_id := (v_item->>'food_id')::bigint;
+
+    if v_item->>'status' = 'ok' then
+      update "Food"
+         set quantity = (v_item->>'quantity')::integer,
+             "stockLevel" = v_item->>'stockLevel'
+       where id = v_food_id;
+    end if;
+
+    v_reservation_id := null;
+    if v_record then
+      insert into reservations (profile_id, food_id, quantity)
+      values (p_profile_id, v_food_id, (v_item->>'requested')::integer)
+      returning id into v_reservation_id;
+    end if;
+
+    v_results := v_results || ((v_item - 'requested') || jsonb_build_object('reservation_id', v_reservation_id));
+  end loop;
+
+  return jsonb_build_object('status', 'ok', 'results', v_results, 'profile_updated', v_record);
+end;
+$$;
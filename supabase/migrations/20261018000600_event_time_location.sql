@@ -0,0 +1,22 @@
+-- "Happening now / near me" lookups for GET /events/now.
+--
+-- Optional coordinates per event (WGS84 degrees), set by POST /event/ when the
+-- client sends them, plus indexes so the time window, campus and bounding-box
+-- filters the endpoint pushes down are index scans instead of a full table read.
+
+alter table public."Events"
+  add column if not exists latitude double precision,
+  add column if not exists longitude double precision;
+
+-- date = D and start_time <= T (and end_time >= T on the first day)
+create index if not exists events_date_start_time_idx
+  on public."Events" (date, start_time);
+
+-- The same window restricted to one campus_location
+create index if not exists events_campus_date_start_time_idx
+  on public."Events" (campus_location, date, start_time);
+
+-- Bounding box: a latitude range scan, longitude checked from the index
+create index if not exists events_coordinates_idx
+  on public."Events" (latitude, longitude)
+  where latitude is not null and longitude is not null;
@@ -0,0 +1,104 @@
+"""
+Benchmark POST /import's pipeline: 100k CSV rows through BulkImport.
+
+Writes a CSV of events and the food that references them to a temp file, then
+imports it into a sink that answers each insert after a simulated round trip
+(it keeps nothing, so the peak memory measured is the importer's own). Runs with
+one insert in flight and with the default IMPORT_MAX_IN_FLIGHT.
+
+    python tests/bench_bulk_import.py [--rows 100000] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import server  # noqa: E402
+
+FOOD_PER_EVENT = 4
+
+
+class SinkRepository:
+    """Accepts inserts after `latency` seconds, handing back ids, and stores nothing."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self._ids = itertools.count(1)
+
+    async def _insert(self, rows: list) -> list:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return [{**row, "id": next(self._ids)} for row in rows]
+
+    insert_events = _insert
+    insert_food = _insert
+
+
+def write_csv(path: str, n_rows: int) -> None:
+    with open(path, "w") as f:
+        f.write("ref,name,description,organization,location,date,start_time,end_time,event_ref,quantity,dietaryTags\n")
+        rows = 0
+        for i in itertools.count():
+            if rows >= n_rows:
+                break
+            f.write(f"e{i},Event {i},Free food after the meeting,Club {i % 300},GSU,2025-12-{1 + i % 28:02d},12:00,13:30,,,\n")
+            rows += 1
+            for j in range(min(FOOD_PER_EVENT, n_rows - rows)):
+                f.write(f",Food {i}-{j},,,,,,,e{i},{5 + j},\"vegan, halal\"\n")
+                rows += 1
+
+
+# Index updates grow with the data, not the file read; leave them out of the measurement
+NOOP_INDEX = types.SimpleNamespace(add_events=lambda rows: None, add_food_rows=lambda rows: None)
+
+
+async def import_file(path: str, sink: SinkRepository, max_in_flight: int) -> dict:
+    services = server.Services(sink, dietary_index=NOOP_INDEX, search_index=NOOP_INDEX)
+    with open(path, "rb") as f:
+        report = await server.BulkImport(services, max_in_flight=max_in_flight).run(server._import_records(f, "csv"))
+    assert report["error_count"] == 0, report["errors"][:5]
+    return report
+
+
+async def run(path: str, latency: float, max_in_flight: int) -> tuple:
+    sink = SinkRepository(latency)
+    start = time.perf_counter()
+    report = await import_file(path, sink, max_in_flight)
+    elapsed = time.perf_counter() - start
+    # Memory in a second pass: tracemalloc slows Python down several times over
+    tracemalloc.start()
+    await import_file(path, SinkRepository(latency), max_in_flight)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return report, elapsed, peak, sink.requests
+
+
+async def main(n_rows: int, latency_ms: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "import.csv")
+        write_csv(path, n_rows)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{n_rows} rows ({size_mb:.1f} MB CSV), batch {server.IMPORT_BATCH_ROWS}, {latency_ms:g} ms per insert")
+        for in_flight in (1, server.IMPORT_MAX_IN_FLIGHT):
+            report, elapsed, peak, requests = await run(path, latency_ms / 1000, in_flight)
+            print(f"in flight {in_flight}:  {elapsed:6.2f} s  {report['rows'] / elapsed:9.0f} rows/s  "
+                  f"{requests:4d} inserts  peak {peak / 1e6:5.1f} MB  "
+                  f"({report['events_imported']} events, {report['food_imported']} food)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.latency_ms))
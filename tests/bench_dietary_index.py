@@ -0,0 +1,119 @@
+"""
+Benchmark /search/dietary: full-scan filtering vs the in-memory tag index.
+
+Seeds the in-memory Supabase stand-in with 10k events and 100k food rows and
+times both paths end to end (repository calls included).
+
+    python tests/bench_dietary_index.py [--events 10000] [--foods 100000] [--runs 20]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import server  # noqa: E402
+from fake_supabase import FakeSupabase  # noqa: E402
+
+TAGS = ["vegan", "vegetarian", "gluten-free", "dairy-free", "nut-free", "halal", "pescatarian"]
+# Served by roughly 0.5% of food rows, so a search for it matches a few hundred events
+RARE_TAG = "kosher"
+
+
+def seed(fake: FakeSupabase, n_events: int, n_foods: int) -> None:
+    rng = random.Random(42)
+    events = fake.seed("Events", [
+        {"name": f"Event {i}", "date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}", "food": []}
+        for i in range(n_events)
+    ])
+    foods = []
+    for i in range(n_foods):
+        tags = rng.sample(TAGS, rng.randint(0, 2))
+        if rng.random() < 0.005:
+            tags.append(RARE_TAG)
+        foods.append({
+            "name": f"Food {i}",
+            "event_id": events[rng.randrange(n_events)]["id"],
+            "quantity": rng.randint(0, 40),
+            "stockLevel": "medium",
+            # Mix list and comma-string storage like the real table
+            "dietaryTags": tags if i % 2 else ", ".join(tags),
+        })
+    fake.seed("Food", foods)
+
+
+async def full_scan(repo: server.SupabaseRepository, tag_list: list) -> list:
+    """The pre-index implementation: fetch every event and food row and filter in Python."""
+    events_data, food_data = await asyncio.gather(repo.list_events(), repo.list_food())
+    event_food_map = {}
+    for food in food_data:
+        event_food_map.setdefault(food.get('event_id'), []).append(food)
+    filtered = []
+    for event in events_data:
+        for food in event_food_map.get(event.get('id'), []):
+            if any(tag in server._normalize_tags(food.get('dietaryTags')) for tag in tag_list):
+                filtered.append(event)
+                break
+    return filtered
+
+
+async def indexed(repo: server.SupabaseRepository, index: server.DietaryTagIndex, tag_list: list) -> list:
+    await index.ensure_fresh(repo)
+    ids = index.match(tag_list)
+    return await repo.list_events_by_ids(sorted(ids)) if ids else []
+
+
+async def time_it(fn, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main(n_events: int, n_foods: int, runs: int) -> None:
+    fake = FakeSupabase()
+    seed(fake, n_events, n_foods)
+    repo = server.SupabaseRepository(fake)
+    index = server.DietaryTagIndex(ttl=3600)
+    tag_list = [RARE_TAG]
+
+    build_start = time.perf_counter()
+    await index.ensure_fresh(repo)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    old = await full_scan(repo, tag_list)
+    new = await indexed(repo, index, tag_list)
+    assert {e["id"] for e in old} == {e["id"] for e in new}, "index and full scan disagree"
+
+    old_ms = await time_it(lambda: full_scan(repo, tag_list), runs)
+    new_ms = await time_it(lambda: indexed(repo, index, tag_list), runs)
+    match_us = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        index.match(tag_list)
+        match_us.append((time.perf_counter() - start) * 1_000_000)
+    repo.close()
+
+    print(f"{n_events} events / {n_foods} food rows, tags={tag_list}, {len(new)} matching events")
+    print(f"index build (once per TTL):  {build_ms:9.1f} ms")
+    print(f"full scan        p50 {statistics.median(old_ms):9.2f} ms   max {max(old_ms):9.2f} ms")
+    print(f"indexed          p50 {statistics.median(new_ms):9.2f} ms   max {max(new_ms):9.2f} ms")
+    print(f"index match only p50 {statistics.median(match_us):9.1f} us")
+    print(f"speedup          {statistics.median(old_ms) / statistics.median(new_ms):9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--foods", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.events, args.foods, args.runs))
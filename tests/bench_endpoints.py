@@ -0,0 +1,219 @@
+"""
+Benchmark suite: drive every HTTP endpoint against the in-memory Supabase stand-in.
+
+Seeds the stand-in with --events events and --foods food rows, injects --latency-ms
+(plus up to --jitter-ms) on every Supabase round trip, then sends --requests requests
+per scenario from --concurrency concurrent clients through the ASGI app and records
+throughput, p50 and p99. Results are written as JSON to --out; with --baseline the
+run is diffed against an earlier one, and the exit status is 1 when a scenario's p50
+or throughput regressed by more than --tolerance percent.
+
+    python tests/bench_endpoints.py [--out bench.json] [--baseline tests/bench_baseline.json]
+                                    [--events 2000] [--foods 20000] [--requests 300]
+                                    [--concurrency 32] [--latency-ms 5] [--jitter-ms 5]
+                                    [--only reserve,search]
+
+The image upload, bulk import and index internals have their own bench_*.py scripts.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import server  # noqa: E402
+from fake_supabase import FakeSupabase  # noqa: E402
+
+TAGS = ["vegan", "vegetarian", "gluten-free", "dairy-free", "nut-free", "halal", "kosher"]
+CAMPUSES = ["West", "East", "Central", "South", "Fenway"]
+DISHES = ["Pizza", "Sushi", "Tacos", "Bagels", "Salad", "Curry", "Cookies", "Burritos", "Dumplings", "Falafel"]
+PROFILES = [f"profile-{i}" for i in range(200)]
+
+
+def seed(fake: FakeSupabase, n_events: int, n_foods: int) -> dict:
+    rng = random.Random(42)
+    today = datetime.date.today()
+    events = fake.seed("Events", [
+        {
+            "name": f"{rng.choice(DISHES)} Night {i}",
+            "description": f"Free {rng.choice(DISHES).lower()} for everyone at event {i}",
+            "organization": f"Club {i % 150}",
+            "location": f"Building {i % 40}",
+            "campus_location": rng.choice(CAMPUSES),
+            "food": rng.sample(DISHES, 3),
+            "date": (today + datetime.timedelta(days=i % 60 - 30)).isoformat(),
+            "start_time": f"{8 + i % 12:02d}:00",
+            "end_time": f"{10 + i % 12:02d}:00",
+        }
+        for i in range(n_events)
+    ])
+    foods = fake.seed("Food", [
+        {
+            "name": f"{rng.choice(DISHES)} {i}",
+            "event_id": events[rng.randrange(n_events)]["id"],
+            # Plenty of stock so the write scenarios never run out
+            "quantity": 10 ** 6,
+            "stockLevel": "medium",
+            "dietaryTags": rng.sample(TAGS, rng.randint(0, 2)),
+            "description": "Served fresh",
+        }
+        for i in range(n_foods)
+    ])
+    fake.seed("profiles", [{"id": p} for p in PROFILES])
+    return {"events": [e["id"] for e in events], "foods": [f["id"] for f in foods]}
+
+
+def scenarios(ids: dict) -> dict:
+    """name -> function(rng) returning the keyword arguments of one httpx request."""
+    events, foods = ids["events"], ids["foods"]
+    return {
+        "list_events": lambda rng: {"method": "GET", "url": "/", "params": {"limit": 50}},
+        "search_name": lambda rng: {"method": "GET", "url": f"/search/name/{rng.choice(DISHES)}"},
+        "search_food": lambda rng: {"method": "GET", "url": f"/search/food/{rng.choice(DISHES)}"},
+        "search_dietary": lambda rng: {"method": "GET", "url": "/search/dietary", "params": {"tags": rng.choice(TAGS)}},
+        "search": lambda rng: {"method": "GET", "url": "/search", "params": {"q": f"{rng.choice(DISHES)} club"}},
+        "events_now": lambda rng: {"method": "GET", "url": "/events/now", "params": {"campus_location": rng.choice(CAMPUSES)}},
+        "event_food": lambda rng: {"method": "GET", "url": f"/events/{rng.choice(events)}/food"},
+        "stats": lambda rng: {"method": "GET", "url": "/stats"},
+        "profile_reservations": lambda rng: {"method": "GET", "url": f"/profiles/{rng.choice(PROFILES)}/reservations"},
+        "reserve": lambda rng: {"method": "PUT", "url": "/reserve/", "json": {
+            "food_id": rng.choice(foods), "quantity": 1, "profile_id": rng.choice(PROFILES)}},
+        "reserve_batch": lambda rng: {"method": "POST", "url": "/reserve/batch", "json": {
+            "items": [{"food_id": f, "quantity": 1} for f in rng.sample(foods, 3)], "profile_id": rng.choice(PROFILES)}},
+        "cancel": lambda rng: {"method": "POST", "url": "/reserve/cancel", "json": {
+            "food_id": rng.choice(foods), "profile_id": rng.choice(PROFILES)}},
+        "create_event": lambda rng: {"method": "POST", "url": "/event/", "data": {
+            "name": f"{rng.choice(DISHES)} Pop-up", "description": "Leftovers from a catered lunch",
+            "location": "Building 1", "campus_location": rng.choice(CAMPUSES),
+            "date": datetime.date.today().isoformat(), "start_time": "12:00", "end_time": "13:00",
+            "food": json.dumps(rng.sample(DISHES, 2))}},
+        "add_food": lambda rng: {"method": "POST", "url": "/food/", "json": [{
+            "name": rng.choice(DISHES), "event_id": rng.choice(events), "quantity": 20, "stockLevel": "medium",
+            "dietaryTags": rng.sample(TAGS, 1)}]},
+        "metrics": lambda rng: {"method": "GET", "url": "/metrics"},
+    }
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_scenario(http: httpx.AsyncClient, make_request, n: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    requests = [make_request(rng) for _ in range(n)]
+    latencies, errors = [], 0
+    queue = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for kwargs in queue:
+            start = time.perf_counter()
+            r = await http.request(**kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if r.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": n,
+        "errors": errors,
+        "throughput_rps": round(n / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    fake = FakeSupabase(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=7)
+    fake.latency = 0  # seed at full speed, then switch the network delay on
+    ids = seed(fake, args.events, args.foods)
+    fake.latency = args.latency_ms / 1000
+
+    services = server.Services(server.SupabaseRepository(fake))
+
+    wanted = set(args.only.split(",")) if args.only else None
+    results = {}
+    transport = httpx.ASGITransport(app=server.create_app(services))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        for i, (name, make_request) in enumerate(scenarios(ids).items()):
+            if wanted and name not in wanted:
+                continue
+            # Warm-up builds the indexes and fills the caches the steady state relies on
+            await run_scenario(http, make_request, args.warmup, min(args.warmup, args.concurrency), seed=1000 + i)
+            results[name] = await run_scenario(http, make_request, args.requests, args.concurrency, seed=i)
+            r = results[name]
+            print(f"{name:22s} {r['throughput_rps']:9.1f} req/s   p50 {r['p50_ms']:8.2f} ms   "
+                  f"p99 {r['p99_ms']:8.2f} ms   errors {r['errors']}")
+    services.close()
+
+    return {
+        "meta": {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "events": args.events,
+            "foods": args.foods,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> bool:
+    """Print the change of every scenario against `baseline`; False if any regressed past `tolerance` %."""
+    ok = True
+    print(f"\nvs baseline from {baseline['meta'].get('created')} (tolerance {tolerance:.0f}%)")
+    changed = [k for k, v in current["meta"].items() if k not in ("created", "python") and baseline["meta"].get(k) != v]
+    if changed:
+        print(f"note: baseline was run with different {', '.join(changed)}")
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:22s} (new scenario)")
+            continue
+        p50 = (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+        p99 = (new["p99_ms"] - old["p99_ms"]) / old["p99_ms"] * 100 if old["p99_ms"] else 0.0
+        rps = (new["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100
+        regressed = p50 > tolerance or rps < -tolerance
+        ok = ok and not regressed
+        print(f"{name:22s} throughput {rps:+7.1f}%   p50 {p50:+7.1f}%   p99 {p99:+7.1f}%"
+              + ("   REGRESSED" if regressed else ""))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=2_000)
+    parser.add_argument("--foods", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=300, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated Supabase round trip")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--out", type=Path, help="write the results here as JSON")
+    parser.add_argument("--baseline", type=Path, help="earlier results to diff against")
+    parser.add_argument("--tolerance", type=float, default=25.0, help="allowed regression, percent")
+    args = parser.parse_args()
+
+    current = asyncio.run(main(args))
+    if args.out:
+        args.out.write_text(json.dumps(current, indent=2) + "\n")
+    if args.baseline and not compare(json.loads(args.baseline.read_text()), current, args.tolerance):
+        sys.exit(1)
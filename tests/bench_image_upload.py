@@ -0,0 +1,95 @@
+"""
+Benchmark event image handling: buffering the whole upload vs the streaming pipeline.
+
+Runs N concurrent uploads of a SIZE-MB image through both paths and reports wall time
+and peak Python heap (tracemalloc). Storage is a stub that drains what it is given in
+chunks and discards it, so only the server side is measured.
+
+    python tests/bench_image_upload.py [--uploads 20] [--size-mb 10]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from starlette.datastructures import Headers, UploadFile
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import server  # noqa: E402
+
+CHUNK = 64 * 1024
+
+
+def drain(file) -> int:
+    """What the storage client does with its argument: read it to the wire."""
+    if isinstance(file, (bytes, bytearray)):
+        return len(file)
+    with open(file, "rb") as fh:
+        total = 0
+        while chunk := fh.read(CHUNK):
+            total += len(chunk)
+        return total
+
+
+def make_upload(source: str) -> UploadFile:
+    # Starlette hands routes an UploadFile over a spooled temp file; a real file is the same shape
+    fh = open(source, "rb")
+    return UploadFile(fh, size=os.path.getsize(source), filename="photo.png",
+                      headers=Headers({"content-type": "image/png"}))
+
+
+async def buffered(source: str) -> None:
+    """The previous handler: `await image.read()` then upload the bytes."""
+    upload = make_upload(source)
+    content = await upload.read()
+    await asyncio.get_running_loop().run_in_executor(None, drain, content)
+    await upload.close()
+
+
+async def streamed(source: str) -> None:
+    upload = make_upload(source)
+    spooled = await server._spool_image_upload(upload)
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, drain, spooled.path)
+    finally:
+        os.unlink(spooled.path)
+        await upload.close()
+
+
+async def run(fn, source: str, uploads: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(fn(source) for _ in range(uploads)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+async def main(uploads: int, size_mb: int) -> None:
+    size = size_mb * 1024 * 1024
+    server.IMAGE_UPLOAD_MAX_BYTES = size
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as fh:
+        fh.write(b"\x89PNG\r\n\x1a\n")
+        fh.write(os.urandom(size - 8))
+    try:
+        print(f"{uploads} concurrent uploads of {size_mb} MB")
+        for label, fn in (("buffered", buffered), ("streamed", streamed)):
+            elapsed, peak = await run(fn, fh.name, uploads)
+            print(f"{label:9s} wall {elapsed * 1000:8.1f} ms   peak heap {peak / 2**20:8.1f} MB")
+    finally:
+        os.unlink(fh.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--size-mb", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.uploads, args.size_mb))
@@ -0,0 +1,112 @@
+"""
+Benchmark response serialization for a 5k-event GET /, before and after the orjson path.
+
+Times encoding the same payload three ways: FastAPI's default for a route returning a
+dict (jsonable_encoder, then json.dumps), the stdlib json.dumps the response cache used
+before, and server._json_bytes. Then serves GET / end to end through the ASGI app with
+the response cache disabled, once with the stdlib encoder and once with orjson.
+
+    python tests/bench_serialization.py [--events 5000] [--runs 20]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import server  # noqa: E402
+from fake_supabase import FakeSupabase  # noqa: E402
+
+
+def seed(fake: FakeSupabase, n_events: int) -> list:
+    today = datetime.date.today()
+    return fake.seed("Events", [
+        {
+            "name": f"Pizza Night {i}",
+            "description": f"Free pizza and drinks for everyone at event {i}",
+            "organization": f"Club {i % 150}",
+            "location": f"Building {i % 40}",
+            "campus_location": "West",
+            "food": ["Pizza", "Soda", "Cookies"],
+            "date": (today + datetime.timedelta(days=i % 60)).isoformat(),
+            "start_time": "12:00",
+            "end_time": "13:30",
+            "image_url": f"https://example.supabase.co/storage/v1/object/public/event-images/{i}.jpg",
+            "latitude": 42.35,
+            "longitude": -71.1,
+        }
+        for i in range(n_events)
+    ])
+
+
+def time_ms(fn, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def get_root_ms(http: httpx.AsyncClient, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        r = await http.get("/")
+        samples.append((time.perf_counter() - start) * 1000)
+        assert r.status_code == 200
+    return samples
+
+
+def report(label: str, samples: list) -> float:
+    p50 = statistics.median(samples)
+    print(f"{label:<40} p50 {p50:8.2f} ms   max {max(samples):8.2f} ms")
+    return p50
+
+
+async def main(n_events: int, runs: int) -> None:
+    fake = FakeSupabase()
+    rows = seed(fake, n_events)
+    payload = {"data": rows, "next_cursor": None}
+    size_kb = len(server._json_bytes(payload)) / 1024
+    print(f"GET / with {n_events} events ({size_kb:.0f} KB of JSON), {runs} runs")
+    if server.orjson is None:
+        print("orjson is not installed; the 'after' numbers use the stdlib encoder")
+
+    report("jsonable_encoder + json.dumps (dict)", time_ms(lambda: json.dumps(jsonable_encoder(payload)).encode(), runs))
+    before = report("json.dumps compact (before)", time_ms(
+        lambda: json.dumps(payload, separators=(',', ':'), default=str).encode(), runs))
+    after = report("_json_bytes (after)", time_ms(lambda: server._json_bytes(payload), runs))
+    print(f"{'encode speedup':<40} {before / after:8.1f}x")
+
+    # End to end, with every request reaching the repository and the encoder
+    services = server.Services(server.SupabaseRepository(fake), response_cache=server.InMemoryResponseCache(max_entries=0))
+    transport = httpx.ASGITransport(app=server.create_app(services))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        encoder = server.orjson
+        server.orjson = None
+        await get_root_ms(http, 2)
+        before = report("GET / end to end, stdlib json (before)", await get_root_ms(http, runs))
+        server.orjson = encoder
+        await get_root_ms(http, 2)
+        after = report("GET / end to end, _json_bytes (after)", await get_root_ms(http, runs))
+    services.close()
+    print(f"{'end-to-end speedup':<40} {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=5_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.events, args.runs))
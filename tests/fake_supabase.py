@@ -0,0 +1,452 @@
+"""
+In-memory stand-in for the subset of the supabase client used by server.py.
+
+Tables are plain lists of dicts guarded by a lock, so the fake is safe to drive
+from the repository's worker threads. Every round trip (`execute()`, storage
+upload, auth `get_user`) sleeps outside the lock to mimic the network: `latency`
+seconds, or `latency(target, operation)` when it is a callable, plus up to
+`jitter` seconds drawn uniformly (seeded by `seed`). Postgres functions
+called through `rpc()` are looked up in `functions`; unknown names raise
+PostgREST's PGRST202 error, as when a migration has not been applied. Tables
+listed in `columns` reject writes to unknown columns with PGRST204. Selects may
+embed many-to-one relations (`alias:Table(cols)`) declared in `foreign_keys`.
+Errors use the client's own exception types and codes: PGRST116 from `single()`,
+a 409 StorageApiError for an existing object, AuthApiError for a bad token.
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from postgrest.exceptions import APIError
+from storage3.exceptions import StorageApiError
+from supabase_auth.errors import AuthApiError
+
+
+class FakeResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns: Optional[List[Any]] = None
+        self._count: Optional[str] = None
+        self._head = False
+        self._payload: Any = None
+        self._filters: List[Any] = []
+        # (column, value) of eq() filters; the first one picks rows through a hash index
+        self._eq: List[Any] = []
+        self._order: List[Any] = []
+        self._limit: Optional[int] = None
+        self._single = False
+
+    # --- operations ---
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None):
+        self._op = "select"
+        self._columns = _parse_select(",".join(columns) if columns else "*")
+        self._count = count
+        self._head = bool(head)
+        return self
+
+    def insert(self, rows: Any):
+        self._op = "insert"
+        self._payload = rows
+        return self
+
+    def update(self, values: Dict[str, Any]):
+        self._op = "update"
+        self._payload = values
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # --- filters ---
+    def eq(self, column: str, value: Any):
+        self._filters.append(lambda row: _same(row.get(column), value))
+        self._eq.append((column, value))
+        return self
+
+    def gt(self, column: str, value: Any):
+        self._filters.append(_compare(column, "gt", value))
+        return self
+
+    def gte(self, column: str, value: Any):
+        self._filters.append(_compare(column, "gte", value))
+        return self
+
+    def lt(self, column: str, value: Any):
+        self._filters.append(_compare(column, "lt", value))
+        return self
+
+    def lte(self, column: str, value: Any):
+        self._filters.append(_compare(column, "lte", value))
+        return self
+
+    def or_(self, filters: str):
+        self._filters.append(_parse_logic("or", filters))
+        return self
+
+    def is_(self, column: str, value: Any):
+        if str(value).lower() == "null":
+            self._filters.append(lambda row: row.get(column) is None)
+        else:
+            self._filters.append(lambda row: _same(row.get(column), value))
+        return self
+
+    def in_(self, column: str, values: List[Any]):
+        wanted = {str(v) for v in values}
+        self._filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def contains(self, column: str, values: List[Any]):
+        self._filters.append(lambda row: all(v in (row.get(column) or []) for v in values))
+        return self
+
+    def text_search(self, column: str, query: str, options: Optional[Dict[str, Any]] = None):
+        terms = [t.lower() for t in query.split()]
+        self._filters.append(lambda row: all(t in (row.get(column) or "").lower().split() for t in terms)
+                             or all(t in (row.get(column) or "").lower() for t in terms))
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    # --- modifiers ---
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    def execute(self) -> FakeResponse:
+        self._db.delay(self._table, self._op)
+        with self._db.lock:
+            self._db.calls.append((self._table, self._op))
+            return self._execute_locked()
+
+    def _execute_locked(self) -> FakeResponse:
+        rows = self._db.tables.setdefault(self._table, [])
+        if self._op in ("insert", "update"):
+            self._check_columns()
+        if self._op == "insert":
+            inserted = self._db._insert_locked(self._table, self._payload)
+            return FakeResponse([dict(r) for r in inserted])
+
+        if self._eq:
+            # Like a Postgres index scan: only rows with the first eq() value are checked
+            column, value = self._eq[0]
+            rows = self._db._index_locked(self._table, column).get(_index_key(value), [])
+        matched = [r for r in rows if all(f(r) for f in self._filters)]
+        if self._op == "update":
+            for r in matched:
+                r.update(self._payload)
+            self._db._drop_indexes_locked(self._table, self._payload)
+            return FakeResponse([dict(r) for r in matched])
+        if self._op == "delete":
+            gone = {id(r) for r in matched}
+            self._db.tables[self._table] = [r for r in self._db.tables[self._table] if id(r) not in gone]
+            self._db._drop_indexes_locked(self._table)
+            return FakeResponse([dict(r) for r in matched])
+
+        for column, desc in reversed(self._order):
+            # Stable sorts applied last-key-first give a multi-column ORDER BY; NULLs sort last
+            present = [r for r in matched if r.get(column) is not None]
+            missing = [r for r in matched if r.get(column) is None]
+            matched = sorted(present, key=lambda r: r.get(column), reverse=desc) + missing
+        # Like PostgREST, the count is of every matching row, not just the returned page
+        count = len(matched) if self._count else None
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        if self._head:
+            return FakeResponse([], count)
+        projected = [self._project(r) for r in matched]
+        if self._single:
+            if len(projected) != 1:
+                raise APIError({
+                    "code": "PGRST116",
+                    "message": "JSON object requested, multiple (or no) rows returned",
+                    "details": f"The result contains {len(projected)} rows",
+                })
+            return FakeResponse(projected[0], count)
+        return FakeResponse(projected, count)
+
+    def _check_columns(self) -> None:
+        known = self._db.columns.get(self._table)
+        if known is None:
+            return
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        for row in payload:
+            for column in row:
+                if column not in known:
+                    raise APIError({
+                        "code": "PGRST204",
+                        "message": f"Could not find the '{column}' column of '{self._table}' in the schema cache",
+                    })
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return self._db._project_locked(self._table, row, self._columns)
+
+
+class FakeRpc:
+    def __init__(self, db: "FakeSupabase", name: str, params: Dict[str, Any]):
+        self._db = db
+        self._name = name
+        self._params = params
+
+    def execute(self) -> FakeResponse:
+        self._db.delay(self._name, "rpc")
+        with self._db.lock:
+            self._db.calls.append((self._name, "rpc"))
+            fn = self._db.functions.get(self._name)
+            if fn is None:
+                raise APIError({
+                    "code": "PGRST202",
+                    "message": f"Could not find the function public.{self._name} in the schema cache",
+                })
+            try:
+                return FakeResponse(fn(self._db, **self._params))
+            finally:
+                # Functions edit rows in place, behind the indexes' back
+                self._db._indexes.clear()
+
+
+class FakeBucket:
+    def __init__(self, storage: "FakeStorage", name: str):
+        self._storage = storage
+        self._name = name
+
+    def upload(self, path: str, file: Any, file_options: Optional[Dict[str, Any]] = None):
+        db = self._storage._db
+        db.delay(f"storage:{self._name}", "upload")
+        db.calls.append((f"storage:{self._name}", "upload"))
+        key = (self._name, path)
+        if key in self._storage.objects and str((file_options or {}).get("upsert", "false")).lower() != "true":
+            raise StorageApiError("The resource already exists", "Duplicate", 409)
+        if isinstance(file, (bytes, bytearray)):
+            content = bytes(file)
+        elif isinstance(file, str):
+            # Like storage3, a str is a path on disk
+            with open(file, "rb") as fh:
+                content = fh.read()
+        else:
+            content = file.read()
+        self._storage.objects[key] = content
+        self._storage.content_types[key] = (file_options or {}).get("content-type")
+        return {"Key": f"{self._name}/{path}"}
+
+    def get_public_url(self, path: str) -> str:
+        return f"https://fake.supabase.local/storage/v1/object/public/{self._name}/{path}"
+
+
+class FakeStorage:
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+        self.objects: Dict[Any, bytes] = {}
+        self.content_types: Dict[Any, Optional[str]] = {}
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self, bucket)
+
+
+class FakeAuth:
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+        self.tokens: Dict[str, str] = {}
+
+    def get_user(self, token: Optional[str] = None, access_token: Optional[str] = None):
+        self._db.delay("auth", "get_user")
+        self._db.calls.append(("auth", "get_user"))
+        user_id = self.tokens.get(token or access_token or "")
+        if user_id is None:
+            raise AuthApiError("invalid JWT: unable to parse or verify signature", 403, "bad_jwt")
+        # Shaped like supabase_auth's UserResponse
+        return SimpleNamespace(user=SimpleNamespace(id=user_id, aud="authenticated"))
+
+
+class FakeSupabase:
+    def __init__(self, latency: Union[float, Callable[[str, str], float]] = 0.0, jitter: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"Events": [], "Food": [], "profiles": [], "reservations": []}
+        self.calls: List[Any] = []
+        self.functions: Dict[str, Callable[..., Any]] = {}
+        self.columns: Dict[str, set] = {}
+        # (table, referenced table) -> foreign key column on `table`
+        self.foreign_keys: Dict[Any, str] = {("Food", "Events"): "event_id", ("reservations", "Food"): "food_id"}
+        self.storage = FakeStorage(self)
+        self.auth = FakeAuth(self)
+        self._next_id: Dict[str, int] = {}
+        # (table, column) -> {value key: rows in table order}, built on first use
+        self._indexes: Dict[Any, Dict[Any, List[Dict[str, Any]]]] = {}
+
+    def delay(self, target: str, operation: str) -> None:
+        """Sleep for one simulated round trip to `target` (a table, function, bucket or auth)."""
+        seconds = self.latency(target, operation) if callable(self.latency) else self.latency
+        if self.jitter:
+            seconds += self._rng.uniform(0, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> FakeRpc:
+        return FakeRpc(self, name, params or {})
+
+    def seed(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(r) for r in self._insert_locked(table, rows)]
+
+    def _index_locked(self, table: str, column: str) -> Dict[Any, List[Dict[str, Any]]]:
+        index = self._indexes.get((table, column))
+        if index is None:
+            index = self._indexes[(table, column)] = {}
+            for row in self.tables.get(table, []):
+                index.setdefault(_index_key(row.get(column)), []).append(row)
+        return index
+
+    def _drop_indexes_locked(self, table: str, columns: Optional[Dict[str, Any]] = None) -> None:
+        """Forget the indexes of `table` over `columns` (all of them when None)."""
+        for key in [k for k in self._indexes if k[0] == table and (columns is None or k[1] in columns)]:
+            del self._indexes[key]
+
+    def _project_locked(self, table: str, row: Dict[str, Any], columns: Optional[List[Any]]) -> Dict[str, Any]:
+        if columns is None:
+            return dict(row)
+        out: Dict[str, Any] = {}
+        for col in columns:
+            if isinstance(col, str):
+                out[col] = row.get(col)
+                continue
+            alias, target, nested = col
+            fk = self.foreign_keys[(table, target)]
+            parent = next((r for r in self.tables.get(target, []) if _same(r.get("id"), row.get(fk))), None)
+            out[alias] = None if parent is None else self._project_locked(target, parent, nested)
+        return out
+
+    def _insert_locked(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        if isinstance(rows, dict):
+            rows = [rows]
+        stored = self.tables.setdefault(table, [])
+        inserted = []
+        for r in rows:
+            row = dict(r)
+            if "id" not in row:
+                self._next_id[table] = self._next_id.get(table, 0) + 1
+                row["id"] = self._next_id[table]
+            stored.append(row)
+            inserted.append(row)
+            for (indexed_table, column), index in self._indexes.items():
+                if indexed_table == table:
+                    index.setdefault(_index_key(row.get(column)), []).append(row)
+        return inserted
+
+
+def _same(a: Any, b: Any) -> bool:
+    if a == b:
+        return True
+    return a is not None and b is not None and str(a) == str(b)
+
+
+def _index_key(value: Any) -> Any:
+    # eq() matches by value or by string form (see _same), so index on the string form
+    return None if value is None else str(value)
+
+
+def _coerce(value: Any, like: Any) -> Any:
+    """Cast a filter value (often a string from PostgREST syntax) to the column's type."""
+    if isinstance(like, bool) or like is None:
+        return value
+    if isinstance(like, (int, float)) and isinstance(value, str):
+        try:
+            return type(like)(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _compare(column: str, op: str, value: Any) -> Callable[[Dict[str, Any]], bool]:
+    def check(row: Dict[str, Any]) -> bool:
+        current = row.get(column)
+        if op == "is" and str(value).lower() == "null":
+            return current is None
+        if current is None:
+            return False
+        other = _coerce(value, current)
+        if op == "eq":
+            return _same(current, other)
+        if op == "neq":
+            return not _same(current, other)
+        if op == "gt":
+            return current > other
+        if op == "gte":
+            return current >= other
+        if op == "lt":
+            return current < other
+        if op == "lte":
+            return current <= other
+        raise ValueError(f"unsupported operator {op}")
+    return check
+
+
+def _split_top_level(expr: str) -> List[str]:
+    parts, depth, start, quoted = [], 0, 0, False
+    for i, ch in enumerate(expr):
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(expr[start:i])
+            start = i + 1
+    parts.append(expr[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_select(expr: str) -> Optional[List[Any]]:
+    """Parse a select list into column names and (alias, table, nested columns) embeds."""
+    if expr.strip() == "*":
+        return None
+    columns: List[Any] = []
+    for part in _split_top_level(expr):
+        if part.endswith(")") and "(" in part:
+            head, inner = part.split("(", 1)
+            alias, _, target = head.rpartition(":")
+            columns.append((alias or target, target, _parse_select(inner[:-1])))
+        else:
+            columns.append(part)
+    return columns
+
+
+def _parse_logic(kind: str, expr: str) -> Callable[[Dict[str, Any]], bool]:
+    """Parse PostgREST logic-tree syntax, e.g. `date.gt.X,and(date.eq.X,id.gt.5)`."""
+    checks = []
+    for part in _split_top_level(expr):
+        if part.startswith(("and(", "or(")) and part.endswith(")"):
+            inner_kind, inner = part.split("(", 1)
+            checks.append(_parse_logic(inner_kind, inner[:-1]))
+            continue
+        column, op, value = part.split(".", 2)
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        checks.append(_compare(column, op, value))
+    if kind == "and":
+        return lambda row: all(c(row) for c in checks)
+    return lambda row: any(c(row) for c in checks)
@@ -1,9 +1,16 @@
 import os
+import io
+import datetime
 import json
+import logging
+import tempfile
+import time
 import uuid
 import sys
 from pathlib import Path
+import httpx
 import pytest
+from PIL import Image
 from typing import Dict, Any, List
 
 # FastAPI TestClient
@@ -14,9 +21,18 @@ ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-# Import the FastAPI app and Supabase client from the backend
-# NOTE: This import reads .env.local and initializes Supabase at import time
-from server import app, supabase
+# The integration tests run against the in-memory stand-in unless SUPABASE_LIVE_TESTS=1,
+# in which case they use (and wipe the Events and Food tables of) the project in .env.local
+LIVE_SUPABASE = os.getenv("SUPABASE_LIVE_TESTS") == "1"
+if not LIVE_SUPABASE:
+    # Only checked when the app builds its own Supabase client; the stand-in replaces it
+    os.environ.setdefault("NEXT_PUBLIC_SUPABASE_URL", "http://localhost")
+    os.environ.setdefault("NEXT_PUBLIC_SUPABASE_KEY", "test")
+
+# Import the FastAPI app from the backend (this reads .env.local but connects to nothing)
+import server
+from server import app
+from fake_supabase import FakeSupabase
 
 
 @pytest.fixture(scope="session")
@@ -26,12 +42,24 @@ def client() -> TestClient:
 
 @pytest.fixture(scope="session")
 def supa():
+    """The database behind the integration tests: a session-wide stand-in, or the live project."""
+    if not LIVE_SUPABASE:
+        fake = FakeSupabase()
+        with pytest.MonkeyPatch.context() as mp:
+            repo = _install_fake(mp, fake)
+            yield fake
+            repo.close()
+        return
     # Ensure env variables exist for Supabase
     url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
     key = os.getenv("NEXT_PUBLIC_SUPABASE_KEY")
     if not url or not key:
         pytest.skip("Supabase env vars are not set; skipping integration tests")
-    return supabase
+    services = server.build_services()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(app.state, "services", services, raising=False)
+        yield services.repository.client
+    services.close()
 
 
 @pytest.fixture(scope="session")
@@ -180,6 +208,26 @@ def seed_data(supa) -> Dict[str, Any]:
     return ids
 
 
+TEST_JWT_SECRET = "test-jwt-secret-with-at-least-32-bytes"
+
+
+def _install_fake(monkeypatch: pytest.MonkeyPatch, fake: FakeSupabase) -> "server.SupabaseRepository":
+    """Serve the app from `fake`, with fresh indexes and caches."""
+    repo = server.SupabaseRepository(fake, max_concurrency=16)
+    services = server.Services(repo, token_verifier=server.TokenVerifier(secret=TEST_JWT_SECRET, jwks_url=None))
+    monkeypatch.setattr(app.state, "services", services, raising=False)
+    return repo
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Swap the server's repository for one backed by a fresh in-memory stand-in."""
+    fake = FakeSupabase()
+    repo = _install_fake(monkeypatch, fake)
+    yield fake
+    repo.close()
+
+
 def _get_json_data(resp_json: Any) -> Any:
     if isinstance(resp_json, dict) and "data" in resp_json:
         return resp_json["data"]
@@ -203,14 +251,14 @@ def test_root_lists_events(client: TestClient, seed_data):
     assert pizza_event.get("campus_location") == "West"
 
 
-def test_search_by_name(client: TestClient):
+def test_search_by_name(client: TestClient, seed_data):
     r = client.get("/search/name/pizza")
     assert r.status_code == 200
     data = _get_json_data(r.json())
     assert any("Pizza" in ev.get("name", "") for ev in data)
 
 
-def test_search_by_food(client: TestClient):
+def test_search_by_food(client: TestClient, seed_data):
     r = client.get("/search/food/Sushi")
     assert r.status_code == 200
     data = _get_json_data(r.json())
@@ -235,7 +283,7 @@ def test_get_food_by_event(client: TestClient, seed_data):
             assert "vegan" in food.get("dietaryTags", [])
 
 
-def test_post_event_without_image(client: TestClient):
+def test_post_event_without_image(client: TestClient, supa):
     form = {
         "name": "Workshop Event - No Image",
         "description": "A professional workshop with vegetarian options",
@@ -258,7 +306,7 @@ def test_post_event_without_image(client: TestClient):
     assert created.get("campus_location") == "Central"
 
 
-def test_post_event_with_image(client: TestClient):
+def test_post_event_with_image(client: TestClient, supa):
     """Test creating an event with an image upload"""
     import io
     
@@ -357,7 +405,7 @@ def test_cancel_reservation_numeric(client: TestClient, seed_data, supa):
     assert int(q_data[0]["quantity"]) >= 0
 
 
-def test_get_profile_reservations_empty(client: TestClient):
+def test_get_profile_reservations_empty(client: TestClient, supa):
     # No auth and a fake profile id should yield empty arrays
     r = client.get("/profiles/705ea4ae-7bbb-46ad-be36-a50a816d1f64/reservations")
     assert r.status_code == 200
@@ -391,7 +439,7 @@ def test_get_food_by_event_no_food(client: TestClient, supa, seed_data):
     assert r.json()["data"] == []
 
 
-def test_search_by_name_no_match(client: TestClient):
+def test_search_by_name_no_match(client: TestClient, supa):
     r = client.get("/search/name/zzzzzz-no-match")
     assert r.status_code == 200
     data = _get_json_data(r.json())
@@ -400,7 +448,7 @@ def test_search_by_name_no_match(client: TestClient):
     assert len(data) == 0 or all("zzzzzz-no-match" not in (ev.get("name") or "") for ev in data)
 
 
-def test_search_by_food_no_match(client: TestClient):
+def test_search_by_food_no_match(client: TestClient, supa):
     r = client.get("/search/food/zzzzzz-no-match")
     assert r.status_code == 200
     data = _get_json_data(r.json())
@@ -418,7 +466,7 @@ def test_reserve_more_than_available(client: TestClient, supa, seed_data):
     assert r.status_code == 400
 
 
-def test_reserve_unknown_food_id(client: TestClient):
+def test_reserve_unknown_food_id(client: TestClient, supa):
     # Reserve a non-existent food id
     payload = {"food_id": 999999, "quantity": 1}
     r = client.put("/reserve/", json=payload)
@@ -426,7 +474,7 @@ def test_reserve_unknown_food_id(client: TestClient):
     assert r.status_code == 404
 
 
-def test_cancel_unknown_food_id(client: TestClient):
+def test_cancel_unknown_food_id(client: TestClient, supa):
     # Cancel a non-existent food id: should still succeed and return food_update None
     r = client.post("/reserve/cancel", json={"food_id": 999999, "quantity": 1})
     assert r.status_code == 200
@@ -434,7 +482,7 @@ def test_cancel_unknown_food_id(client: TestClient):
     assert body.get("food_update") is None
 
 
-def test_post_event_invalid_food_json(client: TestClient):
+def test_post_event_invalid_food_json(client: TestClient, supa):
     # Pass invalid JSON string for food; server should swallow error and treat as []
     form = {
         "name": "Invalid Food JSON",
@@ -516,3 +564,1914 @@ def test_diverse_dietary_requirements(client: TestClient, seed_data):
     assert "Sushi Social - East Campus" in event_names
     assert "Gluten-Free Bake Sale - Central" in event_names
     assert "Nut-Free Lunch Special - South Campus" in event_names
+
+
+# --------------------
+# Data Access Layer Tests (in-memory stand-in)
+# --------------------
+
+def _seed_fake(fake: FakeSupabase) -> Dict[str, Any]:
+    events = fake.seed("Events", [
+        {"name": "Pizza Party - West Campus", "campus_location": "West", "food": ["Cheese Pizza"], "date": "2025-12-31"},
+        {"name": "Sushi Social - East Campus", "campus_location": "East", "food": ["Sushi"], "date": "2025-12-30"},
+    ])
+    foods = fake.seed("Food", [
+        {"name": "Cheese Pizza", "event_id": events[0]["id"], "quantity": 10, "stockLevel": "medium", "dietaryTags": ["vegetarian"]},
+        {"name": "Sushi", "event_id": events[1]["id"], "quantity": None, "stockLevel": "high", "dietaryTags": []},
+    ])
+    fake.seed("profiles", [{"id": "profile-1"}])
+    return {"events": events, "foods": foods}
+
+
+def test_repository_serves_routes(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+
+    r = client.get("/")
+    assert r.status_code == 200
+    assert {e["name"] for e in r.json()["data"]} == {"Pizza Party - West Campus", "Sushi Social - East Campus"}
+
+    r = client.put("/reserve/", json={"food_id": pizza_id, "quantity": 3, "profile_id": "profile-1"})
+    assert r.status_code == 200
+    assert fake_db.tables["Food"][0]["quantity"] == 7
+    assert [(r["profile_id"], r["food_id"], r["quantity"]) for r in fake_db.tables["reservations"]] == [("profile-1", pizza_id, 3)]
+
+    r = client.get("/profiles/profile-1/reservations")
+    assert r.json()["food_rows"][0]["name"] == "Cheese Pizza"
+
+    r = client.post("/reserve/cancel", json={"food_id": pizza_id, "quantity": 3, "profile_id": "profile-1"})
+    assert r.status_code == 200
+    assert fake_db.tables["Food"][0]["quantity"] == 10
+    assert fake_db.tables["reservations"] == []
+
+    r = client.get("/stats")
+    assert r.json()["data"]["total_events"] == 2
+
+
+def _throughput(concurrency: int, total_requests: int) -> float:
+    """Drive GET / with `concurrency` concurrent clients and return requests per second."""
+    import asyncio
+    import time
+    import httpx
+
+    async def run() -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            queue: "asyncio.Queue[int]" = asyncio.Queue()
+            for i in range(total_requests):
+                queue.put_nowait(i)
+
+            async def worker():
+                while not queue.empty():
+                    # A distinct URL each, so concurrent requests are not coalesced into one read
+                    r = await ac.get("/", params={"n": queue.get_nowait()})
+                    assert r.status_code == 200
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return total_requests / (time.perf_counter() - start)
+
+    return asyncio.run(run())
+
+
+def test_load_throughput_scales_with_concurrent_clients(fake_db, monkeypatch):
+    """With 20ms of simulated PostgREST latency, concurrent clients must not serialize on the event loop."""
+    # Keep nothing in the response cache so every request reaches the repository
+    monkeypatch.setattr(app.state.services, "response_cache", server.InMemoryResponseCache(max_entries=0))
+    _seed_fake(fake_db)
+    fake_db.latency = 0.02
+
+    serial = _throughput(concurrency=1, total_requests=16)
+    concurrent = _throughput(concurrency=16, total_requests=64)
+    assert concurrent > serial * 4, f"serial={serial:.1f} rps, concurrent={concurrent:.1f} rps"
+
+
+def test_repository_concurrency_limit_caps_in_flight_calls(monkeypatch):
+    fake = FakeSupabase(latency=0.02)
+    _seed_fake(fake)
+    repo = server.SupabaseRepository(fake, max_concurrency=2)
+    services = server.Services(repo, response_cache=server.InMemoryResponseCache(max_entries=0))
+    monkeypatch.setattr(app.state, "services", services, raising=False)
+    try:
+        limited = _throughput(concurrency=16, total_requests=32)
+    finally:
+        repo.close()
+    # Two worker threads at 20ms per call cannot exceed ~100 requests per second.
+    assert limited < 2 / 0.02 * 1.2
+
+
+def test_fake_matches_postgrest_semantics():
+    from postgrest.exceptions import APIError
+
+    fake = FakeSupabase()
+    fake.seed("Food", [{"name": f"Item {i}", "event_id": i % 3, "quantity": i} for i in range(9)])
+    # The exact count covers every match, not just the returned page
+    page = fake.table("Food").select("id", count="exact").eq("event_id", 1).limit(2).execute()
+    assert len(page.data) == 2 and page.count == 3
+    with pytest.raises(APIError) as exc:
+        fake.table("Food").select("*").eq("event_id", 1).single().execute()
+    assert exc.value.code == "PGRST116"
+    # Equality lookups stay correct as rows move between values
+    fake.table("Food").update({"event_id": 2}).eq("id", 2).execute()
+    fake.table("Food").insert({"name": "New", "event_id": 2}).execute()
+    assert [r["name"] for r in fake.table("Food").select("name").eq("event_id", 2).execute().data] == [
+        "Item 1", "Item 2", "Item 5", "Item 8", "New"]
+
+
+def test_fake_injects_latency_per_round_trip(monkeypatch):
+    slept = []
+    monkeypatch.setattr("fake_supabase.time.sleep", slept.append)
+    fake = FakeSupabase(latency=lambda target, op: 0.05 if op == "rpc" else 0.01, jitter=0.002, seed=1)
+    fake.table("Events").select("*").execute()
+    fake.functions["noop"] = lambda db: None
+    fake.rpc("noop").execute()
+    fake.storage.from_("event images").upload("a.png", b"png")
+    assert len(slept) == 3
+    assert 0.01 <= slept[0] <= 0.012 and 0.05 <= slept[1] <= 0.052 and 0.01 <= slept[2] <= 0.012
+
+
+# --------------------
+# Reservation Engine Tests
+# --------------------
+
+def test_reserve_uses_single_rpc_round_trip(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+    received = {}
+
+    def reserve_food(db, p_food_id, p_quantity, p_profile_id=None):
+        received.update(food_id=p_food_id, quantity=p_quantity, profile_id=p_profile_id)
+        return {"status": "ok", "food_id": p_food_id, "quantity": 7, "stockLevel": "low", "profile_updated": True}
+
+    fake_db.functions["reserve_food"] = reserve_food
+    fake_db.calls.clear()
+
+    r = client.put("/reserve/", json={"food_id": pizza_id, "quantity": 3, "profile_id": "profile-1"})
+    assert r.status_code == 200
+    assert r.json()["food_update"] == {"id": pizza_id, "quantity": 7, "stockLevel": "low"}
+    assert received == {"food_id": pizza_id, "quantity": 3, "profile_id": "profile-1"}
+    assert fake_db.calls == [("reserve_food", "rpc")]
+
+
+def test_reserve_rpc_oversell_returns_400_without_read(client: TestClient, fake_db):
+    fake_db.functions["reserve_food"] = lambda db, **params: {"status": "oversold", "available": 2}
+    r = client.put("/reserve/", json={"food_id": 1, "quantity": 5})
+    assert r.status_code == 400
+    assert all(op == "rpc" for _, op in fake_db.calls)
+
+
+def test_reserve_fallback_statuses(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    cookies = fake_db.seed("Food", [{"name": "GF Cookies", "event_id": 1, "quantity": None, "stockLevel": "medium"}])[0]
+
+    # medium derives 30 then subtract 2 => 28
+    r = client.put("/reserve/", json={"food_id": cookies["id"], "quantity": 2})
+    assert r.status_code == 200
+    assert r.json()["food_update"] == {"id": cookies["id"], "quantity": 28, "stockLevel": "medium"}
+
+    r = client.put("/reserve/", json={"food_id": seeded["foods"][1]["id"], "quantity": 1})
+    assert r.json() == {"status": "ok", "unlimited": True}
+
+    assert client.put("/reserve/", json={"food_id": seeded["foods"][0]["id"], "quantity": 11}).status_code == 400
+    assert client.put("/reserve/", json={"food_id": 999999, "quantity": 1}).status_code == 404
+
+
+def test_concurrent_reservations_never_oversell(fake_db):
+    """Hammer one food id from many concurrent clients; exactly the available stock is handed out."""
+    import asyncio
+    import httpx
+
+    food = fake_db.seed("Food", [{"name": "Last Pizza", "event_id": 1, "quantity": 10, "stockLevel": "medium"}])[0]
+    fake_db.latency = 0.001
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(
+                ac.put("/reserve/", json={"food_id": food["id"], "quantity": 1}) for _ in range(40)
+            ))
+
+    responses = asyncio.run(run())
+    codes = [r.status_code for r in responses]
+    assert codes.count(200) == 10
+    assert codes.count(400) == 30
+    assert fake_db.tables["Food"][0]["quantity"] == 0
+    assert fake_db.tables["Food"][0]["stockLevel"] == "low"
+
+
+def test_batch_reserve_all_items_together(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza, sushi = seeded["foods"]
+    salad = fake_db.seed("Food", [{"name": "Salad", "event_id": seeded["events"][1]["id"], "quantity": None, "stockLevel": "low"}])[0]
+    items = [
+        {"food_id": pizza["id"], "quantity": 2},
+        {"food_id": sushi["id"], "quantity": 1},
+        {"food_id": salad["id"], "quantity": 3},
+        {"food_id": pizza["id"], "quantity": 1},
+    ]
+    r = client.post("/reserve/batch", json={"items": items, "profile_id": "profile-1"})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [(x["food_id"], x["status"], x["quantity"]) for x in results] == [
+        (pizza["id"], "ok", 7), (sushi["id"], "unlimited", None), (salad["id"], "ok", 4),
+    ]
+    assert all(x["reservation_id"] for x in results)
+    assert [(row["food_id"], row["quantity"]) for row in fake_db.tables["reservations"]] == [
+        (pizza["id"], 3), (sushi["id"], 1), (salad["id"], 3),
+    ]
+    # The profile is written once, not per item
+    assert fake_db.calls.count(("reservations", "insert")) == 1
+
+
+def test_batch_reserve_is_all_or_nothing(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza, sushi = seeded["foods"]
+    before = [dict(row) for row in fake_db.tables["Food"]]
+
+    items = [{"food_id": sushi["id"], "quantity": 1}, {"food_id": pizza["id"], "quantity": 11}]
+    r = client.post("/reserve/batch", json={"items": items, "profile_id": "profile-1"})
+    assert r.status_code == 400
+    assert [(x["food_id"], x["status"]) for x in r.json()["detail"]["results"]] == [
+        (sushi["id"], "skipped"), (pizza["id"], "oversold"),
+    ]
+    assert fake_db.tables["Food"] == before
+    assert fake_db.tables["reservations"] == []
+
+    items = [{"food_id": pizza["id"], "quantity": 1}, {"food_id": 999999, "quantity": 1}]
+    assert client.post("/reserve/batch", json={"items": items}).status_code == 404
+    assert fake_db.tables["Food"] == before
+    assert client.post("/reserve/batch", json={"items": []}).status_code == 422
+
+
+def test_batch_reserve_uses_single_rpc_round_trip(client: TestClient, fake_db):
+    received = {}
+
+    def reserve_food_batch(db, p_items, p_profile_id):
+        received.update(items=p_items, profile_id=p_profile_id)
+        return {"status": "ok", "profile_updated": True, "results": [
+            {"food_id": 1, "status": "ok", "event_id": 1, "quantity": 4, "stockLevel": "low", "reservation_id": 9},
+        ]}
+
+    fake_db.functions["reserve_food_batch"] = reserve_food_batch
+    items = [{"food_id": 1, "quantity": 2}, {"food_id": 1, "quantity": 1}]
+    r = client.post("/reserve/batch", json={"items": items, "profile_id": "profile-1"})
+    assert r.json()["results"] == [{"food_id": 1, "status": "ok", "quantity": 4, "stockLevel": "low", "reservation_id": 9}]
+    assert received == {"items": [{"food_id": 1, "quantity": 3}], "profile_id": "profile-1"}
+    assert fake_db.calls == [("reserve_food_batch", "rpc")]
+
+
+def test_batch_reserve_latency_does_not_grow_with_items(client: TestClient, fake_db, monkeypatch):
+    import time
+    monkeypatch.setattr(app.state.services, "response_cache", server.InMemoryResponseCache(max_entries=0))
+    foods = fake_db.seed("Food", [{"name": f"Item {i}", "event_id": 1, "quantity": 100, "stockLevel": "high"} for i in range(8)])
+    fake_db.latency = 0.02
+    client.post("/reserve/batch", json={"items": [{"food_id": foods[0]["id"], "quantity": 1}]})
+
+    def elapsed(n):
+        start = time.perf_counter()
+        r = client.post("/reserve/batch", json={"items": [{"food_id": f["id"], "quantity": 1} for f in foods[:n]]})
+        assert r.status_code == 200
+        return time.perf_counter() - start
+
+    assert elapsed(8) < 2 * elapsed(1)
+
+
+def test_concurrent_batches_never_oversell(fake_db):
+    """Overlapping batches race for scarce stock; each one lands completely or not at all."""
+    import asyncio
+    import httpx
+
+    fake_db.seed("profiles", [{"id": "profile-1"}])
+    pizza, soda = fake_db.seed("Food", [
+        {"name": "Pizza", "event_id": 1, "quantity": 10, "stockLevel": "medium"},
+        {"name": "Soda", "event_id": 1, "quantity": 5, "stockLevel": "low"},
+    ])
+    fake_db.latency = 0.001
+    body = {"items": [{"food_id": pizza["id"], "quantity": 1}, {"food_id": soda["id"], "quantity": 1}], "profile_id": "profile-1"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(ac.post("/reserve/batch", json=body) for _ in range(15)))
+
+    responses = asyncio.run(run())
+    succeeded = sum(1 for r in responses if r.status_code == 200)
+    assert 1 <= succeeded <= 5
+    assert fake_db.tables["Food"][0]["quantity"] == 10 - succeeded
+    assert fake_db.tables["Food"][1]["quantity"] == 5 - succeeded
+    assert len(fake_db.tables["reservations"]) == 2 * succeeded
+
+# --------------------
+# Profile Reservation Tests
+# --------------------
+
+def test_profile_reservations_single_embedded_query(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza, sushi = seeded["foods"]
+    for food_id, quantity in ((sushi["id"], 1), (pizza["id"], 2), (pizza["id"], 3)):
+        client.put("/reserve/", json={"food_id": food_id, "quantity": quantity, "profile_id": "profile-1"})
+
+    fake_db.calls.clear()
+    body = client.get("/profiles/profile-1/reservations").json()
+
+    assert fake_db.calls == [("reservations", "select")]
+    assert body["reserved_items"] == [sushi["id"], pizza["id"]]
+    assert [(r["food_id"], r["quantity"]) for r in body["reservations"]] == [(sushi["id"], 1), (pizza["id"], 2), (pizza["id"], 3)]
+    assert [(row["name"], row["reserved_quantity"]) for row in body["food_rows"]] == [("Sushi", 1), ("Cheese Pizza", 5)]
+    pizza_row = body["food_rows"][1]
+    assert set(pizza_row) == set(server.RESERVED_FOOD_FIELDS) | {"event", "reserved_quantity"}
+    assert set(pizza_row["event"]) == set(server.RESERVED_EVENT_FIELDS)
+    assert pizza_row["event"]["name"] == "Pizza Party - West Campus"
+
+    assert client.get("/profiles/missing/reservations").json() == {"reserved_items": [], "reservations": [], "food_rows": []}
+
+
+def test_cancel_restores_recorded_quantity_and_is_idempotent(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+    first = client.put("/reserve/", json={"food_id": pizza_id, "quantity": 2, "profile_id": "profile-1"}).json()
+    client.put("/reserve/", json={"food_id": pizza_id, "quantity": 3, "profile_id": "profile-1"})
+    assert fake_db.tables["Food"][0]["quantity"] == 5
+
+    # Cancel a single reservation by id; the caller's quantity is ignored
+    reservation_id = first["profile_update"]["reservation_id"]
+    body = {"reservation_id": reservation_id, "quantity": 99, "profile_id": "profile-1"}
+    r = client.post("/reserve/cancel", json=body)
+    assert r.json()["cancelled"] == [reservation_id]
+    assert r.json()["food_update"] == {"id": pizza_id, "quantity": 7, "stockLevel": "low", "restored": 2}
+
+    # Retrying it changes nothing
+    r = client.post("/reserve/cancel", json=body)
+    assert r.status_code == 200
+    assert r.json()["cancelled"] == [] and r.json()["food_update"] is None
+    assert fake_db.tables["Food"][0]["quantity"] == 7
+
+    # By food id, everything the profile still holds comes back
+    r = client.post("/reserve/cancel", json={"food_id": pizza_id, "profile_id": "profile-1"})
+    assert r.json()["food_update"]["restored"] == 3
+    assert fake_db.tables["Food"][0]["quantity"] == 10
+    assert fake_db.tables["reservations"] == []
+
+    assert client.post("/reserve/cancel", json={"profile_id": "profile-1"}).status_code == 400
+
+
+def test_cancel_only_touches_the_callers_reservations(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+    reserved = client.put("/reserve/", json={"food_id": pizza_id, "quantity": 2, "profile_id": "profile-1"}).json()
+
+    r = client.post("/reserve/cancel", json={"reservation_id": reserved["profile_update"]["reservation_id"], "profile_id": "profile-2"})
+    assert r.json()["cancelled"] == []
+    assert client.post("/reserve/cancel", json={"food_id": pizza_id}).json()["food_update"] is None
+    assert fake_db.tables["Food"][0]["quantity"] == 8
+    assert len(fake_db.tables["reservations"]) == 1
+
+
+def test_unlimited_reservations_are_recorded(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    sushi_id = seeded["foods"][1]["id"]
+    r = client.put("/reserve/", json={"food_id": sushi_id, "quantity": 4, "profile_id": "profile-1"})
+    assert r.json()["unlimited"] is True and r.json()["profile_update"]["updated"] is True
+
+    r = client.post("/reserve/cancel", json={"food_id": sushi_id, "profile_id": "profile-1"})
+    assert r.json()["food_update"] == {"status": "unlimited"}
+    assert fake_db.tables["reservations"] == []
+
+
+def test_cancel_uses_single_rpc_round_trip(client: TestClient, fake_db):
+    received = {}
+
+    def cancel_reservation(db, p_profile_id, p_reservation_id, p_food_id):
+        received.update(profile_id=p_profile_id, reservation_id=p_reservation_id, food_id=p_food_id)
+        return {"status": "ok", "cancelled": [5], "food_id": 1, "event_id": 1, "restored": 2, "quantity": 9, "stockLevel": "medium"}
+
+    fake_db.functions["cancel_reservation"] = cancel_reservation
+    r = client.post("/reserve/cancel", json={"reservation_id": 5, "profile_id": "profile-1"})
+    assert r.json()["food_update"] == {"id": 1, "quantity": 9, "stockLevel": "medium", "restored": 2}
+    assert received == {"profile_id": "profile-1", "reservation_id": 5, "food_id": None}
+    assert fake_db.calls == [("cancel_reservation", "rpc")]
+
+
+def test_concurrent_cancels_restore_once(fake_db):
+    """Many retries of the same cancel race; the stock comes back exactly once."""
+    import asyncio
+    import httpx
+
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+    fake_db.seed("reservations", [{"profile_id": "profile-1", "food_id": pizza_id, "quantity": 4}])
+    fake_db.latency = 0.001
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            body = {"food_id": pizza_id, "profile_id": "profile-1"}
+            return await asyncio.gather(*(ac.post("/reserve/cancel", json=body) for _ in range(20)))
+
+    responses = asyncio.run(run())
+    assert all(r.status_code == 200 for r in responses)
+    assert sum(1 for r in responses if r.json()["cancelled"]) == 1
+    assert fake_db.tables["Food"][0]["quantity"] == 14
+
+
+def test_cancel_puts_reservations_back_when_stock_cannot_be_restored(client: TestClient, fake_db, monkeypatch):
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+    reservation = fake_db.seed("reservations", [{"profile_id": "profile-1", "food_id": pizza_id, "quantity": 4}])[0]
+    repo = app.state.services.repository
+    apply_stock_delta = repo._apply_stock_delta
+    monkeypatch.setattr(repo, "_apply_stock_delta", lambda food_id, delta: {"status": "conflict", "food_id": food_id})
+
+    body = {"reservation_id": reservation["id"], "profile_id": "profile-1"}
+    assert client.post("/reserve/cancel", json=body).status_code == 409
+    assert fake_db.tables["reservations"] == [reservation]
+
+    monkeypatch.setattr(repo, "_apply_stock_delta", apply_stock_delta)
+    r = client.post("/reserve/cancel", json=body)
+    assert r.status_code == 200
+    assert r.json()["food_update"]["restored"] == 4
+    assert fake_db.tables["Food"][0]["quantity"] == 14
+
+
+# --------------------
+# Pagination Tests
+# --------------------
+
+def test_root_keyset_pagination_walks_every_event_once(client: TestClient, fake_db):
+    # Several events share a date so the id tiebreak is exercised
+    fake_db.seed("Events", [
+        {"name": f"Event {i}", "date": f"2025-12-{10 + i // 3:02d}", "food": []} for i in range(10)
+    ])
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 4, "fields": "name"}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/", params=params).json()
+        assert len(body["data"]) <= 4
+        seen.extend(ev["name"] for ev in body["data"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [f"Event {i}" for i in range(10)]
+
+
+def test_root_pagination_includes_undated_events_last(client: TestClient, fake_db):
+    fake_db.seed("Events", [{"name": "Undated A", "date": None}, {"name": "Dated", "date": "2025-12-10"}, {"name": "Undated B"}])
+    seen, cursor = [], None
+    while True:
+        body = client.get("/", params={"limit": 1, **({"cursor": cursor} if cursor else {})}).json()
+        seen.extend(ev["name"] for ev in body["data"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["Dated", "Undated A", "Undated B"]
+
+
+def test_root_projection_and_upcoming_filter(client: TestClient, fake_db):
+    fake_db.seed("Events", [
+        {"name": "Past", "date": "2000-01-01", "description": "long text"},
+        {"name": "Future", "date": "2999-01-01", "description": "long text"},
+    ])
+    r = client.get("/", params={"upcoming": "true", "fields": "id,name"})
+    assert r.status_code == 200
+    assert r.json()["data"] == [{"id": 2, "name": "Future"}]
+    assert r.json()["next_cursor"] is None
+
+
+def test_root_pagination_rejects_bad_input(client: TestClient, fake_db):
+    assert client.get("/", params={"fields": "password"}).status_code == 400
+    assert client.get("/", params={"limit": 5, "cursor": "not-a-cursor"}).status_code == 400
+    # A cursor whose date would smuggle extra filters into the PostgREST query
+    crafted = server._encode_cursor('2025-01-01",id.gt.0),name.eq.("x', 1)
+    assert client.get("/", params={"limit": 5, "cursor": crafted}).status_code == 400
+    assert client.get("/", params={"limit": 5, "cursor": server._encode_cursor("2025-01-01", "1)")}).status_code == 400
+    assert client.get("/", params={"limit": 0}).status_code == 422
+
+
+def test_search_endpoints_paginate(client: TestClient, fake_db):
+    events = fake_db.seed("Events", [
+        {"name": f"Pizza Night {i}", "date": f"2025-12-{10 + i:02d}", "food": ["Pizza"]} for i in range(3)
+    ])
+    fake_db.seed("Food", [{"name": "Pizza", "event_id": e["id"], "dietaryTags": ["vegetarian"]} for e in events])
+
+    for path in ("/search/food/Pizza", "/search/name/pizza", "/search/dietary?tags=vegetarian"):
+        body = client.get(path, params={"limit": 2}).json()
+        assert [e["name"] for e in body["data"]] == ["Pizza Night 0", "Pizza Night 1"], path
+        rest = client.get(path, params={"limit": 2, "cursor": body["next_cursor"]}).json()
+        assert [e["name"] for e in rest["data"]] == ["Pizza Night 2"], path
+        assert rest["next_cursor"] is None
+
+
+# --------------------
+# Dietary Tag Index Tests
+# --------------------
+
+def test_dietary_search_any_and_all(client: TestClient, fake_db):
+    events = fake_db.seed("Events", [{"name": n, "date": "2025-12-01"} for n in ("Vegan Lunch", "Veggie Pizza", "Sushi")])
+    fake_db.seed("Food", [
+        {"name": "Tofu Bowl", "event_id": events[0]["id"], "dietaryTags": ["Vegan", "Gluten-Free"]},
+        {"name": "Veggie Pizza", "event_id": events[1]["id"], "dietaryTags": "vegetarian, vegan"},
+        {"name": "Sushi", "event_id": events[2]["id"], "dietaryTags": []},
+    ])
+
+    names = lambda r: sorted(e["name"] for e in r.json()["data"])
+    assert names(client.get("/search/dietary", params={"tags": "vegan"})) == ["Vegan Lunch", "Veggie Pizza"]
+    assert names(client.get("/search/dietary", params={"tags": "gluten-free,vegetarian"})) == ["Vegan Lunch", "Veggie Pizza"]
+    assert names(client.get("/search/dietary", params={"tags": "vegan,gluten-free", "mode": "all"})) == ["Vegan Lunch"]
+    assert names(client.get("/search/dietary", params={"tags": "halal"})) == []
+    assert client.get("/search/dietary", params={"tags": "vegan", "mode": "xor"}).status_code == 422
+
+
+def test_dietary_index_is_cached_and_updated_on_food_insert(client: TestClient, fake_db):
+    event = fake_db.seed("Events", [{"name": "Bake Sale", "date": "2025-12-01"}])[0]
+    assert client.get("/search/dietary", params={"tags": "nut-free"}).json()["data"] == []
+
+    fake_db.calls.clear()
+    client.get("/search/dietary", params={"tags": "nut-free"})
+    assert ("Food", "select") not in fake_db.calls
+
+    r = client.post("/food/", json=[{"name": "Cookies", "event_id": event["id"], "dietaryTags": ["nut-free"]}])
+    assert r.status_code == 200
+    assert [e["name"] for e in client.get("/search/dietary", params={"tags": "nut-free"}).json()["data"]] == ["Bake Sale"]
+
+
+def test_failed_index_rebuild_backs_off(fake_db):
+    import asyncio
+    event = fake_db.seed("Events", [{"name": "Bake Sale", "date": "2025-12-01"}])[0]
+    fake_db.seed("Food", [{"name": "Cookies", "event_id": event["id"], "dietaryTags": ["nut-free"]}])
+    index = server.DietaryTagIndex(ttl=60)
+
+    class Repo:
+        reads = 0
+        down = False
+
+        async def list_food_tags(self):
+            Repo.reads += 1
+            if Repo.down:
+                raise RuntimeError("db down")
+            return fake_db.tables["Food"]
+
+    async def run():
+        repo = Repo()
+        await index.ensure_fresh(repo)
+        Repo.down = True
+        index._built_at -= 120
+        for _ in range(5):
+            await index.ensure_fresh(repo)
+            await asyncio.gather(index._rebuild_task, return_exceptions=True)
+        # One failed attempt, then the last build keeps answering until the retry delay passes
+        assert Repo.reads == 2
+        assert index.match(["nut-free"]) == {event["id"]}
+
+        Repo.down = False
+        index._retry_at = 0.0
+        await index.ensure_fresh(repo)
+        await index._rebuild_task
+        assert Repo.reads == 3 and index.is_fresh()
+
+        # Never built: callers get the failure instead of an empty index, without a read each
+        fresh = server.DietaryTagIndex(ttl=60)
+        Repo.down = True
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await fresh.ensure_fresh(repo)
+        assert Repo.reads == 4
+
+    asyncio.run(run())
+
+
+def test_dietary_search_pages_ids_in_chunks(client: TestClient, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "EVENT_IDS_PER_QUERY", 2)
+    dates = ["2025-12-05", None, "2025-12-01", "2025-12-03", "2025-12-01"]
+    events = fake_db.seed("Events", [{"name": f"Vegan {i}", "date": d} for i, d in enumerate(dates)])
+    fake_db.seed("Food", [{"name": "Tofu", "event_id": e["id"], "dietaryTags": ["vegan"]} for e in events])
+
+    seen, cursor = [], None
+    while True:
+        params = {"tags": "vegan", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/search/dietary", params=params).json()
+        seen += [e["name"] for e in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["Vegan 2", "Vegan 4", "Vegan 3", "Vegan 0", "Vegan 1"]
+
+
+def test_stale_dietary_index_answers_while_rebuilding(fake_db):
+    import asyncio
+    event = fake_db.seed("Events", [{"name": "Bake Sale", "date": "2025-12-01"}])[0]
+    fake_db.seed("Food", [{"name": "Cookies", "event_id": event["id"], "dietaryTags": ["nut-free"]}])
+    repo = server.SupabaseRepository(fake_db)
+    index = server.DietaryTagIndex(ttl=60)
+
+    async def run():
+        await index.ensure_fresh(repo)
+        fake_db.seed("Food", [{"name": "Brownies", "event_id": 1000, "dietaryTags": ["nut-free"]}])
+        index._built_at -= 120
+
+        # Stale: answered from the old build while the new one runs in the background
+        await index.ensure_fresh(repo)
+        assert index.match(["nut-free"]) == {event["id"]}
+        rebuild = index._rebuild_task
+        assert not rebuild.done()
+        # Added while the rebuild reads the Food table: must survive the swap
+        index.add_food_rows([{"event_id": 2000, "dietaryTags": ["halal"]}])
+        await rebuild
+        assert index.match(["nut-free"]) == {event["id"], 1000}
+        assert index.match(["halal"]) == {2000}
+
+    asyncio.run(run())
+    repo.close()
+
+
+# --------------------
+# Full-Text Search Tests
+# --------------------
+
+def _seed_search(fake: FakeSupabase) -> list:
+    events = fake.seed("Events", [
+        {"name": "Pizza Night", "description": "Slices after the lecture", "organization": "CS Club", "location": "CDS 950", "food": ["Cheese Pizza"], "date": "2025-12-01"},
+        {"name": "Study Break", "description": "Free pizza and snacks for finals week", "organization": "Library", "location": "Mugar", "food": [], "date": "2025-12-02"},
+        {"name": "Sushi Social", "description": "Meet the Japanese club", "organization": "JSA", "location": "GSU", "food": ["Sushi"], "date": "2025-12-03"},
+    ])
+    fake.seed("Food", [
+        {"name": "Veggie Pizza", "description": "Peppers and mushrooms", "event_id": events[1]["id"]},
+        {"name": "California Rolls", "description": "Avocado and crab", "event_id": events[2]["id"]},
+    ])
+    return events
+
+
+def test_search_ranks_by_relevance(client: TestClient, fake_db):
+    _seed_search(fake_db)
+    r = client.get("/search", params={"q": "pizza"})
+    assert r.status_code == 200
+    body = r.json()
+    # The name match outranks a description/food match
+    assert [e["name"] for e in body["data"]] == ["Pizza Night", "Study Break"]
+    assert body["data"][0]["score"] > body["data"][1]["score"]
+    assert body["total"] == 2 and body["next_offset"] is None
+
+
+def test_search_matches_prefixes_typos_and_food_rows(client: TestClient, fake_db):
+    _seed_search(fake_db)
+    names = lambda q: [e["name"] for e in client.get("/search", params={"q": q}).json()["data"]]
+    assert names("piz") == ["Pizza Night", "Study Break"]
+    assert names("sushii") == ["Sushi Social"]
+    assert names("japanees") == ["Sushi Social"]
+    # Food table names and descriptions are searchable too
+    assert names("avocado") == ["Sushi Social"]
+    assert names("mushrooms") == ["Study Break"]
+    assert names("the of and") == []
+    assert client.get("/search", params={"q": ""}).status_code == 422
+
+
+def test_search_pages_with_offset(client: TestClient, fake_db):
+    fake_db.seed("Events", [{"name": f"Bagel Brunch {i}", "date": "2025-12-01"} for i in range(5)])
+    first = client.get("/search", params={"q": "bagel", "limit": 2}).json()
+    assert first["total"] == 5 and first["next_offset"] == 2
+    seen = [e["id"] for e in first["data"]]
+    offset = first["next_offset"]
+    while offset is not None:
+        page = client.get("/search", params={"q": "bagel", "limit": 2, "offset": offset}).json()
+        seen += [e["id"] for e in page["data"]]
+        offset = page["next_offset"]
+    assert len(seen) == len(set(seen)) == 5
+
+
+def test_search_index_is_cached_and_updated_on_insert(client: TestClient, fake_db):
+    event = _seed_search(fake_db)[0]
+    assert client.get("/search", params={"q": "tacos"}).json()["data"] == []
+
+    fake_db.calls.clear()
+    client.get("/search", params={"q": "tacos"})
+    assert ("Events", "select") not in fake_db.calls
+
+    r = client.post("/food/", json=[{"name": "Fish Tacos", "event_id": event["id"]}])
+    assert r.status_code == 200
+    assert [e["name"] for e in client.get("/search", params={"q": "tacos"}).json()["data"]] == ["Pizza Night"]
+
+    r = client.post("/event/", data={**EVENT_FORM, "name": "Taco Tuesday"})
+    assert r.status_code == 200
+    assert [e["name"] for e in client.get("/search", params={"q": "taco"}).json()["data"]][0] == "Taco Tuesday"
+    assert ("Events", "select") not in fake_db.calls
+
+
+def test_stale_search_index_answers_while_rebuilding(fake_db):
+    import asyncio
+    _seed_search(fake_db)
+    repo = server.SupabaseRepository(fake_db)
+    index = server.EventSearchIndex(ttl=60)
+
+    async def run():
+        await index.ensure_fresh(repo)
+        fake_db.seed("Events", [{"name": "Ramen Night", "date": "2025-12-04"}])
+        index._built_at -= 120
+
+        # Stale: answered from the old build while the new one runs in the background
+        await index.ensure_fresh(repo)
+        assert index.search("ramen") == ([], 0)
+        rebuild = index._rebuild_task
+        assert not rebuild.done()
+        index.add_food_rows([{"id": 99, "name": "Tonkotsu", "event_id": fake_db.tables["Events"][0]["id"]}])
+        await rebuild
+        assert [row["name"] for row, _ in index.search("ramen")[0]] == ["Ramen Night"]
+        assert [row["name"] for row, _ in index.search("tonkotsu")[0]] == ["Pizza Night"]
+
+    asyncio.run(run())
+    repo.close()
+
+
+# --------------------
+# Happening Now Tests
+# --------------------
+
+GSU = (42.3509, -71.1089)
+
+
+def _seed_now(fake: FakeSupabase) -> list:
+    return fake.seed("Events", [
+        {"name": "Lunch Now", "campus_location": "West", "date": "2025-12-01", "start_time": "12:00", "end_time": "13:00", "latitude": GSU[0], "longitude": GSU[1]},
+        {"name": "Starts Soon", "campus_location": "East", "date": "2025-12-01", "start_time": "12:45", "end_time": "14:00", "latitude": 42.3496, "longitude": -71.0997},
+        {"name": "Far Lunch", "campus_location": "West", "date": "2025-12-01", "start_time": "12:00", "end_time": "13:00", "latitude": 42.3770, "longitude": -71.1167},
+        {"name": "Later Today", "campus_location": "West", "date": "2025-12-01", "start_time": "18:00", "end_time": "20:00"},
+        {"name": "Ended", "campus_location": "West", "date": "2025-12-01", "start_time": "09:00", "end_time": "11:00"},
+        {"name": "After Midnight", "campus_location": "East", "date": "2025-12-02", "start_time": "00:30", "end_time": "02:00"},
+    ])
+
+
+def _freeze_now(monkeypatch, hour: int, minute: int) -> None:
+    now = datetime.datetime(2025, 12, 1, hour, minute, tzinfo=server.EVENT_TIMEZONE)
+    monkeypatch.setattr(server, "_local_now", lambda: now)
+
+
+def test_events_now_filters_by_time_window_and_campus(client: TestClient, fake_db, monkeypatch):
+    _seed_now(fake_db)
+    _freeze_now(monkeypatch, 12, 30)
+    names = lambda **params: [e["name"] for e in client.get("/events/now", params=params).json()["data"]]
+
+    assert names() == ["Lunch Now", "Far Lunch", "Starts Soon"]
+    assert names(within_minutes=0) == ["Lunch Now", "Far Lunch"]
+    assert names(campus_location="West") == ["Lunch Now", "Far Lunch"]
+    assert names(within_minutes=6 * 60) == ["Lunch Now", "Far Lunch", "Starts Soon", "Later Today"]
+    assert names(limit=1) == ["Lunch Now"]
+
+    _freeze_now(monkeypatch, 23, 30)
+    assert names(within_minutes=90) == ["After Midnight"]
+
+
+def test_created_event_times_are_normalized_for_events_now(client: TestClient, fake_db, monkeypatch):
+    for name, start in (("Padded", "09:00"), ("Unpadded", "9:00")):
+        form = {**EVENT_FORM, "name": name, "date": " 2025-12-01", "start_time": start, "end_time": "10:00"}
+        assert client.post("/event/", data=form).status_code == 200
+    assert {(e["date"], e["start_time"]) for e in fake_db.tables["Events"]} == {("2025-12-01", "09:00")}
+
+    _freeze_now(monkeypatch, 8, 45)
+    r = client.get("/events/now", params={"within_minutes": 60})
+    assert sorted(e["name"] for e in r.json()["data"]) == ["Padded", "Unpadded"]
+
+    for bad in ({"start_time": "9am"}, {"end_time": "24:00"}, {"date": "12/01/2025"}, {"start_time": "23:00", "end_time": "01:00"}):
+        assert client.post("/event/", data={**EVENT_FORM, **bad}).status_code == 400, bad
+    assert len(fake_db.tables["Events"]) == 2
+
+
+def test_events_now_radius_orders_by_distance(client: TestClient, fake_db, monkeypatch):
+    _seed_now(fake_db)
+    _freeze_now(monkeypatch, 12, 30)
+    r = client.get("/events/now", params={"lat": GSU[0], "lon": GSU[1], "radius_m": 1000})
+    assert r.status_code == 200
+    data = r.json()["data"]
+    assert [e["name"] for e in data] == ["Lunch Now", "Starts Soon"]
+    assert data[0]["distance_m"] == 0 and 500 < data[1]["distance_m"] < 1000
+
+    wide = client.get("/events/now", params={"lat": GSU[0], "lon": GSU[1], "radius_m": 5000}).json()["data"]
+    assert [e["name"] for e in wide] == ["Lunch Now", "Starts Soon", "Far Lunch"]
+    assert client.get("/events/now", params={"lat": GSU[0]}).status_code == 400
+
+
+def test_create_event_stores_coordinates_when_columns_exist(client: TestClient, fake_db):
+    r = client.post("/event/", data={**EVENT_FORM, "latitude": str(GSU[0]), "longitude": str(GSU[1])})
+    assert r.status_code == 200
+    assert (fake_db.tables["Events"][-1]["latitude"], fake_db.tables["Events"][-1]["longitude"]) == GSU
+
+    # Events table as it was before the event_time_location migration
+    fake_db.columns["Events"] = set(server.EVENT_FIELDS) - {"latitude", "longitude"}
+    r = client.post("/event/", data={**EVENT_FORM, "latitude": str(GSU[0]), "longitude": str(GSU[1])})
+    assert r.status_code == 200
+    assert "latitude" not in fake_db.tables["Events"][-1]
+    assert app.state.services.repository._missing_event_columns == {"latitude", "longitude"}
+
+
+# --------------------
+# Bulk Import Tests
+# --------------------
+
+IMPORT_CSV = """type,ref,name,description,location,date,start_time,end_time,food,event_ref,event_id,quantity,dietaryTags
+event,e1,Pizza Night,Slices,CDS 950,2025-12-01,18:00,20:00,Cheese Pizza; Veggie Pizza,,,,
+event,e2,Bad Date,Oops,GSU,2025-13-01,9:00,10:00,,,,,
+event,e3,Bagels,Morning,Mugar,2025-12-02,9:00,10:30,,,,,
+food,,Cheese Pizza,,,,,,,e1,,10,"vegetarian, halal"
+food,,Everything Bagel,,,,,,,e3,,12,
+food,,Lost Food,,,,,,,e9,,3,
+food,,Cookies,,,,,,,,{existing},5,
+"""
+
+
+def _import(client: TestClient, content: str, filename: str, **data):
+    return client.post("/import", data=data, files={"file": (filename, io.BytesIO(content.encode()), "application/octet-stream")})
+
+
+def test_import_csv_links_food_and_reports_row_errors(client: TestClient, fake_db):
+    existing = fake_db.seed("Events", [{"name": "Bake Sale", "date": "2025-11-30"}])[0]
+    r = _import(client, IMPORT_CSV.format(existing=existing["id"]), "week.csv")
+    assert r.status_code == 200
+    report = r.json()
+    assert (report["rows"], report["events_imported"], report["food_imported"], report["error_count"]) == (7, 2, 3, 2)
+    assert [e["line"] for e in report["errors"]] == [3, 7]
+    assert "date" in report["errors"][0]["error"] and "e9" in report["errors"][1]["error"]
+
+    events = {e["name"]: e for e in fake_db.tables["Events"]}
+    assert events["Pizza Night"]["food"] == ["Cheese Pizza", "Veggie Pizza"]
+    assert events["Bagels"]["start_time"] == "09:00"
+    food = {f["name"]: f for f in fake_db.tables["Food"]}
+    assert food["Cheese Pizza"]["event_id"] == events["Pizza Night"]["id"]
+    assert food["Cheese Pizza"]["dietaryTags"] == ["vegetarian", "halal"]
+    assert food["Everything Bagel"]["event_id"] == events["Bagels"]["id"]
+    assert food["Cookies"]["event_id"] == existing["id"]
+    # Imported rows are searchable straight away
+    assert [e["name"] for e in client.get("/search", params={"q": "bagel"}).json()["data"]] == ["Bagels"]
+
+
+def test_import_jsonl_with_nested_food_and_dry_run(client: TestClient, fake_db):
+    lines = [
+        json.dumps({"ref": 1, "name": "Sushi Social", "description": "Rolls", "location": "GSU", "date": "2025-12-03",
+                    "start_time": "17:00", "end_time": "19:00", "food_items": [{"name": "California Roll", "quantity": 20}, {"quantity": 1}]}),
+        "{not json",
+        json.dumps({"event_ref": 1, "name": "Miso Soup", "dietaryTags": ["vegan"]}),
+    ]
+    content = "\n".join(lines) + "\n"
+
+    dry = _import(client, content, "events.jsonl", dry_run="true").json()
+    assert (dry["dry_run"], dry["events_imported"], dry["food_imported"], dry["error_count"]) == (True, 1, 2, 2)
+    assert fake_db.tables.get("Events", []) == [] and fake_db.tables.get("Food", []) == []
+
+    report = _import(client, content, "events.jsonl").json()
+    assert (report["events_imported"], report["food_imported"]) == (1, 2)
+    assert [e["line"] for e in report["errors"]] == [1, 2]
+    event = fake_db.tables["Events"][0]
+    assert event["food"] == ["California Roll"]
+    assert {f["name"]: f["event_id"] for f in fake_db.tables["Food"]} == {"California Roll": event["id"], "Miso Soup": event["id"]}
+
+
+def test_import_inserts_in_batches_and_isolates_rejected_rows(client: TestClient, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_BATCH_ROWS", 100)
+    # Food table without pickup_instructions: rows that set it are rejected by the database
+    fake_db.columns["Food"] = {"id", "name", "event_id", "quantity", "stockLevel", "dietaryTags", "description"}
+    rows = ["ref,name,description,location,date,start_time,end_time,event_ref,pickup_instructions"]
+    for i in range(250):
+        rows.append(f"r{i},Event {i},Desc,GSU,2025-12-01,12:00,13:00,,")
+        rows.append(f",Food {i},,,,,,r{i},{'Front desk' if i == 7 else ''}")
+    report = _import(client, "\n".join(rows) + "\n", "big.csv").json()
+
+    assert (report["events_imported"], report["food_imported"], report["error_count"]) == (250, 249, 1)
+    assert report["errors"][0]["line"] == 17
+    assert fake_db.calls.count(("Events", "insert")) == 3
+    # Three food batches, one of them rejected and retried row by row
+    assert fake_db.calls.count(("Food", "insert")) == 3 + 100
+    ids = {e["name"]: e["id"] for e in fake_db.tables["Events"]}
+    assert all(f["event_id"] == ids[f["name"].replace("Food", "Event")] for f in fake_db.tables["Food"])
+
+
+def test_import_rejects_unknown_format(client: TestClient, fake_db):
+    assert _import(client, "a,b\n", "notes.txt").status_code == 415
+    assert _import(client, "name\n", "notes.txt", format="csv").status_code == 200
+
+
+# --------------------
+# Supabase HTTP Pool Tests
+# --------------------
+def _transport(handler, retries: int = 2) -> server.SupabaseTransport:
+    return server.SupabaseTransport(retries=retries, backoff=0, transport=httpx.MockTransport(handler))
+
+
+def _responder(*outcomes):
+    """A MockTransport handler that plays back `outcomes` (status codes or exceptions) in order."""
+    calls = []
+
+    def handler(request):
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(request.method)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json=[])
+    return handler, calls
+
+
+def test_transport_retries_idempotent_request_on_gateway_error():
+    handler, calls = _responder(503, 502, 200)
+    transport = _transport(handler)
+    with httpx.Client(transport=transport, base_url="http://supabase.test") as http:
+        assert http.get("/rest/v1/Events").status_code == 200
+    assert len(calls) == 3
+    assert transport.stats()["retries"] == {"503": 1, "502": 1}
+
+
+def test_transport_does_not_retry_post_once_sent():
+    handler, calls = _responder(503, 200)
+    with httpx.Client(transport=_transport(handler), base_url="http://supabase.test") as http:
+        assert http.post("/rest/v1/rpc/reserve_food", json={}).status_code == 503
+    assert calls == ["POST"]
+
+    handler, calls = _responder(httpx.RemoteProtocolError("connection dropped"), 200)
+    with httpx.Client(transport=_transport(handler), base_url="http://supabase.test") as http:
+        with pytest.raises(httpx.RemoteProtocolError):
+            http.post("/rest/v1/Food", json={})
+    assert calls == ["POST"]
+
+
+def test_transport_retries_post_when_connect_fails():
+    handler, calls = _responder(httpx.ConnectError("refused"), 201)
+    with httpx.Client(transport=_transport(handler), base_url="http://supabase.test") as http:
+        assert http.post("/rest/v1/Food", json={}).status_code == 201
+    assert calls == ["POST", "POST"]
+
+
+def test_transport_gives_up_after_retries():
+    handler, calls = _responder(httpx.ConnectError("refused"))
+    transport = _transport(handler, retries=1)
+    with httpx.Client(transport=transport, base_url="http://supabase.test") as http:
+        with pytest.raises(httpx.ConnectError):
+            http.get("/rest/v1/Events")
+    assert len(calls) == 2
+    assert transport.stats()["failures"] == 1
+
+
+def test_pool_stats_endpoint(client: TestClient, fake_db, monkeypatch):
+    # The stand-in has no HTTP pool; report on an idle one as a real deployment would
+    monkeypatch.setattr(app.state.services, "transport", server._build_transport())
+    assert client.get("/events/now").status_code == 200
+    data = client.get("/pool/stats").json()["data"]
+    assert data["workers"]["max_concurrency"] == 16
+    assert data["workers"]["in_flight"] == 0 and data["workers"]["peak_in_flight"] >= 1
+    assert data["http"]["max_connections"] == server.SUPABASE_HTTP_MAX_CONNECTIONS
+    assert {"connections", "idle_connections", "http2_connections", "retries"} <= data["http"].keys()
+
+
+# --------------------
+# Metrics Tests
+# --------------------
+def test_metrics_count_requests_by_route_and_reservation_outcome(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+    before = {outcome: server.reservations.value(outcome) for outcome in ("ok", "oversold", "not_found")}
+    served = server.http_request_duration.count("PUT", "/reserve/")
+
+    assert client.put("/reserve/", json={"food_id": pizza_id, "quantity": 3}).status_code == 200
+    assert client.put("/reserve/", json={"food_id": pizza_id, "quantity": 50}).status_code == 400
+    assert client.put("/reserve/", json={"food_id": 999999, "quantity": 1}).status_code == 404
+    assert client.get(f"/events/{seeded['events'][0]['id']}/food").status_code == 200
+
+    assert {o: server.reservations.value(o) - n for o, n in before.items()} == {"ok": 1, "oversold": 1, "not_found": 1}
+    assert server.http_request_duration.count("PUT", "/reserve/") == served + 3
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    # Route templates, not raw paths, so ids do not become label values
+    assert 'http_requests_total{method="GET",route="/events/{event_id}/food",status="200"}' in text
+    assert 'http_requests_total{method="PUT",route="/reserve/",status="400"}' in text
+    assert 'http_request_duration_seconds_bucket{method="PUT",route="/reserve/",le="+Inf"}' in text
+    assert 'reservations_total{outcome="oversold"}' in text
+    assert "response_cache_hit_ratio" in text and "supabase_calls_in_flight 0" in text
+
+
+def test_supabase_latency_is_labelled_by_table_and_operation():
+    transport = _transport(lambda request: httpx.Response(200, json=[]))
+    update = server.supabase_request_duration.count("Food", "update")
+    rpc = server.supabase_request_duration.count("reserve_food", "rpc")
+    with httpx.Client(transport=transport, base_url="http://supabase.test") as http:
+        http.patch("/rest/v1/Food", params={"id": "eq.1"}, json={"quantity": 1})
+        http.post("/rest/v1/rpc/reserve_food", json={})
+    assert server.supabase_request_duration.count("Food", "update") == update + 1
+    assert server.supabase_request_duration.count("reserve_food", "rpc") == rpc + 1
+    assert 'supabase_request_duration_seconds_count{table="reserve_food",operation="rpc"}' in server.metrics.render()
+
+
+# --------------------
+# Structured Logging Tests
+# --------------------
+@pytest.fixture
+def log_lines(monkeypatch):
+    """Route the app logger to a buffer through the queue; yields a function returning the parsed lines."""
+    monkeypatch.setattr(server, "_log_listener", None)
+    buffer = io.StringIO()
+    server.configure_logging("DEBUG", stream=buffer)
+
+    def lines() -> List[dict]:
+        server.shutdown_logging()
+        return [json.loads(line) for line in buffer.getvalue().splitlines()]
+    yield lines
+    server.shutdown_logging()
+
+
+def test_errors_are_logged_as_json_with_request_id(client: TestClient, fake_db, log_lines, monkeypatch):
+    async def broken(repo):
+        raise RuntimeError("index unavailable")
+    monkeypatch.setattr(app.state.services.dietary_index, "ensure_fresh", broken)
+
+    r = client.get("/search/dietary", params={"tags": "vegan"}, headers={"X-Request-ID": "req-123"})
+    assert r.status_code == 500
+    assert r.headers["x-request-id"] == "req-123"
+
+    [entry] = [e for e in log_lines() if e["level"] == "error"]
+    assert entry["msg"] == "Error in search_by_dietary"
+    assert entry["logger"] == "sparkbytes"
+    assert entry["request_id"] == "req-123"
+    assert entry["tags"] == ["vegan"] and entry["mode"] == "any"
+    assert "RuntimeError: index unavailable" in entry["exc"]
+
+
+def test_request_id_is_generated_when_missing(client: TestClient, fake_db):
+    first = client.get("/cache/stats").headers["x-request-id"]
+    second = client.get("/cache/stats", headers={"X-Request-ID": "x" * 500}).headers["x-request-id"]
+    assert len(first) == 32 and len(second) == 32 and first != second
+
+
+def test_debug_records_are_sampled():
+    def record(level):
+        return logging.LogRecord("sparkbytes", level, __file__, 0, "event", None, None)
+
+    drop_all = server.RequestContextFilter(debug_sample_rate=0.0)
+    assert not drop_all.filter(record(logging.DEBUG))
+    assert drop_all.filter(record(logging.INFO))
+
+    keep_all = server.RequestContextFilter(debug_sample_rate=1.0)
+    kept = record(logging.DEBUG)
+    assert keep_all.filter(kept) and not hasattr(kept, "sample_rate")
+
+    half = server.RequestContextFilter(debug_sample_rate=0.5)
+    kept = [r for r in (record(logging.DEBUG) for _ in range(2000)) if half.filter(r)]
+    assert 800 < len(kept) < 1200
+    assert all(r.sample_rate == 0.5 for r in kept)
+
+
+# --------------------
+# Local JWT Verification Tests
+# --------------------
+
+def _mint_token(sub: str = "profile-1", secret: str = TEST_JWT_SECRET, expires_in: int = 3600, **extra) -> str:
+    import time
+    import jwt
+    claims = {"sub": sub, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + expires_in}
+    claims.update(extra)
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+
+def test_reserve_uses_locally_verified_token_without_auth_round_trip(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza_id = seeded["foods"][0]["id"]
+    headers = {"Authorization": f"Bearer {_mint_token('profile-1')}"}
+
+    r = client.put("/reserve/", json={"food_id": pizza_id, "quantity": 1, "profile_id": "someone-else"}, headers=headers)
+    assert r.status_code == 200
+    assert [r["profile_id"] for r in fake_db.tables["reservations"]] == ["profile-1"]
+
+    r = client.get("/profiles/me/reservations", headers=headers)
+    assert [f["name"] for f in r.json()["food_rows"]] == ["Cheese Pizza"]
+    assert ("auth", "get_user") not in fake_db.calls
+
+
+def test_invalid_or_expired_tokens_are_ignored(fake_db):
+    import asyncio
+    verifier = app.state.services.token_verifier
+    repo = app.state.services.repository
+
+    async def resolve(token):
+        return await verifier.user_id_for(token, repo)
+
+    assert asyncio.run(resolve(_mint_token(expires_in=-60))) is None
+    assert asyncio.run(resolve(_mint_token(secret="x" * 40))) is None
+    assert asyncio.run(resolve(_mint_token(aud="anon"))) is None
+    assert asyncio.run(resolve("not-a-jwt")) is None
+    # Signed with the right secret, but the header may not pick an algorithm other than HS256
+    import jwt
+    import warnings
+    claims = {"sub": "profile-1", "aud": "authenticated", "exp": int(time.time()) + 60}
+    with warnings.catch_warnings():
+        # Newer PyJWT warns that the test secret is short for HS512
+        warnings.simplefilter("ignore")
+        hs512 = jwt.encode(claims, TEST_JWT_SECRET, algorithm="HS512")
+    assert asyncio.run(resolve(hs512)) is None
+    assert ("auth", "get_user") not in fake_db.calls
+
+
+def test_token_cache_is_bounded_and_honors_exp(fake_db, monkeypatch):
+    import asyncio
+    verifier = server.TokenVerifier(secret=TEST_JWT_SECRET, jwks_url=None, cache_size=2)
+    repo = app.state.services.repository
+    tokens = [_mint_token(f"user-{i}", expires_in=60) for i in range(3)]
+
+    async def resolve(token):
+        return await verifier.user_id_for(token, repo)
+
+    assert [asyncio.run(resolve(t)) for t in tokens] == ["user-0", "user-1", "user-2"]
+    assert len(verifier._cache) == 2
+
+    # Cached tokens resolve without re-verifying, even after the secret rotates...
+    verifier.secret = "rotated-secret-with-at-least-32-bytes!"
+    assert asyncio.run(resolve(tokens[2])) == "user-2"
+    # ...evicted ones are verified again and now fail
+    assert asyncio.run(resolve(tokens[0])) is None
+
+    # Past `exp` the cached entry is dropped and the token is re-verified
+    real_time = server.time.time
+    monkeypatch.setattr(server.time, "time", lambda: real_time() + 120)
+    assert asyncio.run(resolve(tokens[2])) is None
+
+
+def test_asymmetric_tokens_verified_against_jwks(fake_db):
+    import asyncio
+    import time
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    jwk = {**json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key())), "kid": "key-1", "alg": "ES256"}
+
+    class StubJWKSClient(jwt.PyJWKClient):
+        def __init__(self):
+            super().__init__("https://example.supabase.co/auth/v1/.well-known/jwks.json")
+            self.fetches = 0
+
+        def fetch_data(self):
+            self.fetches += 1
+            return {"keys": [jwk]}
+
+    jwks = StubJWKSClient()
+    verifier = server.TokenVerifier(secret=None, jwks_url=None, jwks_client=jwks)
+    repo = app.state.services.repository
+
+    def mint(sub, kid):
+        claims = {"sub": sub, "aud": "authenticated", "exp": int(time.time()) + 60}
+        return jwt.encode(claims, private_key, algorithm="ES256", headers={"kid": kid})
+
+    assert asyncio.run(verifier.user_id_for(mint("profile-ec", "key-1"), repo)) == "profile-ec"
+    assert jwks.fetches == 1
+
+    # Unknown key ids refetch the key set once per interval, not once per token;
+    # a rejected token is remembered and not looked up again at all
+    forged = [mint(f"user-{i}", "key-2") for i in range(5)]
+    assert [asyncio.run(verifier.user_id_for(t, repo)) for t in forged] == [None] * 5
+    assert jwks.fetches == 2
+    jwks.get_signing_keys = lambda refresh=False: pytest.fail("a rejected token was verified again")
+    assert [asyncio.run(verifier.user_id_for(t, repo)) for t in forged] == [None] * 5
+
+
+def test_hs256_without_secret_falls_back_to_supabase_auth_once(client: TestClient, fake_db, monkeypatch):
+    monkeypatch.setattr(app.state.services, "token_verifier", server.TokenVerifier(secret=None, jwks_url=None))
+    _seed_fake(fake_db)
+    token = _mint_token("profile-1", secret="project-secret-unknown-to-the-api!!")
+    fake_db.auth.tokens[token] = "profile-1"
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for _ in range(3):
+        assert client.get("/profiles/me/reservations", headers=headers).status_code == 200
+    assert fake_db.calls.count(("auth", "get_user")) == 1
+
+
+def test_remotely_verified_token_without_exp_is_cached_briefly(fake_db, monkeypatch):
+    import asyncio
+    import jwt
+    verifier = server.TokenVerifier(secret=None, jwks_url=None)
+    repo = app.state.services.repository
+    token = jwt.encode({"sub": "profile-1", "aud": "authenticated"}, "project-secret-unknown-to-the-api!!", algorithm="HS256")
+    fake_db.auth.tokens[token] = "profile-1"
+
+    assert asyncio.run(verifier.user_id_for(token, repo)) == "profile-1"
+    assert asyncio.run(verifier.user_id_for(token, repo)) == "profile-1"
+    assert fake_db.calls.count(("auth", "get_user")) == 1
+
+    real_time = server.time.time
+    monkeypatch.setattr(server.time, "time", lambda: real_time() + server.AUTH_NO_EXP_TOKEN_SECONDS + 1)
+    assert asyncio.run(verifier.user_id_for(token, repo)) == "profile-1"
+    assert fake_db.calls.count(("auth", "get_user")) == 2
+
+
+# --------------------
+# Stats Snapshot Tests
+# --------------------
+
+def test_stats_served_from_snapshot_with_cache_headers(client: TestClient, fake_db):
+    _seed_fake(fake_db)
+    fake_db.calls.clear()
+
+    r = client.get("/stats")
+    assert r.status_code == 200
+    assert r.json()["data"] == {"total_events": 2, "total_food_saved": 2, "active_users": 1, "total_pounds_rescued": 10}
+    assert r.headers["cache-control"].startswith("public, max-age=")
+    # Three count-only queries, no row transfer
+    assert sorted(fake_db.calls) == [("Events", "select"), ("Food", "select"), ("profiles", "select")]
+
+    fake_db.calls.clear()
+    fake_db.seed("Events", [{"name": "New", "date": "2025-12-01"}])
+    assert client.get("/stats").json()["data"]["total_events"] == 2
+    assert fake_db.calls == []
+
+
+def test_stats_refresh_in_background_and_respect_staleness_bound(fake_db):
+    import asyncio
+    import httpx
+
+    _seed_fake(fake_db)
+    snapshot = app.state.services.stats_snapshot
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            total = lambda r: r.json()["data"]["total_events"]
+            assert total(await ac.get("/stats")) == 2
+            fake_db.seed("Events", [{"name": "New", "date": "2025-12-01"}])
+
+            # Past refresh_after: the stale snapshot is served while a recount runs
+            snapshot.refreshed_at -= snapshot.refresh_after + 1
+            assert total(await ac.get("/stats")) == 2
+            await snapshot._refresh_task
+            assert total(await ac.get("/stats")) == 3
+
+            # Past max_staleness: the caller waits for fresh numbers
+            fake_db.seed("Events", [{"name": "Newer", "date": "2025-12-02"}])
+            snapshot.refreshed_at -= snapshot.max_staleness + 1
+            assert total(await ac.get("/stats")) == 4
+
+    asyncio.run(run())
+
+
+def test_failed_stats_refresh_is_logged_and_old_snapshot_kept(log_lines):
+    import asyncio
+
+    class DownRepo:
+        async def count_rows(self, table):
+            raise RuntimeError("db down")
+
+    snapshot = server.StatsSnapshot(refresh_after=60, max_staleness=300)
+    snapshot.data, snapshot.refreshed_at = {"total_events": 2}, time.monotonic() - 120
+
+    async def run():
+        assert await snapshot.get(DownRepo()) == {"total_events": 2}
+        await asyncio.gather(snapshot._refresh_task, return_exceptions=True)
+
+    asyncio.run(run())
+    [entry] = [e for e in log_lines() if e["level"] == "error"]
+    assert entry["msg"] == "Error refreshing stats snapshot"
+    assert "RuntimeError: db down" in entry["exc"]
+
+
+# --------------------
+# Response Cache Tests
+# --------------------
+
+def test_event_list_cached_until_new_event(client: TestClient, fake_db):
+    _seed_fake(fake_db)
+    assert len(client.get("/").json()["data"]) == 2
+    fake_db.calls.clear()
+    assert len(client.get("/").json()["data"]) == 2
+    assert ("Events", "select") not in fake_db.calls
+
+    form = {"name": "Bagels", "description": "d", "location": "GSU", "date": "2025-12-01", "start_time": "09:00", "end_time": "10:00"}
+    assert client.post("/event/", data=form).status_code == 200
+    assert len(client.get("/").json()["data"]) == 3
+
+    stats = client.get("/cache/stats").json()["data"]
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_food_cache_invalidated_only_for_affected_event(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    pizza_event, sushi_event = (e["id"] for e in seeded["events"])
+    pizza_id = seeded["foods"][0]["id"]
+    client.get(f"/events/{pizza_event}/food")
+    client.get(f"/events/{sushi_event}/food")
+
+    assert client.put("/reserve/", json={"food_id": pizza_id, "quantity": 2, "profile_id": "profile-1"}).status_code == 200
+    fake_db.calls.clear()
+    assert client.get(f"/events/{pizza_event}/food").json()["data"][0]["quantity"] == 8
+    client.get(f"/events/{sushi_event}/food")
+    assert fake_db.calls == [("Food", "select")]
+
+    assert client.post("/reserve/cancel", json={"food_id": pizza_id, "profile_id": "profile-1"}).status_code == 200
+    assert client.get(f"/events/{pizza_event}/food").json()["data"][0]["quantity"] == 10
+
+    client.post("/food/", json=[{"name": "Edamame", "event_id": sushi_event}])
+    assert {f["name"] for f in client.get(f"/events/{sushi_event}/food").json()["data"]} == {"Sushi", "Edamame"}
+
+
+def test_in_memory_cache_is_bounded_and_skips_raced_loads():
+    import asyncio
+    cache = server.InMemoryResponseCache(ttl=60, max_entries=2)
+
+    async def run():
+        loads = []
+
+        async def load(value):
+            loads.append(value)
+            return value
+
+        for key in ("a", "b", "c"):
+            await cache.get_or_load(key, ["events"], lambda k=key: load(k))
+        assert list(cache._entries) == ["b", "c"]
+
+        # A write landing while a load is in flight must not leave stale data cached
+        async def racing_load():
+            await cache.invalidate(["events"])
+            return "stale"
+        assert await cache.get_or_load("d", ["events"], racing_load) == "stale"
+        assert await cache.get_or_load("d", ["events"], lambda: load("fresh")) == "fresh"
+
+    asyncio.run(run())
+
+
+class FakeRedis:
+    """Just enough of the redis.asyncio client for RedisResponseCache."""
+
+    def __init__(self):
+        self.store: Dict[str, Any] = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def incr(self, key):
+        self.store[key] = int(self.store.get(key) or 0) + 1
+        return self.store[key]
+
+
+def test_redis_backend_shares_entries_between_workers(client: TestClient, fake_db, monkeypatch):
+    seeded = _seed_fake(fake_db)
+    event_id = seeded["events"][0]["id"]
+    redis = FakeRedis()
+    worker_a, worker_b = server.RedisResponseCache(redis), server.RedisResponseCache(redis)
+
+    monkeypatch.setattr(app.state.services, "response_cache", worker_a)
+    client.get(f"/events/{event_id}/food")
+
+    monkeypatch.setattr(app.state.services, "response_cache", worker_b)
+    fake_db.calls.clear()
+    client.get(f"/events/{event_id}/food")
+    assert fake_db.calls == []
+    assert worker_b.stats()["hits"] == 1
+
+    client.put("/reserve/", json={"food_id": seeded["foods"][0]["id"], "quantity": 1})
+    monkeypatch.setattr(app.state.services, "response_cache", worker_a)
+    assert client.get(f"/events/{event_id}/food").json()["data"][0]["quantity"] == 9
+
+
+# --------------------
+# ETag / Conditional GET Tests
+# --------------------
+
+def test_conditional_get_returns_304_without_backend_call(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    event_id = seeded["events"][0]["id"]
+
+    for path in ("/", f"/events/{event_id}/food"):
+        first = client.get(path)
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and first.headers["cache-control"] == "no-cache"
+
+        fake_db.calls.clear()
+        r = client.get(path, headers={"If-None-Match": etag})
+        assert r.status_code == 304
+        assert r.content == b""
+        assert r.headers["etag"] == etag
+        assert fake_db.calls == []
+
+        # Weak validators and lists of candidates also match
+        assert client.get(path, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+        assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_changes_when_stock_changes(client: TestClient, fake_db):
+    seeded = _seed_fake(fake_db)
+    event_id = seeded["events"][0]["id"]
+    etag = client.get(f"/events/{event_id}/food").headers["etag"]
+
+    client.put("/reserve/", json={"food_id": seeded["foods"][0]["id"], "quantity": 1})
+    r = client.get(f"/events/{event_id}/food", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert r.json()["data"][0]["quantity"] == 9
+
+
+# --------------------
+# Image Upload Tests
+# --------------------
+
+PNG_1X1 = (
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01'
+    b'\x08\x02\x00\x00\x00\x90wS\xde\x00\x00\x00\x0cIDATx\x9cc\xf8\x0f'
+    b'\x00\x00\x01\x01\x00\x05\x18\r\xe2_\x00\x00\x00\x00IEND\xaeB`\x82'
+)
+
+EVENT_FORM = {
+    "name": "Upload Test",
+    "description": "Image pipeline",
+    "location": "CAS 116",
+    "date": "2025-12-27",
+    "start_time": "18:00",
+    "end_time": "20:00",
+}
+
+
+def _spooled_files():
+    return set(os.listdir(tempfile.gettempdir()))
+
+
+def test_image_uploaded_after_response_and_attached(client: TestClient, fake_db):
+    before = _spooled_files()
+    r = client.post("/event/", data=EVENT_FORM, files={"image": ("cat.png", io.BytesIO(PNG_1X1), "text/plain")})
+    assert r.status_code == 200
+    created = r.json()["data"][0]
+    assert created["image_status"] == "pending"
+
+    # TestClient runs background tasks before returning
+    [(bucket, path)] = [key for key in fake_db.storage.objects if key[1].endswith(".png")]
+    assert bucket == "event images" and path.endswith("_cat.png")
+    assert fake_db.storage.objects[(bucket, path)] == PNG_1X1
+    # The sniffed type wins over the client's claim
+    assert fake_db.storage.content_types[(bucket, path)] == "image/png"
+    assert fake_db.tables["Events"][0]["image_url"].endswith(path)
+    assert client.get("/").json()["data"][0]["image_url"].endswith(path)
+    assert _spooled_files() == before
+
+
+def test_image_uploaded_inline_when_background_disabled(client: TestClient, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "IMAGE_UPLOAD_IN_BACKGROUND", False)
+    r = client.post("/event/", data=EVENT_FORM, files={"image": ("cat.png", io.BytesIO(PNG_1X1), "image/png")})
+    created = r.json()["data"][0]
+    assert "image_status" not in created
+    assert created["image_url"].endswith("_cat.png")
+
+
+def test_oversized_image_rejected_without_writes(client: TestClient, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "IMAGE_UPLOAD_MAX_BYTES", 1024)
+    before = _spooled_files()
+    big = PNG_1X1 + b"\0" * 200_000
+    r = client.post("/event/", data=EVENT_FORM, files={"image": ("big.png", io.BytesIO(big), "image/png")})
+    assert r.status_code == 413
+    assert fake_db.tables["Events"] == [] and fake_db.storage.objects == {}
+    assert _spooled_files() == before
+
+
+def test_oversized_upload_rejected_before_form_is_parsed(client: TestClient, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "IMAGE_UPLOAD_MAX_BYTES", 1024)
+    monkeypatch.setattr(server, "IMAGE_UPLOAD_FORM_OVERHEAD_BYTES", 1024)
+    parsed = []
+    monkeypatch.setattr(server, "_spool_image_upload", lambda *a, **kw: parsed.append(a))
+    big = PNG_1X1 + b"\0" * 200_000
+    r = client.post("/event/", data=EVENT_FORM, files={"image": ("big.png", io.BytesIO(big), "image/png")})
+    assert r.status_code == 413
+    assert r.json() == {"detail": "Image exceeds 1024 bytes"}
+    assert parsed == [] and fake_db.tables["Events"] == []
+
+    # Without a Content-Length the body is counted as it streams in
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 1024
+
+    r = client.post("/event/", content=chunks(), headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert r.status_code == 413
+    assert parsed == [] and fake_db.tables["Events"] == []
+
+
+def test_non_image_upload_rejected(client: TestClient, fake_db):
+    before = _spooled_files()
+    r = client.post("/event/", data=EVENT_FORM, files={"image": ("evil.png", io.BytesIO(b"<script>"), "image/png")})
+    assert r.status_code == 415
+    assert fake_db.tables["Events"] == [] and fake_db.storage.objects == {}
+    assert _spooled_files() == before
+
+
+def _photo_bytes(size=(1600, 900), fmt="JPEG") -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 80, 40)).save(buf, fmt)
+    return buf.getvalue()
+
+
+def test_image_variants_rendered_and_stored(client: TestClient, fake_db):
+    photo = _photo_bytes()
+    before = _spooled_files()
+    client.post("/event/", data=EVENT_FORM, files={"image": ("photo.jpg", io.BytesIO(photo), "image/jpeg")})
+
+    event = client.get("/").json()["data"][0]
+    variants = event["image_variants"]
+    assert set(variants) == {"webp", "jpeg"}
+    assert set(variants["webp"]) == set(variants["jpeg"]) == {"320", "640", "1280"}
+    for fmt, by_width in variants.items():
+        for width, variant_url in by_width.items():
+            path = variant_url.rsplit("/event images/", 1)[1]
+            content = fake_db.storage.objects[("event images", path)]
+            assert fake_db.storage.content_types[("event images", path)] == f"image/{fmt}"
+            img = Image.open(io.BytesIO(content))
+            assert img.format == fmt.upper() and img.size == (int(width), round(900 * int(width) / 1600))
+            assert len(content) < len(photo)
+    assert _spooled_files() == before
+
+
+def test_image_variants_never_upscale(client: TestClient, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "IMAGE_UPLOAD_IN_BACKGROUND", False)
+    small = _photo_bytes(size=(500, 250), fmt="PNG")
+    created = client.post("/event/", data=EVENT_FORM, files={"image": ("small.png", io.BytesIO(small), "image/png")}).json()["data"][0]
+    assert set(created["image_variants"]["webp"]) == {"320", "500"}
+
+
+def test_event_image_saved_without_variants_column(client: TestClient, fake_db):
+    # Events table as it was before the image_variants migration
+    fake_db.columns["Events"] = set(server.EVENT_FIELDS) - {"image_variants"}
+    photo = _photo_bytes()
+    for _ in range(2):
+        r = client.post("/event/", data=EVENT_FORM, files={"image": ("photo.jpg", io.BytesIO(photo), "image/jpeg")})
+        assert r.status_code == 200
+    assert all(row["image_url"] and "image_variants" not in row for row in fake_db.tables["Events"])
+    assert app.state.services.repository._missing_event_columns == {"image_variants"}
+
+
+# --------------------
+# Stock Stream Tests
+# --------------------
+
+class _StreamClient:
+    """Drive a streaming endpoint over raw ASGI; httpx's ASGITransport waits for the whole body."""
+
+    def __init__(self, path: str):
+        self.scope = {
+            "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [], "server": ("test", 80), "client": ("test", 1234),
+        }
+        self.start: Dict[str, Any] = {}
+        self._chunks: "asyncio.Queue[bytes]" = None
+        self._closed = None
+
+    async def _receive(self):
+        await self._closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def _send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+        elif message.get("body"):
+            await self._chunks.put(message["body"])
+
+    async def __aenter__(self):
+        import asyncio
+        self._chunks, self._closed = asyncio.Queue(), asyncio.Event()
+        self._task = asyncio.create_task(app(self.scope, self._receive, self._send))
+        return self
+
+    async def next_chunk(self, timeout: float = 1.0) -> bytes:
+        import asyncio
+        return await asyncio.wait_for(self._chunks.get(), timeout)
+
+    async def __aexit__(self, *exc):
+        import asyncio
+        self._closed.set()
+        await asyncio.wait_for(self._task, 1.0)
+
+
+def _sse_data(chunk: bytes) -> Any:
+    event = dict(line.split(": ", 1) for line in chunk.decode().strip().splitlines() if ": " in line)
+    return event["event"], json.loads(event["data"])
+
+
+def test_stock_stream_pushes_reservations_and_cancels(fake_db):
+    import asyncio
+    import httpx
+
+    seeded = _seed_fake(fake_db)
+    event_id, pizza_id = seeded["events"][0]["id"], seeded["foods"][0]["id"]
+
+    async def run():
+        async with _StreamClient(f"/events/{event_id}/food/stream") as stream:
+            kind, snapshot = _sse_data(await stream.next_chunk())
+            assert stream.start["status"] == 200
+            assert dict(stream.start["headers"])[b"content-type"].startswith(b"text/event-stream")
+            assert kind == "snapshot" and snapshot["data"][0]["quantity"] == 10
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                await ac.put("/reserve/", json={"food_id": pizza_id, "quantity": 3, "profile_id": "profile-1"})
+                assert _sse_data(await stream.next_chunk()) == ("stock", {"id": pizza_id, "quantity": 7, "stockLevel": "low"})
+
+                await ac.post("/reserve/cancel", json={"food_id": pizza_id, "profile_id": "profile-1"})
+                assert _sse_data(await stream.next_chunk()) == ("stock", {"id": pizza_id, "quantity": 10, "stockLevel": "medium"})
+
+                assert (await ac.get("/stream/stats")).json()["data"] == {"subscribers": 1, "events": 1, "published": 2}
+        assert app.state.services.stock_broadcaster.stats()["subscribers"] == 0
+
+    asyncio.run(run())
+
+
+def test_stock_stream_heartbeat_and_capacity(fake_db, monkeypatch):
+    import asyncio
+
+    seeded = _seed_fake(fake_db)
+    event_id = seeded["events"][0]["id"]
+    monkeypatch.setattr(app.state.services, "stock_broadcaster", server.StockBroadcaster(heartbeat=0.05, max_subscribers=1))
+
+    async def run():
+        async with _StreamClient(f"/events/{event_id}/food/stream") as stream:
+            await stream.next_chunk()
+            assert await stream.next_chunk() == b": keepalive\n\n"
+            async with _StreamClient(f"/events/{event_id}/food/stream") as rejected:
+                await rejected.next_chunk()
+                assert rejected.start["status"] == 503
+
+    asyncio.run(run())
+
+
+def test_broadcaster_fans_out_to_many_idle_subscribers_and_coalesces():
+    import asyncio
+
+    async def run():
+        broadcaster = server.StockBroadcaster(heartbeat=60)
+        subs = [broadcaster.subscribe(1) for _ in range(5000)]
+        other = broadcaster.subscribe(2)
+        for quantity in (9, 8, 7):
+            broadcaster.publish(1, {"id": 5, "quantity": quantity, "stockLevel": "low"})
+        received = await asyncio.gather(*(sub.next_changes() for sub in subs))
+        assert all(changes == [{"id": 5, "quantity": 7, "stockLevel": "low"}] for changes in received)
+        assert not other.ready.is_set()
+        for sub in subs:
+            broadcaster.unsubscribe(1, sub)
+        broadcaster.unsubscribe(2, other)
+        assert broadcaster.stats()["subscribers"] == 0
+
+    asyncio.run(run())
+
+
+# --------------------
+# Startup Tests
+# --------------------
+# server.py's own import work (its dependencies excluded) measured ~75ms; the budget leaves CI headroom
+IMPORT_BUDGET_SECONDS = 0.25
+
+
+def test_import_stays_within_budget_and_connects_nothing():
+    import subprocess
+
+    probe = (
+        "import time, threading\n"
+        "import fastapi, httpx, jwt, pydantic, supabase, uvicorn\n"
+        "start = time.perf_counter()\n"
+        "import server\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(elapsed, threading.active_count(), server.app.state.services is None)\n"
+    )
+    # No Supabase settings: importing must neither validate nor use them
+    env = {k: v for k, v in os.environ.items() if "SUPABASE" not in k}
+    runs = [
+        subprocess.run([sys.executable, "-c", probe], cwd=ROOT_DIR, env=env,
+                       capture_output=True, text=True, check=True).stdout.split()
+        for _ in range(3)
+    ]
+    assert all(threads == "1" and unbuilt == "True" for _, threads, unbuilt in runs), runs
+    best = min(float(elapsed) for elapsed, _, _ in runs)
+    assert best < IMPORT_BUDGET_SECONDS, f"import server took {best * 1000:.0f}ms"
+
+
+def test_lifespan_builds_services_per_app_and_closes_them(monkeypatch):
+    built = []
+
+    def build():
+        services = server.Services(server.SupabaseRepository(FakeSupabase()))
+        built.append(services)
+        return services
+
+    monkeypatch.setattr(server, "build_services", build)
+    standalone = server.create_app()
+    start = time.perf_counter()
+    with TestClient(standalone) as http:
+        startup = time.perf_counter() - start
+        assert http.get("/events/now").status_code == 200
+        assert standalone.state.services is built[0]
+    assert startup < 1.0
+    assert standalone.state.services is None
+    assert built[0].repository._executor._shutdown
+
+
+def test_lifespan_leaves_injected_services_open():
+    services = server.Services(server.SupabaseRepository(FakeSupabase()))
+    with TestClient(server.create_app(services)) as http:
+        assert http.get("/stats").status_code == 200
+    assert not services.repository._executor._shutdown
+    services.close()
+
+
+def test_missing_settings_fail_at_startup_not_import(monkeypatch):
+    monkeypatch.setattr(server, "url", None)
+    with pytest.raises(ValueError, match="SUPABASE_URL"):
+        with TestClient(server.create_app()):
+            pass
+
+
+# --------------------
+# Response Serialization Tests
+# --------------------
+def test_write_responses_carry_only_client_fields(client: TestClient, fake_db):
+    r = client.post("/event/", data=EVENT_FORM)
+    created = r.json()["data"][0]
+    assert created["name"] == "Upload Test" and set(created) <= set(server.EventOut.model_fields)
+
+    r = client.post("/food/", json=[{
+        "name": "Bagels", "event_id": created["id"], "quantity": 12, "stockLevel": "medium",
+        "dietaryTags": ["vegan"], "description": "Assorted", "pickup_instructions": "Front desk",
+    }])
+    assert r.json() == {"data": [{"id": r.json()["data"][0]["id"], "event_id": created["id"], "name": "Bagels",
+                                  "quantity": 12, "stockLevel": "medium"}]}
+    assert client.post("/food/", json=[]).json() == {"data": []}
+
+
+def test_json_encoding_matches_without_orjson(monkeypatch):
+    payload = {"data": [{"id": 1, "name": "Café", "date": datetime.date(2025, 12, 27)}], 7: None}
+    fast = server._json_bytes(payload)
+    monkeypatch.setattr(server, "orjson", None)
+    assert json.loads(server._json_bytes(payload)) == json.loads(fast) == {
+        "data": [{"id": 1, "name": "Café", "date": "2025-12-27"}], "7": None,
+    }
+    assert server.FastJSONResponse({"ok": True}).body == b'{"ok":true}'
+
+
+# --------------------
+# Compression Tests
+# --------------------
+def _seed_many_events(fake: FakeSupabase, n: int = 60) -> None:
+    events = fake.seed("Events", [
+        {"name": f"Pizza Night {i}", "campus_location": "West", "food": ["Pizza"], "date": "2025-12-31"} for i in range(n)
+    ])
+    fake.seed("Food", [
+        {"name": "Pizza", "event_id": e["id"], "quantity": 5, "dietaryTags": ["vegetarian"]} for e in events
+    ])
+
+
+def test_cached_lists_served_precompressed(client: TestClient, fake_db, monkeypatch):
+    _seed_many_events(fake_db)
+    compressed = []
+    real_compress = server._compress
+    monkeypatch.setattr(server, "_compress", lambda body, encoding: compressed.append(encoding) or real_compress(body, encoding))
+
+    first = client.get("/", headers={"Accept-Encoding": "gzip", "Origin": "http://localhost:3000"})
+    again = client.get("/", headers={"Accept-Encoding": "gzip", "Origin": "http://localhost:3000"})
+    # Compressed once per encoding, at the cache fill
+    assert compressed == (["gzip", "br"] if server.brotli else ["gzip"])
+    assert first.headers["content-encoding"] == again.headers["content-encoding"] == "gzip"
+    assert len(first.json()["data"]) == 60 and again.content == first.content
+    assert [v.strip() for v in first.headers["vary"].split(",")] == ["Accept-Encoding", "Origin"]
+    assert first.headers["etag"].startswith('W/"')
+    assert client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]}).status_code == 304
+
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["vary"] == "Accept-Encoding"
+    assert plain.headers["etag"] == first.headers["etag"][2:]
+
+
+def test_uncached_responses_compressed_above_threshold(client: TestClient, fake_db):
+    _seed_many_events(fake_db)
+    r = client.get("/search/dietary", params={"tags": "vegetarian"}, headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert r.headers["content-encoding"] == "gzip" and len(r.json()["data"]) == 60
+    assert int(r.headers["content-length"]) < len(r.content)
+
+    small = client.get("/cache/stats", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers and small.headers["vary"] == "Accept-Encoding"
+
+
+def test_brotli_round_trips_cached_and_uncached(client: TestClient, fake_db):
+    brotli = pytest.importorskip("brotli")
+    _seed_many_events(fake_db)
+
+    for path in ("/", "/search/dietary?tags=vegetarian"):
+        plain = client.get(path, headers={"Accept-Encoding": "identity"})
+        with client.stream("GET", path, headers={"Accept-Encoding": "br"}) as r:
+            raw = b"".join(r.iter_raw())
+        assert r.headers["content-encoding"] == "br", path
+        assert int(r.headers["content-length"]) == len(raw) < len(plain.content)
+        assert brotli.decompress(raw) == plain.content, path
+
+
+def test_accepted_encoding_negotiation(monkeypatch):
+    assert server._accepted_encoding(None) is None
+    assert server._accepted_encoding("gzip;q=0, identity") is None
+    assert server._accepted_encoding("*") == ("br" if server.brotli else "gzip")
+    monkeypatch.setattr(server, "brotli", object())
+    assert server._accepted_encoding("gzip, deflate, br") == "br"
+    assert server._accepted_encoding("br;q=0, gzip") == "gzip"
+    monkeypatch.setattr(server, "brotli", None)
+    assert server._accepted_encoding("br") is None
+
+
+def test_redis_cache_keeps_compressed_copies():
+    import asyncio
+
+    cache = server.RedisResponseCache(FakeRedis())
+    entry = server.CachedBody.of(b'{"data":[' + b'"pizza",' * 500 + b'0]}')
+    assert entry.gzip is not None
+    asyncio.run(cache._set("/", entry, (1,)))
+    assert asyncio.run(cache._get("/", (1,))) == entry
+
+
+# --------------------
+# Request Coalescing Tests
+# --------------------
+def test_flash_crowd_shares_one_backend_read(fake_db):
+    import asyncio
+
+    seeded = _seed_fake(fake_db)
+    event_id = seeded["events"][0]["id"]
+    fake_db.latency = 0.05
+    fake_db.calls.clear()
+    coalesced = server.singleflight_calls.value("response_cache", "coalesced")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(ac.get(f"/events/{event_id}/food") for _ in range(50)))
+
+    responses = asyncio.run(run())
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.content for r in responses}) == 1
+    assert fake_db.calls == [("Food", "select")]
+    assert server.singleflight_calls.value("response_cache", "coalesced") - coalesced == 49
+    assert app.state.services.response_cache.stats()["coalesced"] == 49
+
+
+def test_reads_after_a_write_do_not_join_an_older_flight():
+    import asyncio
+
+    cache = server.InMemoryResponseCache(max_entries=0)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow_stale():
+            await release.wait()
+            return "stale"
+
+        async def fresh():
+            return "fresh"
+
+        before = asyncio.ensure_future(cache.get_or_load("/", ["events"], slow_stale))
+        joined = asyncio.ensure_future(cache.get_or_load("/", ["events"], fresh))
+        await asyncio.sleep(0)
+        await cache.invalidate(["events"])
+        after = await cache.get_or_load("/", ["events"], fresh)
+        release.set()
+        return await before, await joined, after
+
+    assert asyncio.run(run()) == ("stale", "stale", "fresh")
+
+
+def test_singleflight_survives_leader_cancellation_and_shares_errors():
+    import asyncio
+
+    flights = server.SingleFlight("test")
+
+    async def run():
+        release = asyncio.Event()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await release.wait()
+            return "rows"
+
+        leader = asyncio.ensure_future(flights.do("k", load))
+        follower = asyncio.ensure_future(flights.do("k", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        assert await follower == "rows" and len(calls) == 1
+
+        async def broken():
+            await asyncio.sleep(0)
+            raise RuntimeError("backend down")
+
+        results = await asyncio.gather(flights.do("e", broken), flights.do("e", broken), return_exceptions=True)
+        assert [str(r) for r in results] == ["backend down", "backend down"]
+        assert flights.stats() == {"executed": 2, "coalesced": 2, "in_flight": 0}
+
+    asyncio.run(run())
+
+
+def test_event_food_of_any_shape_is_stored_as_names(client: TestClient, fake_db):
+    for food, names in [('"Pizza"', ["Pizza"]), ('[{"name": "Pizza"}, "Soda", 3]', ["Pizza", "Soda", "3"]), ('{"a": 1}', [])]:
+        r = client.post("/event/", data={**EVENT_FORM, "food": food})
+        assert r.status_code == 200, r.text
+        assert r.json()["data"][0]["food"] == names
+    assert [row["food"] for row in fake_db.tables["Events"]] == [["Pizza"], ["Pizza", "Soda", "3"], []]